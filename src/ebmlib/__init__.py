@@ -19,10 +19,14 @@ __revision__ = "$Revision$"
 
 # Text Utils
 from searcheng import *
+from trigram import *
+from replacer import *
 from fchecker import *
 from fileutil import *
 from _dirmon import *
+from filemon import *
 from fileimpl import *
+from mappedfile import *
 from txtutil import *
 from logfile import *
 
@@ -9,6 +9,8 @@
 """
 Editra Business Model Library: DirectoryMonitor
 
+Monitors directories for changes. On Linux the changes are delivered by
+inotify when it is available, other platforms poll the directories.
 
 """
 
@@ -22,22 +24,56 @@ __all__ = ['DirectoryMonitor',]
 # Imports
 import wx
 import os
+import stat
 import time
 import threading
 
+# Batched directory listing and stat where available
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
 # Local imports
 import fileutil
+import _inotify
+
+#-----------------------------------------------------------------------------#
+
+def _CreateWatcher(notifier, checkFreq):
+    """Create the best available watcher thread for this system
+    @param notifier: callable([added,], [deleted,], [modified,])
+    @param checkFreq: check frequency in milliseconds
+    @return: L{InotifyWatcherThread} or L{WatcherThread}
+
+    """
+    if _inotify.IsSupported():
+        try:
+            return InotifyWatcherThread(notifier, checkFreq=checkFreq)
+        except OSError:
+            pass # Out of inotify instances
+    return WatcherThread(notifier, checkFreq=checkFreq)
 
 #-----------------------------------------------------------------------------#
 
 class DirectoryMonitor(object):
     """Object to manage monitoring file system changes"""
-    def __init__(self, checkFreq=1000.0):
-        """@keyword checkFreq: check frequency in milliseconds"""
+    def __init__(self, checkFreq=1000.0, watcher=None):
+        """@keyword checkFreq: check frequency in milliseconds
+        @keyword watcher: watcher thread class to use (i.e L{WatcherThread})
+                          or None to use the best one for the system.
+
+        """
         super(DirectoryMonitor, self).__init__()
 
         # Attributes
-        self._watcher = WatcherThread(self._ThreadNotifier, checkFreq=checkFreq)
+        if watcher is None:
+            self._watcher = _CreateWatcher(self._ThreadNotifier, checkFreq)
+        else:
+            self._watcher = watcher(self._ThreadNotifier, checkFreq=checkFreq)
         self._callbacks = list()
         self._cbackLock = threading.Lock()
         self._running = False
@@ -127,6 +163,103 @@ class DirectoryMonitor(object):
         self._watcher.Refresh(paths)
 
 #-----------------------------------------------------------------------------#
+
+def _NormPath(path):
+    """Get the key used to compare paths in directory snapshots
+    @param path: file path
+    @return: string
+
+    """
+    return os.path.normcase(os.path.abspath(path))
+
+def _TakeSnapshot(dpath):
+    """Take a snapshot of the entries in a directory
+    @param dpath: directory path
+    @return: dict {normalized path : (path, isdir, mtime, size, inode)}
+    @raise OSError: if the directory cannot be listed
+
+    """
+    snapshot = dict()
+    normcase = os.path.normcase
+    if _scandir is not None:
+        for entry in _scandir(dpath):
+            try:
+                isdir = entry.is_dir()
+                fstat = entry.stat()
+            except OSError:
+                # Broken link or removed while listing
+                isdir = False
+                fstat = None
+            path = entry.path
+            if fstat is None:
+                snapshot[normcase(path)] = (path, False, 0, -1, 0)
+            else:
+                snapshot[normcase(path)] = (path, isdir, fstat.st_mtime,
+                                            fstat.st_size, fstat.st_ino)
+    else:
+        pjoin = os.path.join
+        dostat = os.stat
+        isdir = stat.S_ISDIR
+        for fname in os.listdir(dpath):
+            path = pjoin(dpath, fname)
+            try:
+                fstat = dostat(path)
+            except OSError:
+                snapshot[normcase(path)] = (path, False, 0, -1, 0)
+                continue
+            snapshot[normcase(path)] = (path, isdir(fstat.st_mode),
+                                        fstat.st_mtime, fstat.st_size,
+                                        fstat.st_ino)
+    return snapshot
+
+def _SnapshotFromDirectory(dobj):
+    """Convert a L{fileutil.Directory} object to a snapshot. Only the
+    modification times are known so sizes and inodes are not compared.
+    @param dobj: L{fileutil.Directory}
+    @return: dict (see L{_TakeSnapshot})
+
+    """
+    normcase = os.path.normcase
+    return dict((normcase(fobj.Path),
+                 (fobj.Path, isinstance(fobj, fileutil.Directory),
+                  fobj.ModTime, None, None))
+                for fobj in dobj.Files)
+
+def _MakeFileObject(entry):
+    """Create the file object for a snapshot entry
+    @param entry: snapshot entry tuple
+    @return: L{fileutil.File} or L{fileutil.Directory}
+
+    """
+    if entry[1]:
+        return fileutil.Directory(entry[0])
+    return fileutil.File(entry[0])
+
+def _DiffSnapshots(old, new, added, deleted, modified):
+    """Compare two snapshots of a directory
+    @param old: previous snapshot
+    @param new: current snapshot
+    @param added: list to add new file objects to
+    @param deleted: list to add removed file objects to
+    @param modified: list to add changed file objects to
+
+    """
+    for key, entry in old.iteritems():
+        if key not in new:
+            deleted.append(_MakeFileObject(entry))
+
+    for key, entry in new.iteritems():
+        prev = old.get(key, None)
+        if prev is None:
+            added.append(_MakeFileObject(entry))
+        elif prev[3] is None:
+            # Snapshot from a directory object only has the mtime
+            if prev[2] < entry[2]:
+                modified.append(_MakeFileObject(entry))
+        elif prev[2:] != entry[2:]:
+            modified.append(_MakeFileObject(entry))
+
+#-----------------------------------------------------------------------------#
     
 class WatcherThread(threading.Thread):
     """Background thread to monitor a directory"""
@@ -148,6 +281,7 @@ class WatcherThread(threading.Thread):
         assert callable(notifier)
         self._notifier = notifier
         self._dirs = list() # Directories being monitored
+        self._snapshots = dict() # normalized path -> snapshot
         self._refreshDirs = None
 
         self._freq = checkFreq # Monitoring frequency in milliseconds
@@ -177,51 +311,34 @@ class WatcherThread(threading.Thread):
                     self._suspendcond.wait()
 
             with self._lock:
-                for dobj in self._PendingRefresh:
+                for dobj in list(self._PendingRefresh):
                     if not self._continue:
                         return
                     elif self._changePending:
                         break
 
                     # Check if a watched directory has been deleted
+                    key = _NormPath(dobj.Path)
                     if not os.path.exists(dobj.Path):
                         deleted.append(dobj)
-                        self._dirs.remove(dobj)
+                        if key in self._snapshots:
+                            del self._snapshots[key]
+                            self._dirs.remove(dobj)
+                        continue
+
+                    try:
+                        snapshot = _TakeSnapshot(dobj.Path)
+                    except OSError:
                         continue
 
-                    snapshot = fileutil.GetDirectoryObject(dobj.Path, 
-                                                           False, True)
-
-                    # Check for deletions
-                    dobjFiles = dobj.Files # optimization
-                    dobjIndex = dobjFiles.index # optimization
-                    snapFiles = snapshot.Files # optimization
-                    for tobj in dobjFiles:
-                        if not self._continue:
-                            return
-                        elif self._changePending:
-                            break
-                        if tobj not in snapFiles:
-                            deleted.append(tobj)
-                            dobjFiles.remove(tobj)
-
-                    # Check for additions and modifications
-                    for tobj in snapFiles:
-                        if not self._continue:
-                            return
-                        elif self._changePending:
-                            break
-                        if tobj not in dobjFiles:
-                            # new object was added
-                            added.append(tobj)
-                            dobjFiles.append(tobj)
-                        else:
-                            idx = dobjIndex(tobj)
-                            existing = dobjFiles[idx]
-                            # object was modified
-                            if existing.ModTime < tobj.ModTime:
-                                modified.append(tobj)
-                                existing.ModTime = tobj.ModTime
+                    # Compare against the watched state of the directory
+                    # or the given directory object.
+                    previous = self._snapshots.get(key, None)
+                    if previous is None:
+                        previous = _SnapshotFromDirectory(dobj)
+                    else:
+                        self._snapshots[key] = snapshot
+                    _DiffSnapshots(previous, snapshot, added, deleted, modified)
 
             # Call Notifier if anything changed
             if any((added, deleted, modified)):
@@ -254,17 +371,17 @@ class WatcherThread(threading.Thread):
 
         """
         assert os.path.isdir(dpath)
-        dobj = fileutil.Directory(dpath)
+        key = _NormPath(dpath)
         self._changePending = True
         with self._lock:
-            if dobj not in self._dirs and os.access(dobj.Path, os.R_OK):
+            if key not in self._snapshots and os.access(dpath, os.R_OK):
                 # Get current snapshot of the directory
                 try:
-                    dobj = fileutil.GetDirectoryObject(dpath, False, True)
+                    self._snapshots[key] = _TakeSnapshot(dpath)
                 except OSError:
                     self._changePending = False
                     return False
-                self._dirs.append(dobj)
+                self._dirs.append(fileutil.Directory(dpath))
                 with self._listEmptyCond:
                     self._listEmptyCond.notify()
         self._changePending = False
@@ -275,16 +392,16 @@ class WatcherThread(threading.Thread):
         @param dpath: directory path to remove (unicode)
 
         """
-        dobj = fileutil.Directory(dpath)
+        key = _NormPath(dpath)
         self._changePending = True
         with self._lock:
-            if dobj in self._dirs:
-                self._dirs.remove(dobj)
             # Also remove any subpaths of dpath
             toremove = list()
             for d in self._dirs:
-                if fileutil.IsSubPath(d.Path, dpath):
+                dkey = _NormPath(d.Path)
+                if dkey == key or fileutil.IsSubPath(dkey, key):
                     toremove.append(d)
+                    self._snapshots.pop(dkey, None)
             for todel in toremove:
                 self._dirs.remove(todel)
         self._changePending = False
@@ -329,3 +446,256 @@ class WatcherThread(threading.Thread):
         self._suspend = False
         with self._suspendcond:
             self._suspendcond.notify()
+
+#-----------------------------------------------------------------------------#
+
+def _ListDirectory(dpath):
+    """Get the entries of a directory
+    @param dpath: directory path
+    @return: dict {name : isdir}
+
+    """
+    isdir = os.path.isdir
+    pjoin = os.path.join
+    return dict((name, isdir(pjoin(dpath, name)))
+                for name in os.listdir(dpath))
+
+class InotifyWatcherThread(threading.Thread):
+    """Background thread to monitor directories using inotify change
+    notifications instead of polling. The interface and notifications are
+    the same as L{WatcherThread} but the thread sleeps until something
+    changes. When checkFreq is zero or less changes are still delivered as
+    they happen and L{Refresh} rescans the directories to resynchronize.
+
+    """
+    _MASK = _inotify.IN_CREATE | _inotify.IN_DELETE | \
+            _inotify.IN_MOVED_FROM | _inotify.IN_MOVED_TO | \
+            _inotify.IN_MODIFY | _inotify.IN_ATTRIB | \
+            _inotify.IN_CLOSE_WRITE | _inotify.IN_DELETE_SELF | \
+            _inotify.IN_MOVE_SELF | _inotify.IN_ONLYDIR
+    _SETTLE = 0.1 # Seconds to let a burst of changes collect
+
+    def __init__(self, notifier, checkFreq=1000.0):
+        """Create the InotifyWatcherThread
+        @param notifier: callable([added,], [deleted,], [modified,])
+        @keyword checkFreq: check frequency in milliseconds (unused)
+        @raise OSError: if an inotify instance could not be created
+
+        """
+        super(InotifyWatcherThread, self).__init__()
+
+        # Attributes
+        assert callable(notifier)
+        self._notifier = notifier
+        self._inotify = _inotify.Inotify()
+        self._dirs = dict()     # abspath -> (path, wd, {name : isdir})
+        self._watches = dict()  # wd -> set(abspath,)
+        self._pending = set()   # (abspath, name) changed since last notify
+        self._modified = set()  # (abspath, name) with modified contents
+        self._lost = set()      # watched directories deleted or moved
+        self._resync = set()    # watched directories to rescan
+
+        self._freq = checkFreq
+        self._continue = True
+        self._lock = threading.Lock()
+        self._suspend = False
+        self._suspendcond = threading.Condition()
+        self.daemon = True
+
+    def run(self):
+        """Run the watcher"""
+        try:
+            while self._continue:
+                # Suspend processing if requested
+                if self._suspend:
+                    with self._suspendcond:
+                        while self._suspend and self._continue:
+                            self._suspendcond.wait()
+                    continue
+
+                if self._inotify.Wait():
+                    time.sleep(self._SETTLE)
+
+                with self._lock:
+                    self._ProcessEvents(self._inotify.Read())
+                    added, deleted, modified = self._CollectChanges()
+
+                # Call Notifier if anything changed
+                if self._continue and any((added, deleted, modified)):
+                    self._notifier(added, deleted, modified)
+        finally:
+            self._inotify.Close()
+
+    #---- Implementation ----#
+
+    def _CollectChanges(self):
+        """Check the current state of the files that events were received
+        for against the last known state of their directory.
+        @return: tuple ([added,], [deleted,], [modified,])
+
+        """
+        added = list()
+        deleted = list()
+        modified = list()
+
+        # Watched directories that no longer exist
+        lost = set()
+        for key in self._lost:
+            if key in self._dirs and not os.path.exists(self._dirs[key][0]):
+                lost.add(self._dirs[key][0])
+                deleted.append(fileutil.Directory(self._dirs[key][0]))
+                self._RemoveWatch(key)
+        self._lost.clear()
+
+        # Rescan directories that may have missed events
+        for key in self._resync:
+            if key in self._dirs:
+                names = set(self._dirs[key][2])
+                try:
+                    names.update(os.listdir(self._dirs[key][0]))
+                except OSError:
+                    pass
+                self._pending.update((key, name) for name in names)
+        self._resync.clear()
+
+        exists = os.path.lexists
+        for key, name in self._pending:
+            if key not in self._dirs:
+                continue
+
+            dpath, wd, files = self._dirs[key]
+            path = os.path.join(dpath, name)
+            isdir = files.get(name, None)
+            if isdir is None:
+                if exists(path):
+                    isdir = os.path.isdir(path)
+                    files[name] = isdir
+                    if isdir:
+                        added.append(fileutil.Directory(path))
+                    else:
+                        added.append(fileutil.File(path))
+            elif not exists(path):
+                del files[name]
+                if path in lost:
+                    continue # Already reported as a lost watch directory
+                if isdir:
+                    deleted.append(fileutil.Directory(path))
+                else:
+                    deleted.append(fileutil.File(path))
+            elif (key, name) in self._modified:
+                modified.append(fileutil.File(path))
+
+        self._pending.clear()
+        self._modified.clear()
+        return added, deleted, modified
+
+    def _ProcessEvents(self, events):
+        """Record the files that have changed from a list of inotify events
+        @param events: list from L{_inotify.Inotify.Read}
+
+        """
+        for wd, mask, cookie, name in events:
+            if mask & _inotify.IN_Q_OVERFLOW:
+                # Events were lost so everything needs to be checked
+                self._resync.update(self._dirs.keys())
+                continue
+
+            for key in self._watches.get(wd, ()):
+                if mask & (_inotify.IN_DELETE_SELF | _inotify.IN_MOVE_SELF |
+                           _inotify.IN_IGNORED):
+                    self._lost.add(key)
+                elif name:
+                    self._pending.add((key, name))
+                    if mask & (_inotify.IN_MODIFY | _inotify.IN_ATTRIB |
+                               _inotify.IN_CLOSE_WRITE):
+                        self._modified.add((key, name))
+
+    def _RemoveWatch(self, key):
+        """Stop watching a directory
+        @param key: absolute path of directory
+
+        """
+        dpath, wd, files = self._dirs.pop(key)
+        keys = self._watches.get(wd, set())
+        keys.discard(key)
+        if not keys:
+            self._watches.pop(wd, None)
+            self._inotify.RemoveWatch(wd)
+
+    #---- Public Api ----#
+
+    def AddWatchDirectory(self, dpath):
+        """Add a directory to the watch list
+        @param dpath: directory path (unicode)
+        @return: bool - True means watch was added, False means unable to list directory
+
+        """
+        assert os.path.isdir(dpath)
+        key = os.path.abspath(dpath)
+        with self._lock:
+            if key not in self._dirs and os.access(dpath, os.R_OK):
+                # Watch before listing so that no changes are missed
+                try:
+                    wd = self._inotify.AddWatch(dpath, self._MASK)
+                    files = _ListDirectory(dpath)
+                except OSError:
+                    return False
+                self._dirs[key] = (dpath, wd, files)
+                self._watches.setdefault(wd, set()).add(key)
+        return True
+
+    def RemoveWatchDirectory(self, dpath):
+        """Remove a directory from the watch
+        @param dpath: directory path to remove (unicode)
+
+        """
+        with self._lock:
+            # Also remove any subpaths of dpath
+            for key in self._dirs.keys():
+                if fileutil.IsSubPath(key, dpath):
+                    self._RemoveWatch(key)
+
+    def GetFrequency(self):
+        """Get the update frequency
+        @return: int (milliseconds)
+
+        """
+        return self._freq
+
+    def SetFrequency(self, milli):
+        """Set the update frequency
+        @param milli: int (milliseconds)
+
+        """
+        self._freq = float(milli)
+
+    def Refresh(self, paths=None):
+        """Rescan the monitored directories. Changes are normally delivered
+        as they happen so this is only needed to resynchronize.
+        @keyword paths: if None refresh all, else list of specific directories
+
+        """
+        with self._lock:
+            if paths is None:
+                self._resync.update(self._dirs.keys())
+            else:
+                for dobj in paths:
+                    self._resync.add(os.path.abspath(dobj.Path))
+        self._inotify.Wakeup()
+
+    def Shutdown(self):
+        """Shut the thread down"""
+        self._continue = False
+        self.Continue()
+        self._inotify.Wakeup()
+
+    def Suspend(self):
+        """Suspend the thread"""
+        self._suspend = True
+        self._inotify.Wakeup()
+
+    def Continue(self):
+        """Continue the thread"""
+        self._suspend = False
+        with self._suspendcond:
+            self._suspendcond.notify()
@@ -0,0 +1,221 @@
+###############################################################################
+# Name: _inotify.py                                                           #
+# Purpose: Linux inotify bindings                                             #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# Licence: wxWindows Licence                                                  #
+###############################################################################
+
+"""
+Editra Business Model Library: Inotify
+
+Minimal ctypes bindings for the Linux inotify file system notification api.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+__all__ = [ 'Inotify', 'IsSupported', ]
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+#-----------------------------------------------------------------------------#
+# Globals
+
+# Event masks (linux/inotify.h)
+IN_ACCESS        = 0x00000001
+IN_MODIFY        = 0x00000002
+IN_ATTRIB        = 0x00000004
+IN_CLOSE_WRITE   = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN          = 0x00000020
+IN_MOVED_FROM    = 0x00000040
+IN_MOVED_TO      = 0x00000080
+IN_CREATE        = 0x00000100
+IN_DELETE        = 0x00000200
+IN_DELETE_SELF   = 0x00000400
+IN_MOVE_SELF     = 0x00000800
+IN_UNMOUNT       = 0x00002000
+IN_Q_OVERFLOW    = 0x00004000
+IN_IGNORED       = 0x00008000
+IN_ONLYDIR       = 0x01000000
+IN_DONT_FOLLOW   = 0x02000000
+IN_ISDIR         = 0x40000000
+
+# inotify_init1 flags
+IN_CLOEXEC  = 0x80000       # O_CLOEXEC
+IN_NONBLOCK = 0x800         # O_NONBLOCK
+
+_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+_READ_SIZE = 64 * 1024
+_FS_ENCODING = sys.getfilesystemencoding() or 'utf-8'
+
+_LIBC = None
+if sys.platform.startswith('linux'):
+    try:
+        import fcntl
+        _LIBC = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                            use_errno=True)
+        _LIBC.inotify_init1
+        _LIBC.inotify_add_watch
+        _LIBC.inotify_rm_watch
+    except (ImportError, OSError, AttributeError):
+        _LIBC = None
+
+#-----------------------------------------------------------------------------#
+
+def IsSupported():
+    """Is inotify available on this system
+    @return: bool
+
+    """
+    return _LIBC is not None
+
+def _RaiseErrno(path=None):
+    """Raise an OSError for the current value of errno"""
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err), path)
+
+#-----------------------------------------------------------------------------#
+
+class Inotify(object):
+    """Inotify instance for watching file system paths"""
+    def __init__(self):
+        """Create the inotify instance
+        @raise OSError: if inotify is not supported or no more instances
+                        can be created.
+
+        """
+        super(Inotify, self).__init__()
+
+        if _LIBC is None:
+            raise OSError(errno.ENOSYS, "inotify is not supported")
+
+        # Attributes
+        self._fd = _LIBC.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            _RaiseErrno()
+
+        # Pipe used to interrupt a L{Wait} from another thread
+        self._wake = os.pipe()
+        for fd in self._wake:
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+            fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+    def __del__(self):
+        self.Close()
+
+    def AddWatch(self, path, mask):
+        """Add or update a watch on the given path
+        @param path: file system path
+        @param mask: IN_* event mask
+        @return: int (watch descriptor)
+        @raise OSError: if the path cannot be watched
+
+        """
+        if isinstance(path, unicode):
+            bpath = path.encode(_FS_ENCODING)
+        else:
+            bpath = path
+        wd = _LIBC.inotify_add_watch(self._fd, bpath, ctypes.c_uint32(mask))
+        if wd < 0:
+            _RaiseErrno(path)
+        return wd
+
+    def Close(self):
+        """Close the inotify instance, all watches are removed"""
+        if getattr(self, '_fd', -1) >= 0:
+            os.close(self._fd)
+            self._fd = -1
+            for fd in self._wake:
+                os.close(fd)
+            self._wake = (-1, -1)
+
+    def fileno(self):
+        """Get the file descriptor to wait on (i.e with select)
+        @return: int
+
+        """
+        return self._fd
+
+    def Read(self):
+        """Read all the pending events without blocking
+        @return: list of tuples [(wd, mask, cookie, name),]. name is the
+                 name of the file in the watched directory or an empty
+                 string for events on the watched path itself.
+
+        """
+        events = list()
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except OSError, msg:
+                if msg.errno in (errno.EAGAIN, errno.EINTR):
+                    break
+                raise
+
+            if not data:
+                break
+
+            pos = 0
+            hsize = _EVENT_HEADER.size
+            while pos + hsize <= len(data):
+                wd, mask, cookie, nlen = _EVENT_HEADER.unpack_from(data, pos)
+                pos += hsize
+                name = data[pos:pos + nlen].rstrip('\0')
+                pos += nlen
+                try:
+                    name = name.decode(_FS_ENCODING)
+                except UnicodeDecodeError:
+                    pass
+                events.append((wd, mask, cookie, name))
+        return events
+
+    def RemoveWatch(self, wd):
+        """Remove a watch
+        @param wd: watch descriptor from L{AddWatch}
+
+        """
+        # Fails if the watch was already removed by the kernel
+        _LIBC.inotify_rm_watch(self._fd, wd)
+
+    def Wait(self, timeout=None):
+        """Block until there are events to read, L{Wakeup} is called or the
+        timeout expires.
+        @keyword timeout: seconds to wait or None to wait forever
+        @return: bool (True if there are events to read)
+
+        """
+        try:
+            ready = select.select([self._fd, self._wake[0]], [], [], timeout)[0]
+        except select.error, msg:
+            if msg[0] == errno.EINTR:
+                return False
+            raise
+
+        if self._wake[0] in ready:
+            try:
+                while os.read(self._wake[0], 512):
+                    pass
+            except OSError:
+                pass
+        return self._fd in ready
+
+    def Wakeup(self):
+        """Interrupt a thread that is blocked in L{Wait}"""
+        try:
+            os.write(self._wake[1], '\0')
+        except OSError:
+            pass # Pipe is full so a wakeup is already pending
@@ -9,7 +9,13 @@
 """
 Editra Business Model Library: FileBackupMgr
 
-Helper class for managing and creating backups of files.
+Helper class for managing and creating backups of files. A number of older
+backups can be kept by rotating them (backup, backup.1, backup.2, ...) each
+time a new backup is made. Each backup can be gzip compressed, in which case
+.gz is added to its name (backup.gz, backup.1.gz, ...).
+
+Backup copies are made in one pass over the file. On Linux the data is
+copied by the kernel with copy_file_range or sendfile when possible.
 
 """
 
@@ -22,12 +28,99 @@ __all__ = [ 'FileBackupMgr', ]
 #-----------------------------------------------------------------------------#
 # Imports
 import os
+import sys
+import gzip
+import errno
 import shutil
+import ctypes
+import ctypes.util
+import tempfile
 
 # Local Imports
 import fileutil
 import fchecker
 
+#-----------------------------------------------------------------------------#
+# Globals
+_GZIP_LEVEL = 1 # Favor speed, backups are replaced often
+_GZIP_EXT = u".gz"
+_COPY_SIZE = 1024 * 1024        # Buffer size for copying in user space
+_KERNEL_COPY_SIZE = 0x7ffff000  # Largest single kernel copy on Linux
+
+# Kernel copy functions, each called as func(src_fd, dest_fd, count)
+_KERNEL_COPY = list()
+if sys.platform.startswith('linux'):
+    try:
+        _LIBC = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                            use_errno=True)
+    except OSError:
+        _LIBC = None
+
+    if hasattr(_LIBC, 'copy_file_range'):
+        _LIBC.copy_file_range.restype = ctypes.c_ssize_t
+        _LIBC.copy_file_range.argtypes = [ctypes.c_int, ctypes.c_void_p,
+                                          ctypes.c_int, ctypes.c_void_p,
+                                          ctypes.c_size_t, ctypes.c_uint]
+        _KERNEL_COPY.append(lambda src, dest, count: \
+                            _LIBC.copy_file_range(src, None, dest, None,
+                                                  count, 0))
+    if hasattr(_LIBC, 'sendfile'):
+        _LIBC.sendfile.restype = ctypes.c_ssize_t
+        _LIBC.sendfile.argtypes = [ctypes.c_int, ctypes.c_int,
+                                   ctypes.c_void_p, ctypes.c_size_t]
+        _KERNEL_COPY.append(lambda src, dest, count: \
+                            _LIBC.sendfile(dest, src, None, count))
+
+#-----------------------------------------------------------------------------#
+
+def _CopyData(src, dest):
+    """Copy the rest of a file from its current position to another file.
+    The kernel copy functions are tried first, what they could not copy is
+    copied with normal reads and writes.
+    @param src: file descriptor to read from
+    @param dest: file descriptor to write to
+    @raise OSError: if the data could not be copied
+
+    """
+    for kcopy in _KERNEL_COPY:
+        copied = 0
+        while True:
+            count = kcopy(src, dest, _KERNEL_COPY_SIZE)
+            if count <= 0:
+                break
+            copied += count
+
+        if count == 0:
+            return # Reached the end of the file
+        err = ctypes.get_errno()
+        if copied or err not in (errno.EINVAL, errno.ENOSYS, errno.EXDEV,
+                                 errno.EOPNOTSUPP, errno.EBADF):
+            raise OSError(err, os.strerror(err))
+        # Not supported for these files so try the next method
+
+    data = os.read(src, _COPY_SIZE)
+    while len(data):
+        while len(data):
+            data = data[os.write(dest, data):]
+        data = os.read(src, _COPY_SIZE)
+
+def _RemoveOther(backup, compressed):
+    """Remove the other kind (plain or compressed) of a backup file
+    @param backup: path of the backup (without .gz)
+    @param compressed: the compressed backup is kept
+
+    """
+    if compressed:
+        other = backup
+    else:
+        other = backup + _GZIP_EXT
+
+    if os.path.exists(other):
+        try:
+            os.remove(other)
+        except OSError:
+            pass
+
 #-----------------------------------------------------------------------------#
 
 class FileBackupMgr(object):
@@ -45,6 +138,7 @@ class FileBackupMgr(object):
         self.header = header       # Backup id header
         self.template = template   # Filename template
         self.bkupdir = u""
+        self.count = 1             # Number of backups to keep
 
     def _CheckHeader(self, fname):
         """Check if the backup file has a header that matches the
@@ -59,13 +153,83 @@ class FileBackupMgr(object):
             handle = open(fname, 'r')
             line = handle.readline()
             handle.close()
-            isok = line.startswith(self.header)
+            isok = line.startswith(self._GetHeaderLine()[:-len(os.linesep)])
         except Exception, msg:
             isok = False
             if handle:
                 handle.close()
         return isok
 
+    def _GetHeaderLine(self):
+        """Get the header line that is written at the start of backups
+        @return: byte string (empty if there is no header)
+
+        """
+        if not self.header:
+            return ''
+        header = self.header + os.linesep
+        if isinstance(header, unicode):
+            header = header.encode('utf-8')
+        return header
+
+    @staticmethod
+    def _FindBackup(backup):
+        """Find the file of a backup, which may be gzip compressed
+        @param backup: path of the backup (without .gz)
+        @return: string (path) or None if there is no backup
+
+        """
+        found = [ path for path in (backup, backup + _GZIP_EXT)
+                  if os.path.exists(path) ]
+        if not len(found):
+            return None
+        return max(found, key=fileutil.GetFileModTime)
+
+    def _MakeTempFile(self, backup):
+        """Create the temporary file that a backup is written to
+        @param backup: path of the backup
+        @return: tuple (fd, path)
+
+        """
+        dname, bname = os.path.split(backup)
+        return tempfile.mkstemp(prefix=u".%s." % bname, suffix=u".tmp",
+                                dir=dname or os.curdir)
+
+    def _ReplaceBackup(self, tmp, backup, compressed=False):
+        """Move a newly written backup into place, rotating the older
+        backups if more than one is kept. Only one kind of backup (plain or
+        compressed) is kept in each place.
+        @param tmp: path of the new backup
+        @param backup: path of the backup (without .gz)
+        @keyword compressed: the new backup is gzip compressed
+
+        """
+        if self.count > 1:
+            names = [backup] + [u"%s.%d" % (backup, num)
+                                for num in range(1, self.count)]
+            for idx in range(len(names) - 1, 0, -1):
+                src = self._FindBackup(names[idx - 1])
+                if src is not None:
+                    iscomp = src != names[idx - 1]
+                    dest = names[idx]
+                    if iscomp:
+                        dest += _GZIP_EXT
+                    fileutil.ReplaceFile(src, dest)
+                    _RemoveOther(names[idx], iscomp)
+
+        dest = backup
+        if compressed:
+            dest += _GZIP_EXT
+        fileutil.ReplaceFile(tmp, dest)
+        _RemoveOther(backup, compressed)
+
+    def GetBackupCount(self):
+        """Get the number of backups that are kept of each file
+        @return: int
+
+        """
+        return self.count
+
     def GetBackupFilename(self, fname):
         """Get the unique name for the files backup copy
         @param fname: string (file path)
@@ -111,7 +275,7 @@ class FileBackupMgr(object):
 
         """
         backup = self.GetBackupFilename(fname)
-        return os.path.exists(backup)
+        return self._FindBackup(backup) is not None
 
     def IsBackupNewer(self, fname):
         """Is the backup of this file newer than the saved version
@@ -120,8 +284,8 @@ class FileBackupMgr(object):
         @return: bool
 
         """
-        backup = self.GetBackupFilename(fname)
-        if os.path.exists(fname) and os.path.exists(backup):
+        backup = self._FindBackup(self.GetBackupFilename(fname))
+        if os.path.exists(fname) and backup is not None:
             mod1 = fileutil.GetFileModTime(backup)
             mod2 = fileutil.GetFileModTime(fname)
             return mod1 > mod2
@@ -129,26 +293,38 @@ class FileBackupMgr(object):
             return False
 
     def MakeBackupCopy(self, fname):
-        """Create a backup copy of the given filename
+        """Create a backup copy of the given filename. The header and the
+        file are written to the backup in a single pass.
         @param fname: string (file path)
         @return: bool (True == Success)
 
         """
         backup = self.GetBackupFilename(fname)
+        tmp = None
         try:
-            if os.path.exists(backup):
-                os.remove(backup)
+            fd, tmp = self._MakeTempFile(backup)
+            try:
+                header = self._GetHeaderLine()
+                while len(header):
+                    header = header[os.write(fd, header):]
 
-            shutil.copy2(fname, backup)
-            if self.header:
-                handle = open(backup, 'r')
-                txt = handle.read()
-                handle.close()
-                handle = open(backup, 'w')
-                handle.write(self.header + os.linesep)
-                handle.write(txt)
-                handle.close()
-        except:
+                src = os.open(fname, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+                try:
+                    _CopyData(src, fd)
+                finally:
+                    os.close(src)
+            finally:
+                os.close(fd)
+
+            # Only the permissions are copied, the backup is newer
+            shutil.copymode(fname, tmp)
+            self._ReplaceBackup(tmp, backup)
+        except EnvironmentError:
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
             return False
         else:
             return True
@@ -162,6 +338,15 @@ class FileBackupMgr(object):
         """
         self.bkupdir = path 
 
+    def SetBackupCount(self, count):
+        """Set the number of backups to keep of each file. When more than
+        one is kept the older backups are named backup.1, backup.2, ...
+        @param count: int (>= 1)
+
+        """
+        assert count >= 1, "At least one backup must be kept"
+        self.count = count
+
     def SetBackupFileTemplate(self, tstr):
         """Set the filename template for generating the backupfile name
         @param tstr: template string i.e) %s~
@@ -177,3 +362,42 @@ class FileBackupMgr(object):
         """
         assert '\n' not in header, "Header must only be a single line"
         self.header = header
+
+    def WriteBackup(self, fname, chunks, compress=False):
+        """Write a backup of a file from its encoded contents. The backup is
+        written to a temporary file that replaces the old backup when it is
+        complete.
+        @param fname: string (path of the file being backed up)
+        @param chunks: list of byte strings
+        @keyword compress: write a gzip compressed backup (.gz is added to
+                           the name of the backup)
+        @return: string (path of the backup)
+        @raise EnvironmentError: if the backup could not be written
+
+        """
+        backup = self.GetBackupFilename(fname)
+        bname = os.path.basename(backup)
+        fd, tmp = self._MakeTempFile(backup)
+        try:
+            handle = os.fdopen(fd, 'wb')
+            try:
+                writer = handle
+                if compress:
+                    writer = gzip.GzipFile(bname, 'wb', _GZIP_LEVEL, handle)
+                writer.write(self._GetHeaderLine())
+                writer.writelines(chunks)
+                if writer is not handle:
+                    writer.close()
+            finally:
+                handle.close()
+            self._ReplaceBackup(tmp, backup, compress)
+        except:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+        if compress:
+            backup += _GZIP_EXT
+        return backup
@@ -22,11 +22,25 @@ __all__ = [ 'FileTypeChecker', ]
 #-----------------------------------------------------------------------------#
 # Imports
 import os
+from StringIO import StringIO
+
+# Local Imports
+import histcache
+
+#-----------------------------------------------------------------------------#
+# Globals
+_CACHE_SIZE = 4096  # Max number of cached file classifications
+
+_BINARY_CACHE = histcache.LRUCache(_CACHE_SIZE)
 
 #-----------------------------------------------------------------------------#
 
 class FileTypeChecker(object):
-    """File type checker and recognizer"""
+    """File type checker and recognizer. The results of checking a file
+    are cached for as long as the size and modification time of the file
+    remain the same.
+
+    """
     TXTCHARS = ''.join(map(chr, [7, 8, 9, 10, 12, 13, 27] + range(0x20, 0x100)))
     ALLBYTES = ''.join(map(chr, range(256)))
 
@@ -53,17 +67,45 @@ class FileTypeChecker(object):
             handle = None
         return handle
 
+    def _GetKey(self, fname, fstat=None):
+        """Get the classification cache key for the given file
+        @param fname: filename
+        @keyword fstat: stat result of the file if already known
+        @return: tuple or None if the file cannot be stat'd
+
+        """
+        try:
+            if fstat is None:
+                fstat = os.stat(fname)
+        except (IOError, OSError):
+            return None
+        return (fname, fstat.st_size, fstat.st_mtime, self._preread)
+
+    @staticmethod
+    def ClearCache():
+        """Clear the shared file classification cache"""
+        _BINARY_CACHE.Clear()
+
     def IsBinary(self, fname):
         """Is the file made up of binary data
         @param fname: filename to check
         @return: bool
 
         """
+        key = self._GetKey(fname)
+        if key is not None:
+            binary = _BINARY_CACHE.Get(key)
+            if binary is not None:
+                return binary
+
         handle = self._GetHandle(fname)
         if handle is not None:
             bytes = handle.read(self._preread)
             handle.close()
-            return self.IsBinaryBytes(bytes)
+            binary = self.IsBinaryBytes(bytes)
+            if key is not None:
+                _BINARY_CACHE.Put(key, binary)
+            return binary
         else:
             return False
 
@@ -87,3 +129,104 @@ class FileTypeChecker(object):
         if os.access(fname, os.R_OK):
             f_ok = not self.IsBinary(fname)
         return f_ok
+
+    def OpenReadableText(self, fname):
+        """Open the given file for reading if it is readable as text. The
+        bytes read to check the file type are reused as the start of the
+        returned file's data so the file is only opened and read once.
+        @param fname: filename
+        @return: file like object or None if the file is binary or cannot
+                 be read.
+
+        """
+        handle = self._GetHandle(fname)
+        if handle is None:
+            return None
+
+        try:
+            key = self._GetKey(fname, os.fstat(handle.fileno()))
+            binary = _BINARY_CACHE.Get(key)
+            if not binary:
+                prefix = handle.read(self._preread)
+        except (IOError, OSError):
+            binary = True
+
+        if binary is None:
+            binary = self.IsBinaryBytes(prefix)
+            _BINARY_CACHE.Put(key, binary)
+
+        if binary:
+            handle.close()
+            return None
+        return _SniffedFile(prefix, handle)
+
+#-----------------------------------------------------------------------------#
+
+class _SniffedFile(object):
+    """Read only file object that joins the prefix that was read to check
+    the file type with the rest of the file.
+
+    """
+    def __init__(self, prefix, handle):
+        super(_SniffedFile, self).__init__()
+
+        # Attributes
+        self._prefix = prefix
+        self._handle = handle
+
+    def __iter__(self):
+        """Iterate over the lines of the file"""
+        last = ''
+        for line in StringIO(self._prefix):
+            if line.endswith('\n'):
+                yield line
+            else:
+                last = line # Partial line continued in the file
+        self._prefix = ''
+
+        for line in self._handle:
+            if last:
+                line = last + line
+                last = ''
+            yield line
+
+        if last:
+            yield last
+
+    def close(self):
+        """Close the file"""
+        self._handle.close()
+
+    def fileno(self):
+        """Get the file descriptor of the underlying file
+        @return: int
+
+        """
+        return self._handle.fileno()
+
+    def peek(self, size):
+        """Get the data at the start of the file without consuming it
+        @param size: number of bytes
+        @return: string
+
+        """
+        if len(self._prefix) < size:
+            self._prefix += self._handle.read(size - len(self._prefix))
+        return self._prefix[:size]
+
+    def read(self, size=-1):
+        """Read from the file
+        @keyword size: number of bytes to read (-1 for all)
+        @return: string
+
+        """
+        if size < 0:
+            data = self._prefix + self._handle.read()
+            self._prefix = ''
+        elif size <= len(self._prefix):
+            data = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+        else:
+            data = self._prefix + self._handle.read(size - len(self._prefix))
+            self._prefix = ''
+        return data
@@ -0,0 +1,310 @@
+###############################################################################
+# Name: filemon.py                                                            #
+# Purpose: Monitor a set of files for changes on disk                         #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# Licence: wxWindows Licence                                                  #
+###############################################################################
+
+"""
+Editra Business Model Library: FileMonitor
+
+Watches a set of files for changes from a background thread. On Linux the
+directories that contain the files are watched with inotify when it is
+available, other files are polled at a fixed interval. Either way the files
+are only ever stat'd on the monitor's thread and without holding the lock that
+adding and removing files needs, so slow file systems don't block callers.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__cvsid__ = "$Id$"
+__revision__ = "$Revision$"
+
+__all__ = ['FileMonitor',]
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import time
+import threading
+
+# Local imports
+import _inotify
+
+#-----------------------------------------------------------------------------#
+
+def _GetState(path):
+    """Get the state of a file that is compared to detect changes
+    @param path: file path
+    @return: tuple (mtime, size, mode) or None if the file does not exist
+
+    """
+    try:
+        fstat = os.stat(path)
+    except (OSError, EnvironmentError):
+        return None
+    return (fstat.st_mtime, fstat.st_size, fstat.st_mode)
+
+#-----------------------------------------------------------------------------#
+
+class FileMonitor(threading.Thread):
+    """Background thread to monitor files for changes. The notifier is
+    called in the context of this thread with a list of (path, mtime)
+    tuples for the files that changed, mtime is 0 for deleted files.
+    Files that are missing or were modified after they were added when
+    they are first checked are reported too.
+
+    """
+    _MASK = _inotify.IN_CREATE | _inotify.IN_DELETE | \
+            _inotify.IN_MOVED_FROM | _inotify.IN_MOVED_TO | \
+            _inotify.IN_MODIFY | _inotify.IN_ATTRIB | \
+            _inotify.IN_CLOSE_WRITE | _inotify.IN_ONLYDIR
+    _SETTLE = 0.1 # Seconds to let a burst of changes collect
+
+    def __init__(self, notifier, checkFreq=2000.0):
+        """Create the monitor, call start to begin monitoring
+        @param notifier: callable([(path, mtime),])
+        @keyword checkFreq: milliseconds between checks of the files that
+                            are not watched by inotify.
+
+        """
+        super(FileMonitor, self).__init__()
+
+        # Attributes
+        assert callable(notifier)
+        self._notifier = notifier
+        self._freq = checkFreq
+        self._files = dict()    # abspath -> [path, refcount, state, added]
+        self._dirs = dict()     # directory abspath -> wd
+        self._names = dict()    # (wd, name) -> abspath
+        self._polled = set()    # abspaths not watched by inotify
+        self._pending = set()   # abspaths to check on the next pass
+        self._lastpoll = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._continue = True
+        self.daemon = True
+
+        self._inotify = None
+        if _inotify.IsSupported():
+            try:
+                self._inotify = _inotify.Inotify()
+            except OSError:
+                pass # Out of inotify instances, poll everything
+
+    def run(self):
+        """Run the monitor"""
+        try:
+            while self._continue:
+                timeout = None
+                if self._polled:
+                    timeout = self._freq / 1000.0
+
+                if self._inotify is not None:
+                    if self._inotify.Wait(timeout):
+                        time.sleep(self._SETTLE)
+                    events = self._inotify.Read()
+                else:
+                    self._wake.wait(timeout)
+                    self._wake.clear()
+                    events = list()
+
+                with self._lock:
+                    self._ProcessEvents(events)
+                    now = time.time()
+                    if now - self._lastpoll >= self._freq / 1000.0:
+                        self._pending.update(self._polled)
+                        self._lastpoll = now
+                    checks = [(key, self._files[key][0])
+                              for key in self._pending if key in self._files]
+                    self._pending.clear()
+
+                # Stat the files without the lock as it can be slow
+                states = [(key, _GetState(path)) for key, path in checks]
+                with self._lock:
+                    changes = self._UpdateStates(states)
+
+                if self._continue and changes:
+                    self._notifier(changes)
+        finally:
+            if self._inotify is not None:
+                self._inotify.Close()
+
+    #---- Implementation ----#
+
+    def _UpdateStates(self, states):
+        """Compare the current states of files with their last known state
+        @param states: list of (abspath, state) tuples
+        @return: list of (path, mtime) tuples for the files that changed
+        @note: the lock must be held by the caller
+
+        """
+        changes = list()
+        for key, state in states:
+            entry = self._files.get(key, None)
+            if entry is None:
+                continue # Removed while it was being checked
+
+            if entry[3]:
+                # First check since the file was added
+                changed = state is None or state[0] >= entry[3]
+                entry[3] = 0
+            else:
+                changed = state != entry[2]
+            entry[2] = state
+
+            if changed:
+                if state is None:
+                    changes.append((entry[0], 0))
+                else:
+                    changes.append((entry[0], state[0]))
+        return changes
+
+    def _ProcessEvents(self, events):
+        """Record the files that have changed from a list of inotify events
+        @param events: list from L{_inotify.Inotify.Read}
+
+        """
+        for wd, mask, cookie, name in events:
+            if mask & _inotify.IN_Q_OVERFLOW:
+                # Events were lost so everything needs to be checked
+                self._pending.update(self._files.keys())
+            elif mask & _inotify.IN_IGNORED:
+                # Directory was removed, fall back to polling its files
+                self._UnwatchDirectory(wd)
+            else:
+                key = self._names.get((wd, name), None)
+                if key is not None:
+                    self._pending.add(key)
+
+    def _UnwatchDirectory(self, wd):
+        """Forget an inotify watch and poll the files that it covered
+        @param wd: watch descriptor
+
+        """
+        for dkey, dwd in self._dirs.items():
+            if dwd == wd:
+                del self._dirs[dkey]
+        for item in [item for item in self._names if item[0] == wd]:
+            key = self._names.pop(item)
+            self._polled.add(key)
+            self._pending.add(key)
+
+    def _WatchFile(self, key):
+        """Start watching a file with inotify if possible
+        @param key: absolute path of the file
+        @return: bool
+
+        """
+        if self._inotify is None:
+            return False
+
+        dkey, name = os.path.split(key)
+        wd = self._dirs.get(dkey, None)
+        if wd is None:
+            try:
+                wd = self._inotify.AddWatch(dkey, self._MASK)
+            except (OSError, UnicodeError):
+                return False
+            self._dirs[dkey] = wd
+        self._names[(wd, name)] = key
+        return True
+
+    #---- Public Api ----#
+
+    def AddFile(self, path):
+        """Add a file to the monitor. Files are reference counted so a file
+        that is added more than once has to be removed as many times.
+        @param path: file path
+
+        """
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._files.get(key, None)
+            if entry is not None:
+                entry[1] += 1
+                return
+
+            # The initial state is taken on the monitor thread
+            self._files[key] = [path, 1, None, time.time()]
+            self._pending.add(key)
+            if not self._WatchFile(key):
+                self._polled.add(key)
+
+        if self._inotify is not None:
+            self._inotify.Wakeup()
+        else:
+            self._wake.set()
+
+    def GetFiles(self):
+        """Get the files that are being monitored
+        @return: list of paths
+
+        """
+        with self._lock:
+            return [entry[0] for entry in self._files.values()]
+
+    def GetFrequency(self):
+        """Get the polling frequency
+        @return: int (milliseconds)
+
+        """
+        return self._freq
+
+    def Refresh(self, paths=None):
+        """Recheck the monitored files
+        @keyword paths: if None check all, else list of specific files
+
+        """
+        with self._lock:
+            if paths is None:
+                self._pending.update(self._files.keys())
+            else:
+                self._pending.update(os.path.abspath(path) for path in paths)
+
+        if self._inotify is not None:
+            self._inotify.Wakeup()
+        else:
+            self._wake.set()
+
+    def RemoveFile(self, path):
+        """Remove a file from the monitor
+        @param path: file path
+
+        """
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._files.get(key, None)
+            if entry is None:
+                return
+
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+
+            del self._files[key]
+            self._polled.discard(key)
+            self._pending.discard(key)
+            dkey, name = os.path.split(key)
+            wd = self._dirs.get(dkey, None)
+            if wd is not None:
+                self._names.pop((wd, name), None)
+                if not [item for item in self._names if item[0] == wd]:
+                    del self._dirs[dkey]
+                    self._inotify.RemoveWatch(wd)
+
+    def SetFrequency(self, milli):
+        """Set the polling frequency
+        @param milli: int (milliseconds)
+
+        """
+        self._freq = float(milli)
+
+    def Shutdown(self):
+        """Shut the thread down"""
+        self._continue = False
+        if self._inotify is not None:
+            self._inotify.Wakeup()
+        else:
+            self._wake.set()
@@ -22,7 +22,8 @@ __all__ = [ 'GetAbsPath', 'GetFileExtension', 'GetFileModTime', 'GetFileName',
             'IsLink', 'MakeNewFile', 'MakeNewFolder', 'PathExists',
             'ResolveRealPath', 'IsExecutable', 'Which', 'ComparePaths',
             'AddFileExtension', 'GetDirectoryObject', 'File', 'Directory',
-            'GetFileManagerCmd', 'OpenWithFileManager', 'IsHidden', 'IsSubPath' ]
+            'GetFileManagerCmd', 'OpenWithFileManager', 'IsHidden', 'IsSubPath',
+            'ReplaceFile' ]
 
 #-----------------------------------------------------------------------------#
 # Imports
@@ -253,6 +254,32 @@ def IsExecutable(path):
     """
     return os.path.isfile(path) and os.access(path, os.X_OK)
 
+def ReplaceFile(src, dest):
+    """Atomically move a file over the destination path, replacing the
+    destination if it exists. Both paths should be on the same file system.
+    @param src: file to move (full path)
+    @param dest: path to replace
+    @raise OSError: if the file could not be moved
+
+    """
+    if not WIN:
+        os.rename(src, dest)
+        return
+
+    # Windows cannot rename over an existing file
+    flags = 0x1 | 0x8 # MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH
+    try:
+        if ctypes.windll.kernel32.MoveFileExW(unicode(src), unicode(dest),
+                                              flags):
+            return
+    except (AttributeError, UnicodeDecodeError):
+        pass
+
+    # Fallback to a non atomic replace
+    if os.path.exists(dest):
+        os.remove(dest)
+    os.rename(src, dest)
+
 @uri2path
 def ResolveRealPath(link):
     """Return the real path of the link file
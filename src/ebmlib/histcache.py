@@ -11,6 +11,9 @@ Editra Buisness Model Library: HistoryCache
 
 History cache that acts as a stack for managing a history list o
 
+The LRUCache is a thread safe least recently used cache that holds a
+limited number of items.
+
 """
 
 __author__ = "Cody Precord <cprecord@editra.org>"
@@ -18,10 +21,12 @@ __cvsid__ = "$Id$"
 __revision__ = "$Revision$"
 
 __all__ = [ 'HistoryCache', 'HIST_CACHE_UNLIMITED',
-            'CycleCache']
+            'CycleCache', 'LRUCache']
 
 #-----------------------------------------------------------------------------#
 # Imports
+import threading
+from collections import OrderedDict
 
 #-----------------------------------------------------------------------------#
 # Globals
@@ -260,3 +265,56 @@ class CycleCache(object):
     def Reset(self):
         """Reset the list reference pointer"""
         self._cpos = -1
+
+#-----------------------------------------------------------------------------#
+
+class LRUCache(object):
+    """Thread safe least recently used cache. When the cache is full the
+    item that was used the longest time ago is removed to make room.
+
+    """
+    def __init__(self, size):
+        """Initialize the cache.
+        @param size: maximum number of items
+
+        """
+        super(LRUCache, self).__init__()
+
+        # Attributes
+        self._size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def Clear(self):
+        """Remove all items from the cache"""
+        with self._lock:
+            self._data.clear()
+
+    def Get(self, key, default=None):
+        """Get an item from the cache
+        @param key: hashable key
+        @keyword default: value to return if the item is not cached
+        @return: cached value or default
+
+        """
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+            self._data[key] = value # Move to most recently used
+            return value
+
+    def Put(self, key, value):
+        """Put an item in the cache
+        @param key: hashable key
+        @param value: object
+
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self._size:
+                self._data.popitem(last=False)
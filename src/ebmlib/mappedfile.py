@@ -0,0 +1,263 @@
+###############################################################################
+# Name: mappedfile.py                                                         #
+# Purpose: Read only memory mapped access to large files                      #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# Licence: wxWindows Licence                                                  #
+###############################################################################
+
+"""
+Editra Business Model Library: MappedFile
+
+Read only access to the lines of a file that is too large to be loaded into
+memory. The file is memory mapped so that only the parts of it that are
+accessed are paged in by the operating system.
+
+Lines are located with a sparse index that records the line number at the
+start of each fixed size block of the file. The index is built
+incrementally as lines further into the file are requested, or all at once
+by L{MappedFile.IndexLines} (i.e from a background thread), and its memory
+use is tiny compared to the size of the file.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__cvsid__ = "$Id$"
+__revision__ = "$Revision$"
+
+__all__ = [ 'MappedFile', ]
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import mmap
+import array
+import bisect
+import threading
+
+#-----------------------------------------------------------------------------#
+# Globals
+_BLOCK_SIZE = 1024 * 1024       # Bytes of the file per index entry
+_SEARCH_SIZE = 4 * _BLOCK_SIZE  # Bytes searched at a time going backwards
+_SEARCH_OVERLAP = 4096          # Overlap for matches that span two searches
+
+#-----------------------------------------------------------------------------#
+
+class MappedFile(object):
+    """Read only memory mapped file with a line index"""
+    def __init__(self, path):
+        """Open and map the file
+        @param path: file path
+        @raise EnvironmentError: if the file cannot be opened or mapped
+
+        """
+        super(MappedFile, self).__init__()
+
+        # Attributes
+        self._path = path
+        self._map = None
+        self._lock = threading.Lock()
+        self._blocks = array.array('L', [0]) # Line number at each block
+        self._lines = -1                     # Line count once indexed
+
+        handle = open(path, 'rb')
+        try:
+            self._size = os.fstat(handle.fileno()).st_size
+            if self._size:
+                self._map = mmap.mmap(handle.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            else:
+                self._lines = 1
+        finally:
+            handle.close()
+
+    Path = property(lambda self: self._path)
+    Size = property(lambda self: self._size)
+
+    #---- Implementation ----#
+
+    def _IndexNext(self):
+        """Add the next block of the file to the index
+        @return: bool (False if the file has been closed)
+        @note: the lock must be held by the caller
+
+        """
+        if self._map is None:
+            return False
+
+        idx = len(self._blocks) - 1
+        start = idx * _BLOCK_SIZE
+        end = min(start + _BLOCK_SIZE, self._size)
+        count = self._blocks[idx] + self._map[start:end].count('\n')
+        if end >= self._size:
+            self._lines = count + 1
+        else:
+            self._blocks.append(count)
+        return True
+
+    def _IndexTo(self, offset):
+        """Extend the index to cover the block that contains the offset
+        @param offset: byte offset
+
+        """
+        with self._lock:
+            while self._lines < 0 and len(self._blocks) <= offset // _BLOCK_SIZE:
+                if not self._IndexNext():
+                    break
+
+    #---- Public Api ----#
+
+    def Close(self):
+        """Unmap the file
+        @note: waits for the block being indexed by L{IndexLines} on
+               another thread, which then stops.
+
+        """
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+    def Find(self, regex, offset=0, down=True):
+        """Find the next match of a regular expression in the file
+        @param regex: compiled (byte string) regex object
+        @keyword offset: byte offset to search from
+        @keyword down: search towards the end of the file
+        @return: tuple (start, end) byte offsets or None
+
+        """
+        if self._map is None:
+            return None
+
+        if down:
+            match = regex.search(self._map, offset)
+            if match is not None:
+                return match.span()
+        else:
+            # Search backwards a section at a time for the last match that
+            # starts before the offset.
+            end = min(offset, self._size)
+            while end > 0:
+                start = max(0, end - _SEARCH_SIZE)
+                last = None
+                for match in regex.finditer(self._map, start,
+                                            min(offset, end + _SEARCH_OVERLAP)):
+                    if match.start() >= end:
+                        break
+                    last = match
+                if last is not None:
+                    return last.span()
+                end = start
+        return None
+
+    def GetLineCount(self):
+        """Get the number of lines in the file, the whole file is indexed
+        if it has not been already.
+        @return: int
+
+        """
+        self.IndexLines()
+        return self._lines
+
+    def GetLineFromOffset(self, offset):
+        """Get the line that contains the given byte offset
+        @param offset: byte offset
+        @return: int (zero based)
+
+        """
+        if self._map is None:
+            return 0
+
+        offset = max(0, min(offset, self._size))
+        self._IndexTo(offset)
+        idx = min(offset // _BLOCK_SIZE, len(self._blocks) - 1)
+        start = idx * _BLOCK_SIZE
+        return self._blocks[idx] + self._map[start:offset].count('\n')
+
+    def GetLineOffset(self, line):
+        """Get the byte offset of the start of a line
+        @param line: line number (zero based)
+        @return: int (size of the file if the line is past the end)
+
+        """
+        if line <= 0 or self._map is None:
+            return 0
+
+        with self._lock:
+            while self._lines < 0 and self._blocks[-1] < line:
+                if not self._IndexNext():
+                    return 0
+
+            if self._lines >= 0 and line >= self._lines:
+                return self._size
+
+            # Walk the newlines from the start of the block that contains
+            # the newline before the line.
+            idx = bisect.bisect_left(self._blocks, line) - 1
+            pos = idx * _BLOCK_SIZE
+            for x in xrange(line - self._blocks[idx]):
+                pos = self._map.find('\n', pos) + 1
+            return pos
+
+    def GetWindow(self, line, count, maxbytes):
+        """Get the range of the file to show about count lines centered
+        around the given line, limited to a maximum number of bytes.
+        @param line: line number (zero based)
+        @param count: number of lines
+        @param maxbytes: maximum number of bytes
+        @return: tuple (start, end) byte offsets
+
+        """
+        if self._map is None:
+            return (0, 0)
+
+        offset = self.GetLineOffset(line)
+        half = maxbytes // 2
+        start = self.GetLineOffset(max(0, line - count // 2))
+        if offset - start > half:
+            idx = self._map.find('\n', offset - half, offset)
+            if idx < 0:
+                start = offset
+            else:
+                start = idx + 1
+
+        end = self.GetLineOffset(line + count // 2)
+        if end - offset > half:
+            idx = self._map.rfind('\n', offset, offset + half)
+            if idx < 0:
+                end = offset + half # Line is too long, show part of it
+            else:
+                end = idx + 1
+        return (start, end)
+
+    def IndexLines(self, cancel=None):
+        """Index all the lines in the file
+        @keyword cancel: callable returning True to stop indexing
+        @return: bool (True if the file is completely indexed)
+
+        """
+        while not self.IsIndexed():
+            if cancel is not None and cancel():
+                return False
+            with self._lock:
+                if self._lines < 0 and not self._IndexNext():
+                    return False # File was closed
+        return True
+
+    def IsIndexed(self):
+        """Is the whole file indexed
+        @return: bool
+
+        """
+        return self._lines >= 0
+
+    def Read(self, start, end):
+        """Read a range of bytes from the file
+        @param start: byte offset
+        @param end: byte offset
+        @return: string
+
+        """
+        if self._map is None:
+            return ''
+        return self._map[start:end]
@@ -0,0 +1,437 @@
+###############################################################################
+# Name: replacer.py                                                           #
+# Purpose: Replace text in files on disk                                      #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# Licence: wxWindows Licence                                                  #
+###############################################################################
+
+"""
+Editra Business Model Library: FileReplacer
+
+Replace the matches of a regular expression in files on disk. Files are
+streamed through the replacement line by line into a temporary file that is
+then moved over the original, so large files are never loaded into memory
+at once and a file is never left partially written. Patterns that can match
+across lines are replaced on the whole file at once instead.
+
+The original contents of every file that is changed can be recorded in a
+L{ReplaceJournal} so that the whole operation can be reverted.
+
+The text of each file is decoded with its detected encoding before it is
+replaced and encoded with the same encoding when it is written. Files whose
+encoding is unknown or that cannot be encoded with the replacement text are
+left untouched and reported by L{FileReplacer.GetErrors}.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__cvsid__ = "$Id$"
+__revision__ = "$Revision$"
+
+__all__ = [ 'FileReplacer', 'ReplaceJournal', ]
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import re
+import types
+import codecs
+import shutil
+import tempfile
+import threading
+import sre_parse
+
+# Local imports
+import fchecker
+import fileutil
+
+#-----------------------------------------------------------------------------#
+# Globals
+_MANIFEST = u"manifest"
+
+# Regex constructs that can match a newline or depend on the text beyond the
+# end of a line.
+_MULTILINE = re.compile(r"[\r\n]|\\[nrsWDZABx0]|\[\^")
+
+# Bytes read from the start of a file to detect its encoding
+_SAMPLE_SIZE = 4096
+
+# Byte order marks that select the byte order of a Unicode encoding. The
+# UTF-32 marks must be checked before the UTF-16 ones.
+_BOMS = ((codecs.BOM_UTF32_LE, 'utf-32-le'),
+         (codecs.BOM_UTF32_BE, 'utf-32-be'),
+         (codecs.BOM_UTF16_LE, 'utf-16-le'),
+         (codecs.BOM_UTF16_BE, 'utf-16-be'),
+         (codecs.BOM_UTF8, 'utf-8'))
+
+#-----------------------------------------------------------------------------#
+
+def _DetectEncoding(fname, sample):
+    """Default encoding detection that only recognizes Unicode files with a
+    byte order mark and UTF-8 (or ASCII) files.
+    @param fname: file path
+    @param sample: bytes from the start of the file
+    @return: encoding name or None
+
+    """
+    for bom, enc in _BOMS:
+        if sample.startswith(bom):
+            return enc
+
+    try:
+        # Incomplete characters at the end of the sample are allowed
+        codecs.getincrementaldecoder('utf-8')().decode(sample)
+    except UnicodeDecodeError:
+        return None
+    return 'utf-8'
+
+def _GetCodec(enc, sample):
+    """Get the codec to decode and encode a file with so that a byte order
+    mark is kept as it is.
+    @param enc: encoding name
+    @param sample: bytes from the start of the file
+    @return: codecs.CodecInfo
+    @raise LookupError: if the encoding is unknown
+
+    """
+    codec = codecs.lookup(enc)
+    if codec.name in ('utf-16', 'utf-32'):
+        for bom, name in _BOMS:
+            if name.startswith(codec.name) and sample.startswith(bom):
+                # Decode the mark as text so it is written back unchanged
+                codec = codecs.lookup(name)
+                break
+    return codec
+
+def _TextRegex(regex):
+    """Get the version of a compiled regular expression that works on the
+    decoded text of a file.
+    @param regex: compiled regex object
+    @return: compiled regex object
+
+    """
+    pattern = regex.pattern
+    if type(pattern) is not types.UnicodeType:
+        return re.compile(pattern.decode('utf-8'), regex.flags | re.UNICODE)
+    return regex
+
+def _IsMultiline(regex):
+    """Can the regular expression match text that spans more than one line
+    @param regex: compiled regex object
+    @return: bool
+
+    """
+    return bool(regex.flags & re.DOTALL) or \
+           _MULTILINE.search(regex.pattern) is not None
+
+def _MakeTempFile(fname):
+    """Create a temporary file next to the given file
+    @param fname: file path
+    @return: tuple (file object, temp file path)
+
+    """
+    dname, bname = os.path.split(fname)
+    handle, tmp = tempfile.mkstemp(prefix=u".%s." % bname,
+                                   suffix=u".tmp", dir=dname)
+    return os.fdopen(handle, 'wb'), tmp
+
+def _WriteFile(tmp, fname, fstat):
+    """Replace a file with a temporary file. A file with more than one hard
+    link is overwritten in place so that the links keep sharing it.
+    @param tmp: temporary file path
+    @param fname: file path
+    @param fstat: stat result of fname
+    @raise IOError, OSError: if the file cannot be written
+
+    """
+    if fstat.st_nlink > 1:
+        shutil.copyfile(tmp, fname)
+        _RemoveFile(tmp)
+    else:
+        fileutil.ReplaceFile(tmp, fname)
+
+def _RemoveFile(fname):
+    """Remove a file ignoring any errors
+    @param fname: file path
+
+    """
+    try:
+        if os.path.exists(fname):
+            os.remove(fname)
+    except OSError:
+        pass
+
+#-----------------------------------------------------------------------------#
+
+class FileReplacer(object):
+    """Replace all matches of a regular expression in files"""
+    def __init__(self, regex, rstring, isregex=True, journal=None):
+        """Create the replacer
+        @param regex: compiled regex object (i.e from
+                      L{SearchEngine.GetQueryObject})
+        @param rstring: replacement string
+        @keyword isregex: rstring is a regular expression template
+        @keyword journal: L{ReplaceJournal} to record changed files in
+        @raise re.error: if rstring is not a valid template for the regex
+
+        """
+        super(FileReplacer, self).__init__()
+
+        # Attributes
+        self._regex = _TextRegex(regex)
+        self._multiline = _IsMultiline(self._regex)
+        if type(rstring) is not types.UnicodeType:
+            rstring = rstring.decode('utf-8')
+        if isregex:
+            # Validate the template up front instead of on the first match
+            groups = sre_parse.parse_template(rstring, self._regex)[0]
+            for idx, group in groups:
+                if group > self._regex.groups:
+                    raise re.error("invalid group reference")
+            self._repl = rstring
+        else:
+            self._repl = lambda match: rstring
+        self._journal = journal
+        self._encfunct = _DetectEncoding
+        self._checker = fchecker.FileTypeChecker()
+        self._lock = threading.Lock()
+        self._count = 0     # Total number of replacements
+        self._files = 0     # Number of files changed
+        self._errors = list()
+
+    Count = property(lambda self: self._count)
+    FileCount = property(lambda self: self._files)
+    Journal = property(lambda self: self._journal,
+                       lambda self, journal: self.SetJournal(journal))
+
+    #---- Public Api ----#
+
+    def GetErrors(self):
+        """Get the list of files that could not be replaced in
+        @return: list of tuples [(fname, error message),]
+
+        """
+        return list(self._errors)
+
+    def ReplaceInFile(self, fname):
+        """Replace all matches in the given file. The file is left
+        untouched if there are no matches or it is not a text file.
+        @param fname: file path
+        @return: int (number of replacements made)
+
+        """
+        fobj = self._checker.OpenReadableText(fname)
+        if fobj is None:
+            return 0
+
+        # Replace the file a link points to and not the link itself
+        path = os.path.realpath(fname)
+        count = 0
+        tmp = None
+        try:
+            try:
+                sample = fobj.peek(_SAMPLE_SIZE)
+                enc = self._encfunct(fname, sample)
+                if enc is None:
+                    raise UnicodeError("Unknown file encoding")
+                codec = _GetCodec(enc, sample)
+
+                out, tmp = _MakeTempFile(path)
+                try:
+                    # Lines can only be split on the raw bytes when a
+                    # newline is encoded as a single byte.
+                    if self._multiline or codec.encode(u"\n")[0] != "\n":
+                        text = codec.decode(fobj.read())[0]
+                        text, count = self._regex.subn(self._repl, text)
+                        out.write(codec.encode(text)[0])
+                    else:
+                        for line in fobj:
+                            line = codec.decode(line)[0]
+                            line, num = self._regex.subn(self._repl, line)
+                            count += num
+                            out.write(codec.encode(line)[0])
+                finally:
+                    out.close()
+            finally:
+                fobj.close()
+
+            if count:
+                fstat = os.stat(path)
+                shutil.copymode(path, tmp)
+                if hasattr(os, 'chown'):
+                    try:
+                        os.chown(tmp, fstat.st_uid, fstat.st_gid)
+                    except OSError:
+                        pass
+                if self._journal is not None:
+                    self._journal.AddFile(path)
+                _WriteFile(tmp, path, fstat)
+                tmp = None
+        except (IOError, OSError, UnicodeError, LookupError), msg:
+            with self._lock:
+                self._errors.append((fname, unicode(msg)))
+            count = 0
+        finally:
+            if tmp is not None:
+                _RemoveFile(tmp)
+
+        if count:
+            with self._lock:
+                self._count += count
+                self._files += 1
+        return count
+
+    def ReplaceInFiles(self, flist):
+        """Replace all matches in the given files
+        @param flist: iterable of file paths
+        @return: generator of tuples (fname, number of replacements)
+
+        """
+        for fname in flist:
+            yield (fname, self.ReplaceInFile(fname))
+
+    def SetEncodingFunction(self, funct):
+        """Set the function used to detect the encoding of each file
+        @param funct: callable(fname, sample) that returns the encoding of
+                      the file or None if it is unknown. The sample is the
+                      bytes at the start of the file.
+
+        """
+        self._encfunct = funct
+
+    def SetJournal(self, journal):
+        """Set the journal to record the original files in
+        @param journal: L{ReplaceJournal} or None
+
+        """
+        self._journal = journal
+
+#-----------------------------------------------------------------------------#
+
+class ReplaceJournal(object):
+    """Record of the original contents of the files changed by a
+    L{FileReplacer} that is used to revert the changes.
+
+    """
+    def __init__(self, path):
+        """Create the journal
+        @param path: directory to store the journal in
+
+        """
+        super(ReplaceJournal, self).__init__()
+
+        # Attributes
+        self._path = path
+        self._files = list()    # [(original path, backup name),]
+        self._lock = threading.Lock()
+
+    Path = property(lambda self: self._path)
+    FileCount = property(lambda self: len(self._files))
+
+    #---- Public Api ----#
+
+    def AddFile(self, fname):
+        """Save the current contents of a file before it is replaced. Must
+        be called before the file is replaced.
+        @param fname: file path
+        @raise IOError, OSError: if the file cannot be saved
+
+        """
+        with self._lock:
+            if not os.path.exists(self._path):
+                os.makedirs(self._path)
+
+            bname = u"%d.orig" % len(self._files)
+            backup = os.path.join(self._path, bname)
+            try:
+                # The original file is moved aside by the replace so a
+                # hard link keeps its contents without copying them. Files
+                # that already have other links are overwritten in place.
+                if os.stat(fname).st_nlink > 1:
+                    raise OSError("File has other links")
+                os.link(fname, backup)
+            except (AttributeError, OSError):
+                shutil.copy2(fname, backup)
+
+            if type(fname) is types.UnicodeType:
+                entry = fname.encode('utf-8')
+            else:
+                entry = fname
+            handle = open(os.path.join(self._path, _MANIFEST), 'ab')
+            try:
+                handle.write("%s\t%s\n" % (bname.encode('utf-8'), entry))
+            finally:
+                handle.close()
+            self._files.append((fname, bname))
+
+    def Discard(self):
+        """Delete the journal, the changes can no longer be reverted"""
+        with self._lock:
+            shutil.rmtree(self._path, ignore_errors=True)
+            self._files = list()
+
+    def GetFiles(self):
+        """Get the files that are recorded in the journal
+        @return: list of file paths
+
+        """
+        return [fname for fname, bname in self._files]
+
+    def Load(self):
+        """Load a journal that was saved to disk by a previous session
+        @return: bool
+
+        """
+        files = list()
+        try:
+            handle = open(os.path.join(self._path, _MANIFEST), 'rb')
+            try:
+                for line in handle:
+                    bname, fname = line.rstrip('\n').split('\t', 1)
+                    files.append((fname.decode('utf-8'),
+                                  bname.decode('utf-8')))
+            finally:
+                handle.close()
+        except (IOError, OSError, ValueError, UnicodeDecodeError):
+            return False
+
+        with self._lock:
+            self._files = files
+        return True
+
+    def Revert(self):
+        """Restore all files in the journal to their original contents.
+        The journal is discarded if all the files were restored.
+        @return: list of tuples [(fname, error message),] for the files
+                 that could not be restored
+
+        """
+        errors = list()
+        with self._lock:
+            # Restore in reverse in case a file was recorded more than once
+            for fname, bname in reversed(self._files):
+                backup = os.path.join(self._path, bname)
+                try:
+                    try:
+                        if os.path.exists(fname) and \
+                           os.stat(fname).st_nlink > 1:
+                            shutil.copyfile(backup, fname)
+                        else:
+                            fileutil.ReplaceFile(backup, fname)
+                    except OSError:
+                        # Journal is on a different file system
+                        out, tmp = _MakeTempFile(fname)
+                        out.close()
+                        try:
+                            shutil.copy2(backup, tmp)
+                            fileutil.ReplaceFile(tmp, fname)
+                        except:
+                            _RemoveFile(tmp)
+                            raise
+                except (IOError, OSError), msg:
+                    errors.append((fname, unicode(msg)))
+
+        if not errors:
+            self.Discard()
+        return errors
@@ -23,14 +23,27 @@ __all__ = [ 'SearchEngine', ]
 # Imports
 import os
 import re
+import sys
+import mmap
 import fnmatch
 import types
 import unicodedata
+import threading
+import Queue
 from StringIO import StringIO
 
 # Local imports
 import fchecker
 
+#-----------------------------------------------------------------------------#
+# Globals
+_CHECKER = fchecker.FileTypeChecker()
+_COUNT_CHUNK = 1024 * 1024 # Chunk size for counting lines in mapped files
+
+# Regex constructs that can match differently on a line by itself than on the
+# same line in the middle of a file (end anchors and negative assertions).
+_LINE_SENSITIVE = re.compile(r"\$|\\[ZAB]|\(\?<?!")
+
 #-----------------------------------------------------------------------------#
 
 class SearchEngine(object):
@@ -41,6 +54,8 @@ class SearchEngine(object):
     @todo: Add file filter support
 
     """
+    CHUNK_SIZE = 4096 # Initial chunk size for backwards searches
+    MMAP_THRESHOLD = 1024 * 1024 * 8 # Memory map files larger than this
     def __init__(self, query, regex=True, down=True,
                   matchcase=True, wholeword=False):
         """Initialize a search engine object
@@ -64,18 +79,32 @@ class SearchEngine(object):
         self._lmatch = None             # Last match object
         self._filters = None            # File Filters
         self._formatter = lambda f, l, m: u"%s %d: %s" % (f, l+1, m)
+        self._workers = 0               # Parallel search workers (0 = serial)
+        self._useprocs = False          # Use processes instead of threads
+        self._ordered = True            # Report parallel results in file order
+        self._ckey = None               # Settings the regex was compiled for
+        self._index = None              # TrigramIndex for file searches
+        self._mapsize = SearchEngine.MMAP_THRESHOLD
         self._CompileRegex()
 
     def _CompileRegex(self):
         """Prepare and compile the regex object based on the current state
         and settings of the engine.
         @postcondition: the engines regular expression is created
+        @note: the expression is only recompiled when the query, flags, or
+               type of search pool have changed since the last call.
 
         """
         tmp = self._query
 
         uquery = type(tmp) is types.UnicodeType
         upool = type(self._pool) is types.UnicodeType
+        ckey = (tmp, uquery, upool, self._isregex,
+                self._matchcase, self._wholeword)
+        if ckey == self._ckey:
+            return
+        self._ckey = ckey
+
         if uquery and upool:
             tmp = unicodedata.normalize("NFC", tmp)
 
@@ -94,8 +123,6 @@ class SearchEngine(object):
 
         if upool:
             flags |= re.UNICODE
-            # Normalize
-            self._pool = unicodedata.normalize("NFC", self._pool)
         else:
             # If the pools is not Unicode also make sure that the
             # query is a string too.
@@ -110,7 +137,90 @@ class SearchEngine(object):
             self._regex = re.compile(tmp, flags)
         except:
                 self._regex = None
-        self._data = (tmp, self._pool)
+
+    @staticmethod
+    def _NormalizePool(pool):
+        """Normalize a unicode search pool to the form the query is
+        compiled in.
+        @param pool: string
+        @return: string
+
+        """
+        if type(pool) is types.UnicodeType:
+            pool = unicodedata.normalize("NFC", pool)
+        return pool
+
+    def _GetDirectoryFiles(self, directory, recursive=True):
+        """Generate the paths of all the files in the given directory that
+        pass the current file filters.
+        @param directory: directory path
+        @keyword recursive: decend into sub directories
+
+        """
+        # Get all files in the directories
+        paths = [os.path.join(directory, fname)
+                for fname in os.listdir(directory) if not fname.startswith('.')]
+
+        # Filter out files that don't match the current filter(s)
+        if self._filters is not None and len(self._filters):
+            filtered = list()
+            for fname in paths:
+                if os.path.isdir(fname):
+                    filtered.append(fname)
+                    continue
+
+                for pat in self._filters:
+                    if fnmatch.fnmatch(fname, pat):
+                        filtered.append(fname)
+            paths = filtered
+
+        for path in paths:
+            if os.path.isdir(path):
+                if recursive:
+                    # Recursive call to decend into directories
+                    for fname in self._GetDirectoryFiles(path, recursive):
+                        yield fname
+            else:
+                yield path
+
+    def _IndexFilter(self, paths):
+        """Filter out the paths that the search index can rule out
+        @param paths: iterable of file paths
+        @return: iterable of file paths
+
+        """
+        if self._index is None:
+            return paths
+
+        trigrams = self._index.GetQueryTrigrams(self._query, self._isregex)
+        return self._index.FilterPaths(paths, trigrams)
+
+    def _ParallelSearch(self, paths):
+        """Search in the given files using the engines pool of workers
+        and yield the results in the same form as L{SearchInFile}.
+        @param paths: iterable of file paths
+        @note: closing the generator (i.e when the consumer stops iterating
+               on a cancel request) stops all pending work.
+
+        """
+        if self._useprocs:
+            results = _ProcessGrep(paths, self._regex, self._mapsize,
+                                   self._workers, self._ordered)
+        else:
+            results = _ThreadGrep(paths, self._regex, self._mapsize,
+                                  self._workers, self._ordered)
+
+        try:
+            for fname, lines in results:
+                if lines is None:
+                    continue # not a readable text file
+
+                # Special token to signify start of a search
+                yield (None, fname)
+                for lnum, line in lines:
+                    yield self._formatter(fname, lnum, line)
+        finally:
+            results.close()
 
     def ClearPool(self):
         """Clear the search pool"""
@@ -165,36 +275,65 @@ class SearchEngine(object):
         @keyword spos: search start position in string
         @return: tuple (match start pos, match end pos) or None if no match
         @note: L{SetSearchPool} has been called to set the string to search in.
+        @note: match positions are absolute positions in the search pool
 
         """
         if self._regex is None:
             return None
 
         if spos < len(self._pool):
-            match = self._regex.search(self._pool[spos:])
+            match = self._regex.search(self._pool, spos)
             if match is not None:
                 self._lmatch = match
                 return match.span()
         return None
 
     def FindPrev(self, spos=-1):
-        """Find the previous match of the query starting at spos
-        @keyword spos: search start position in string
+        """Find the previous match of the query starting at spos. The pool
+        is scanned backwards in growing chunks until the closest match that
+        ends before spos is found.
+        @keyword spos: search start position in string (-1 for end of pool)
         @return: tuple (match start pos, match end pos)
+        @note: match positions are absolute positions in the search pool
 
         """
         if self._regex is None:
             return None
 
-        if spos+1 < len(self._pool):
-            matches = [match for match in
-                       self._regex.finditer(self._pool[:spos])]
-            if len(matches):
-                lmatch = matches[-1]
-                self._lmatch = lmatch
-                return (lmatch.start(), lmatch.end())
+        plen = len(self._pool)
+        if spos < 0 or spos > plen:
+            spos = plen
+
+        finditer = self._regex.finditer
+        pool = self._pool
+        lmatch = None
+        bound = spos # Matches starting at or after bound have been checked
+        chunk = SearchEngine.CHUNK_SIZE
+        while bound > 0 and lmatch is None:
+            # Keep the last of the non overlapping matches in the window
+            wstart = max(0, bound - chunk)
+            for match in finditer(pool, wstart, spos):
+                if match.start() >= bound:
+                    break
+                lmatch = match
+            bound = wstart
+            chunk *= 2
+
+        if lmatch is not None:
+            self._lmatch = lmatch
+            return lmatch.span()
         return None
 
+    def GetDirectoryFiles(self, directory, recursive=True):
+        """Get the paths of all the files in the given directory that pass
+        the current file filters.
+        @param directory: directory path
+        @keyword recursive: decend into sub directories
+        @return: generator of file paths
+
+        """
+        return self._GetDirectoryFiles(directory, recursive)
+
     def GetLastMatch(self):
         """Get the last found match object from the previous L{FindNext} or
         L{FindPrev} action.
@@ -272,35 +411,19 @@ class SearchEngine(object):
         """Search in all the files found in the given directory
         @param directory: directory path
         @keyword recursive: search recursivly
+        @see: L{SetWorkerCount} for parallel searches
 
         """
         if self._regex is None:
             return
 
-        # Get all files in the directories
-        paths = [os.path.join(directory, fname)
-                for fname in os.listdir(directory) if not fname.startswith('.')]
-
-        # Filter out files that don't match the current filter(s)
-        if self._filters is not None and len(self._filters):
-            filtered = list()
-            for fname in paths:
-                if os.path.isdir(fname):
-                    filtered.append(fname)
-                    continue
-
-                for pat in self._filters:
-                    if fnmatch.fnmatch(fname, pat):
-                        filtered.append(fname)
-            paths = filtered
-
-        # Begin searching in the paths
-        for path in paths:
-            if recursive and os.path.isdir(path):
-                # Recursive call to decend into directories
-                for match in self.SearchInDirectory(path, recursive):
-                    yield match
-            else:
+        paths = self._GetDirectoryFiles(directory, recursive)
+        paths = self._IndexFilter(paths)
+        if self._workers > 1:
+            for match in self._ParallelSearch(paths):
+                yield match
+        else:
+            for path in paths:
                 for match in self.SearchInFile(path):
                     yield match
         return
@@ -315,19 +438,17 @@ class SearchEngine(object):
         if self._regex is None:
             return
 
-        checker = fchecker.FileTypeChecker()
-        if checker.IsReadableText(fname):
-            try:
-                fobj = open(fname, 'rb')
-            except (IOError, OSError):
-                return
-            else:
-                # Special token to signify start of a search
-                yield (None, fname)
+        fobj = _CHECKER.OpenReadableText(fname)
+        if fobj is None:
+            return
 
-            for lnum, line in enumerate(fobj):
-                if self._regex.search(line) is not None:
-                    yield self._formatter(fname, lnum, line)
+        # Special token to signify start of a search
+        yield (None, fname)
+
+        try:
+            for lnum, line in _GrepLines(fobj, self._regex, self._mapsize):
+                yield self._formatter(fname, lnum, line)
+        finally:
             fobj.close()
         return
 
@@ -339,9 +460,14 @@ class SearchEngine(object):
         if self._regex is None:
             return
 
-        for fname in flist:
-            for match in self.SearchInFile(fname):
+        flist = self._IndexFilter(flist)
+        if self._workers > 1:
+            for match in self._ParallelSearch(flist):
                 yield match
+        else:
+            for fname in flist:
+                for match in self.SearchInFile(fname):
+                    yield match
         return
 
     def SearchInString(self, sstring, startpos=0):
@@ -383,6 +509,15 @@ class SearchEngine(object):
         self._matchcase = case
         self._CompileRegex()
 
+    def SetOrderedResults(self, ordered=True):
+        """Set how results of a parallel search are reported. When ordered
+        the results are reported in the same file order as a serial search,
+        otherwise they are reported as soon as each file has been searched.
+        @keyword ordered: bool
+
+        """
+        self._ordered = ordered
+
     def SetResultFormatter(self, funct):
         """Set the result formatter function
         @param funct: callable(filename, linenum, matchstr)
@@ -392,14 +527,34 @@ class SearchEngine(object):
         self._formatter = funct
 
     def SetSearchPool(self, pool):
-        """Set the search pool used by the Find methods
+        """Set the search pool used by the Find methods. Setting the same
+        pool object again is a no-op.
         @param pool: string to search in
 
         """
+        if pool is self._pool:
+            return # Unchanged
+
         del self._pool
-        self._pool = pool
+        self._pool = self._NormalizePool(pool)
         self._CompileRegex()
 
+    def SetSearchIndex(self, index):
+        """Set the index to consult to skip files that cannot match the
+        query when searching in files.
+        @param index: L{TrigramIndex} or None
+
+        """
+        self._index = index
+
+    def SetMapThreshold(self, size):
+        """Set the file size above which files are memory mapped and
+        searched as a whole instead of line by line.
+        @param size: size in bytes (0 to never memory map files)
+
+        """
+        self._mapsize = max(0, size)
+
     def SetQuery(self, query):
         """Set the search query
         @param query: string
@@ -416,3 +571,216 @@ class SearchEngine(object):
         """
         self._isregex = use
         self._CompileRegex()
+
+    def SetWorkerCount(self, count, processes=False):
+        """Set the number of workers to use for searching in files. A
+        count of 0 or 1 performs a serial search in the calling thread.
+        @param count: int
+        @keyword processes: use a pool of processes instead of threads. Threads
+                            only help when searching is bound by disk i/o.
+
+        """
+        self._workers = max(0, count)
+        self._useprocs = processes
+
+#-----------------------------------------------------------------------------#
+
+def _GrepFile(args):
+    """Search a file for all lines that match the given pattern
+    @param args: tuple (filename, compiled regex, mmap threshold)
+    @return: tuple (filename, [(lnum, line),]) lines is None if the file
+             could not be read as text.
+
+    """
+    fname, regex, mapsize = args
+    fobj = _CHECKER.OpenReadableText(fname)
+    if fobj is None:
+        return (fname, None)
+
+    try:
+        lines = list(_GrepLines(fobj, regex, mapsize))
+    finally:
+        fobj.close()
+    return (fname, lines)
+
+def _GrepLines(fobj, regex, mapsize):
+    """Generate the lines of the file that match the pattern
+    @param fobj: file object
+    @param regex: compiled regex object
+    @param mapsize: memory map the file if it is larger than this
+    @return: generator of (lnum, line)
+
+    """
+    try:
+        size = os.fstat(fobj.fileno()).st_size
+    except (AttributeError, IOError, OSError):
+        size = 0
+
+    if mapsize > 0 and size > mapsize and \
+       _LINE_SENSITIVE.search(regex.pattern) is None:
+        try:
+            fmap = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except (EnvironmentError, ValueError):
+            fmap = None
+
+        if fmap is not None:
+            try:
+                for result in _GrepMap(fmap, regex):
+                    yield result
+            finally:
+                fmap.close()
+            return
+
+    for lnum, line in enumerate(fobj):
+        if regex.search(line) is not None:
+            yield (lnum, line)
+
+def _GrepMap(fmap, regex):
+    """Generate the lines of a memory mapped file that match the pattern.
+    The pattern is run over the whole mapping and line numbers are only
+    worked out for the regions between matches. The results are the same
+    as matching the file line by line.
+    @param fmap: mmap object
+    @param regex: compiled regex object
+    @return: generator of (lnum, line)
+
+    """
+    size = len(fmap)
+    search = regex.search
+    lnum = 0  # Line number of the line starting at lpos
+    lpos = 0
+    while lpos < size:
+        match = search(fmap, lpos)
+        if match is None:
+            break
+
+        # Count the lines skipped over to get to the match
+        lstart = fmap.rfind('\n', lpos, match.start()) + 1
+        if lstart == 0:
+            lstart = lpos # Match is on the line starting at lpos
+        elif lstart > lpos:
+            cpos = lpos
+            while cpos < lstart:
+                cend = min(lstart, cpos + _COUNT_CHUNK)
+                lnum += fmap[cpos:cend].count('\n')
+                cpos = cend
+
+        lend = fmap.find('\n', match.start())
+        if lend < 0:
+            lend = size
+        else:
+            lend += 1
+
+        # A match in the whole mapping may span lines or depend on text
+        # before the line, so confirm the match on the line itself.
+        line = fmap[lstart:lend]
+        if search(line) is not None:
+            yield (lnum, line)
+        lnum += 1
+        lpos = lend
+
+def _ThreadGrep(paths, regex, mapsize, workers, ordered=True):
+    """Grep the given paths on a bounded pool of threads
+    @param paths: iterable of file paths
+    @param regex: compiled regex object
+    @param mapsize: memory map files larger than this
+    @param workers: number of threads
+    @keyword ordered: yield results in the order of paths
+    @return: generator of L{_GrepFile} results
+
+    """
+    cancel = threading.Event()
+    jobs = Queue.Queue(workers * 4)
+    results = Queue.Queue()
+    done = object() # Sentinel
+    error = list()  # exc_info of an error raised by the paths iterable
+
+    def Feed():
+        """Feed the paths to the workers"""
+        try:
+            for idx, path in enumerate(paths):
+                while not cancel.is_set():
+                    try:
+                        jobs.put((idx, path), timeout=.1)
+                    except Queue.Full:
+                        continue
+                    break
+                if cancel.is_set():
+                    break
+        except Exception:
+            error.append(sys.exc_info())
+        finally:
+            for _ in range(workers):
+                jobs.put(done)
+
+    def Work():
+        """Worker thread processing loop"""
+        while True:
+            job = jobs.get()
+            if job is done:
+                results.put(done)
+                break
+            elif cancel.is_set():
+                continue # Drain the queue so the feeder can exit
+            idx, path = job
+            try:
+                rval = _GrepFile((path, regex, mapsize))
+            except Exception:
+                rval = (path, None)
+            results.put((idx, rval))
+
+    threads = [threading.Thread(target=Feed)]
+    threads.extend([threading.Thread(target=Work) for _ in range(workers)])
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        running = workers
+        pending = dict()
+        nextidx = 0
+        while running:
+            item = results.get()
+            if item is done:
+                running -= 1
+                continue
+
+            idx, rval = item
+            if not ordered:
+                yield rval
+                continue
+
+            # Hold on to results that arrive before their predecessors
+            pending[idx] = rval
+            while nextidx in pending:
+                yield pending.pop(nextidx)
+                nextidx += 1
+
+        # Pass on an error from listing the paths to the consumer
+        if len(error):
+            raise error[0][0], error[0][1], error[0][2]
+    finally:
+        cancel.set()
+
+def _ProcessGrep(paths, regex, mapsize, workers, ordered=True):
+    """Grep the given paths on a pool of processes
+    @param paths: iterable of file paths
+    @param regex: compiled regex object
+    @param mapsize: memory map files larger than this
+    @param workers: number of processes
+    @keyword ordered: yield results in the order of paths
+    @return: generator of L{_GrepFile} results
+
+    """
+    import multiprocessing
+    pool = multiprocessing.Pool(workers)
+    args = ((path, regex, mapsize) for path in paths)
+    try:
+        if ordered:
+            rgen = pool.imap(_GrepFile, args, 8)
+        else:
+            rgen = pool.imap_unordered(_GrepFile, args, 8)
+        for rval in rgen:
+            yield rval
+    finally:
+        pool.terminate()
@@ -0,0 +1,373 @@
+###############################################################################
+# Name: trigram.py                                                            #
+# Purpose: Trigram index for speeding up searches in files                    #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# Licence: wxWindows Licence                                                  #
+###############################################################################
+
+"""
+Editra Business Model Library: TrigramIndex
+
+Persistent index of the trigrams found in each file under a directory. The
+index is used to rule out files that cannot contain a match for a search
+query without having to read them.
+
+Each file is stored as a small bitmap signature of the (lower cased)
+trigrams that it contains, so the index can give false positives but never
+false negatives. Files that have changed since they were indexed are always
+reported as possible matches.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__cvsid__ = "$Id$"
+__revision__ = "$Revision$"
+
+__all__ = [ 'TrigramIndex', ]
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import types
+import threading
+import cPickle
+import sre_parse
+import sre_constants
+from itertools import izip
+
+# Local imports
+import fchecker
+
+#-----------------------------------------------------------------------------#
+# Globals
+_INDEX_VERSION = 1
+_MIN_BITS = 1024            # Smallest file signature (bits)
+_MAX_BITS = 1024 * 128      # Largest file signature (bits)
+_MAX_FILE_SIZE = 1024 * 1024 * 16 # Files larger than this are not indexed
+_BINARY = None              # Signature marker for binary files
+
+#-----------------------------------------------------------------------------#
+
+def _Hash(trigram, nbits):
+    """Get the signature bit for the given trigram
+    @param trigram: int
+    @param nbits: signature size (power of 2)
+    @return: int
+
+    """
+    return ((trigram * 2654435761) >> 7) & (nbits - 1)
+
+def _TrigramInts(data):
+    """Get the set of unique trigrams in the given byte string
+    @param data: string
+    @return: set of ints
+
+    """
+    return set((ord(a) << 16) | (ord(b) << 8) | ord(c)
+               for a, b, c in set(izip(data, data[1:], data[2:])))
+
+def _MakeSignature(trigrams):
+    """Create a bitmap signature for the given set of trigrams
+    @param trigrams: set of ints
+    @return: tuple (nbits, bitmap string)
+
+    """
+    nbits = _MIN_BITS
+    while nbits < len(trigrams) * 4 and nbits < _MAX_BITS:
+        nbits *= 2
+
+    bitmap = bytearray(nbits // 8)
+    for tri in trigrams:
+        bit = _Hash(tri, nbits)
+        bitmap[bit >> 3] |= (1 << (bit & 7))
+    return (nbits, str(bitmap))
+
+#-----------------------------------------------------------------------------#
+
+class TrigramIndex(object):
+    """Trigram index of all the files under a root directory"""
+    def __init__(self, root, cachefile=None):
+        """Create the index
+        @param root: root directory of the index
+        @keyword cachefile: path to persist the index to
+
+        """
+        super(TrigramIndex, self).__init__()
+
+        # Attributes
+        self._root = root
+        self._cache = cachefile
+        self._files = dict()    # path -> (mtime, size, signature)
+        self._lock = threading.Lock()
+        self._checker = fchecker.FileTypeChecker()
+
+    Root = property(lambda self: self._root)
+    CacheFile = property(lambda self: self._cache)
+    FileCount = property(lambda self: len(self._files))
+
+    #---- Implementation ----#
+
+    def _WalkFiles(self):
+        """Generate the paths of all files under the indexes root directory
+        skipping hidden files and directories.
+
+        """
+        for dpath, dnames, fnames in os.walk(self._root):
+            dnames[:] = [dname for dname in dnames
+                         if not dname.startswith('.')]
+            for fname in fnames:
+                if not fname.startswith('.'):
+                    yield os.path.join(dpath, fname)
+
+    #---- Public Api ----#
+
+    def CanMatch(self, path, trigrams):
+        """Check if the given file could contain all of the given trigrams
+        @param path: file path
+        @param trigrams: set of trigrams from L{GetQueryTrigrams}
+        @return: bool (False only if the file definitely does not match)
+
+        """
+        entry = self._files.get(os.path.normpath(path), None)
+        if entry is None:
+            return True
+
+        try:
+            fstat = os.stat(path)
+        except (IOError, OSError):
+            return True
+
+        mtime, size, sig = entry
+        if mtime != fstat.st_mtime or size != fstat.st_size:
+            return True # Stale entry
+
+        if sig is _BINARY:
+            return False
+
+        nbits, bitmap = sig
+        for tri in trigrams:
+            bit = _Hash(tri, nbits)
+            if not (ord(bitmap[bit >> 3]) & (1 << (bit & 7))):
+                return False
+        return True
+
+    def Clear(self):
+        """Clear all entries from the index"""
+        with self._lock:
+            self._files = dict()
+
+    def FilterPaths(self, paths, trigrams):
+        """Filter out the paths that cannot contain the trigrams
+        @param paths: iterable of file paths
+        @param trigrams: set of trigrams from L{GetQueryTrigrams}
+        @return: generator of paths
+
+        """
+        if not trigrams:
+            for path in paths:
+                yield path
+        else:
+            for path in paths:
+                if self.CanMatch(path, trigrams):
+                    yield path
+
+    @staticmethod
+    def GetQueryTrigrams(query, isregex=False):
+        """Get the set of trigrams that any text matching the query must
+        contain. Only literal text that is required for a match is used,
+        anything that cannot be determined results in fewer trigrams.
+        @param query: search string
+        @keyword isregex: query is a regular expression
+        @return: set of ints (empty if nothing can be ruled out)
+
+        """
+        if isregex:
+            runs = TrigramIndex.GetRequiredLiterals(query)
+        else:
+            runs = [query]
+
+        trigrams = set()
+        for run in runs:
+            if type(run) is types.UnicodeType:
+                run = run.encode('utf-8')
+            # Only ascii is case folded the same way as the index
+            for tri in _TrigramInts(run.lower()):
+                if not (tri & 0x808080):
+                    trigrams.add(tri)
+        return trigrams
+
+    @staticmethod
+    def GetRequiredLiterals(pattern):
+        """Get the runs of literal text that must be in any match of the
+        given regular expression.
+        @param pattern: regular expression string
+        @return: list of strings
+
+        """
+        try:
+            parsed = sre_parse.parse(pattern)
+        except (sre_constants.error, TypeError, OverflowError):
+            return list()
+
+        runs = list()
+        run = list()
+        for opcode, arg in parsed:
+            if opcode == sre_constants.LITERAL:
+                run.append(unichr(arg))
+                continue
+            elif opcode == sre_constants.BRANCH:
+                return list() # Top level alternation, nothing is required
+
+            if len(run):
+                runs.append(u"".join(run))
+            run = list()
+
+            if opcode in (sre_constants.AT, sre_constants.ANY,
+                          sre_constants.IN, sre_constants.NOT_LITERAL):
+                continue
+            elif opcode in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+                # Single literal repeated at least once
+                low, high, item = arg
+                if low > 0 and len(item) == 1 and \
+                   item[0][0] == sre_constants.LITERAL:
+                    runs.append(unichr(item[0][1]) * min(low, 3))
+
+        if len(run):
+            runs.append(u"".join(run))
+        return runs
+
+    def IndexFile(self, path):
+        """Add or update a file in the index
+        @param path: file path
+        @return: bool (False if the file could not be indexed)
+
+        """
+        try:
+            fstat = os.stat(path)
+        except (IOError, OSError):
+            return False
+
+        if fstat.st_size > _MAX_FILE_SIZE:
+            self.RemoveFile(path)
+            return False
+
+        try:
+            handle = open(path, 'rb')
+            try:
+                data = handle.read()
+            finally:
+                handle.close()
+        except (IOError, OSError):
+            return False
+
+        if self._checker.IsBinaryBytes(data[:4096]):
+            sig = _BINARY
+        else:
+            sig = _MakeSignature(_TrigramInts(data.lower()))
+
+        with self._lock:
+            self._files[os.path.normpath(path)] = (fstat.st_mtime,
+                                                   fstat.st_size, sig)
+        return True
+
+    def IsIndexed(self, path):
+        """Is the file in the index and up to date
+        @param path: file path
+        @return: bool
+
+        """
+        entry = self._files.get(os.path.normpath(path), None)
+        if entry is not None:
+            try:
+                fstat = os.stat(path)
+            except (IOError, OSError):
+                return False
+            return entry[:2] == (fstat.st_mtime, fstat.st_size)
+        return False
+
+    def Load(self):
+        """Load the index from its cache file
+        @return: bool
+
+        """
+        if not self._cache or not os.path.exists(self._cache):
+            return False
+
+        try:
+            handle = open(self._cache, 'rb')
+            try:
+                version, root, files = cPickle.load(handle)
+            finally:
+                handle.close()
+        except Exception:
+            return False
+
+        if version != _INDEX_VERSION or root != self._root:
+            return False
+
+        with self._lock:
+            self._files = files
+        return True
+
+    def Refresh(self, cancel=None):
+        """Bring the index up to date with the file system. Only files
+        that are new or whose modification time or size has changed since
+        the last refresh are read.
+        @keyword cancel: callable returning True to abort the refresh
+        @return: int (number of files that were (re)indexed)
+
+        """
+        count = 0
+        seen = set()
+        for path in self._WalkFiles():
+            if cancel is not None and cancel():
+                return count
+            seen.add(os.path.normpath(path))
+            if not self.IsIndexed(path) and self.IndexFile(path):
+                count += 1
+
+        # Remove deleted files
+        with self._lock:
+            for path in self._files.keys():
+                if path not in seen:
+                    del self._files[path]
+        return count
+
+    def RemoveFile(self, path):
+        """Remove a file from the index
+        @param path: file path
+
+        """
+        path = os.path.normpath(path)
+        with self._lock:
+            if path in self._files:
+                del self._files[path]
+
+    def Save(self):
+        """Write the index to its cache file
+        @return: bool
+
+        """
+        if not self._cache:
+            return False
+
+        try:
+            dname = os.path.dirname(self._cache)
+            if dname and not os.path.exists(dname):
+                os.makedirs(dname)
+
+            tmp = self._cache + u".tmp"
+            handle = open(tmp, 'wb')
+            try:
+                with self._lock:
+                    cPickle.dump((_INDEX_VERSION, self._root, self._files),
+                                 handle, cPickle.HIGHEST_PROTOCOL)
+            finally:
+                handle.close()
+            if os.path.exists(self._cache):
+                os.remove(self._cache)
+            os.rename(tmp, self._cache)
+        except (IOError, OSError, cPickle.PicklingError):
+            return False
+        return True
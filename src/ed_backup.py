@@ -0,0 +1,187 @@
+###############################################################################
+# Name: ed_backup.py                                                          #
+# Purpose: Automatic backups of the modified buffers                          #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Provides the single service that makes the automatic backups of all the
+buffers that have automatic backups enabled. Buffers tell the service when
+they are modified and only the buffers that changed since their last backup
+have their text copied when the backup timer fires. The backups are then
+encoded and written on a background thread. Backups of large files are gzip
+compressed.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import wx
+
+# Local Imports
+import ed_glob
+import ed_msg
+import ed_event
+import ed_thread
+import ebmlib
+from profiler import Profile_Get
+from util import Log
+
+#-----------------------------------------------------------------------------#
+# Globals
+_ = wx.GetTranslation
+
+BACKUP_INTERVAL = 30000          # Milliseconds between backups
+COMPRESS_SIZE = 5 * 1024 * 1024  # Compress backups larger than this (bytes)
+
+#-----------------------------------------------------------------------------#
+
+class EdBackupService(object):
+    """Singleton automatic backup service"""
+    __metaclass__ = ebmlib.Singleton
+    def __init__(self):
+        super(EdBackupService, self).__init__()
+
+        # Attributes
+        self._buffers = dict()  # id(buffer) -> buffer
+        self._dirty = set()     # ids of buffers changed since last backup
+        self._busy = False      # Backups are being written
+        self._bkupmgr = None
+        self._timer = wx.PyTimer(self.Backup)
+
+        # Message Handlers
+        for opt in ('AUTOBACKUP_COUNT', 'AUTOBACKUP_PATH',
+                    'AUTOBACKUP_SUFFIX'):
+            ed_msg.Subscribe(self.OnConfigMsg,
+                             ed_msg.EDMSG_PROFILE_CHANGE + (opt,))
+
+    #---- Implementation ----#
+
+    def _GetBackupMgr(self):
+        """Get the backup manager for the current backup settings
+        @return: ebmlib.FileBackupMgr
+
+        """
+        if self._bkupmgr is None:
+            suffix = Profile_Get('AUTOBACKUP_SUFFIX', default=u'.edbkup')
+            bkupmgr = ebmlib.FileBackupMgr(None, u"%s" + suffix)
+            count = Profile_Get('AUTOBACKUP_COUNT', 'int', 1)
+            bkupmgr.SetBackupCount(max(1, count))
+            path = Profile_Get('AUTOBACKUP_PATH', default=u"")
+            if path and os.path.exists(path):
+                bkupmgr.SetBackupDirectory(path)
+            self._bkupmgr = bkupmgr
+        return self._bkupmgr
+
+    def _OnBackupsDone(self):
+        """Called on the main thread when the backups have been written"""
+        self._busy = False
+
+    @staticmethod
+    def _WriteBackups(bkupmgr, jobs, done):
+        """Write the backups (called on a background thread)
+        @param bkupmgr: ebmlib.FileBackupMgr
+        @param jobs: list of (EdFile, text, msg, id, target) tuples
+        @param done: callable to call on the main thread when done
+
+        """
+        try:
+            for fobj, text, msg, idval, target in jobs:
+                path = fobj.GetPath()
+                try:
+                    chunks = fobj.EncodeForWrite(text)
+                    size = sum(len(chunk) for chunk in chunks)
+                    bkupmgr.WriteBackup(path, chunks, size > COMPRESS_SIZE)
+                except Exception, err:
+                    Log("[ed_backup][err] Backup of %s failed: %s" % (path, err))
+                    continue
+
+                nevt = ed_event.StatusEvent(ed_event.edEVT_STATUS, idval,
+                                            msg, ed_glob.SB_INFO)
+                wx.PostEvent(target, nevt)
+        finally:
+            wx.CallAfter(done)
+
+    #---- Public Api ----#
+
+    def AddBuffer(self, buff):
+        """Start making automatic backups of a buffer
+        @param buff: EditraStc
+
+        """
+        self._buffers[id(buff)] = buff
+        if buff.GetModify():
+            self._dirty.add(id(buff))
+        if not self._timer.IsRunning():
+            self._timer.Start(BACKUP_INTERVAL)
+
+    def Backup(self):
+        """Backup all the buffers that have changed since their last backup.
+        Buffers that are still loading, or that changed while the last
+        backups are still being written, are backed up on the next call.
+
+        """
+        if self._busy or not len(self._dirty):
+            return
+
+        jobs = list()
+        for key in list(self._dirty):
+            buff = self._buffers.get(key, None)
+            if not buff:
+                # Buffer was destroyed
+                self._buffers.pop(key, None)
+                self._dirty.discard(key)
+                continue
+
+            if buff.IsLoading():
+                continue
+
+            self._dirty.discard(key)
+            fname = buff.GetFileName()
+            if not fname or not buff.GetModify():
+                continue # Nothing to backup
+
+            msg = _("File backup performed: %s") % fname
+            jobs.append((buff.File.Clone(), buff.GetText(), msg,
+                         buff.GetId(), buff.GetTopLevelParent()))
+
+        if len(jobs):
+            self._busy = True
+            ed_thread.EdThreadPool().QueueJob(EdBackupService._WriteBackups,
+                                              self._GetBackupMgr(), jobs,
+                                              self._OnBackupsDone)
+
+    def MarkDirty(self, buff):
+        """Note that a buffer has changed and needs to be backed up
+        @param buff: EditraStc
+
+        """
+        key = id(buff)
+        if key in self._buffers:
+            self._dirty.add(key)
+
+    def RemoveBuffer(self, buff):
+        """Stop making automatic backups of a buffer
+        @param buff: EditraStc
+
+        """
+        self._buffers.pop(id(buff), None)
+        self._dirty.discard(id(buff))
+        if not len(self._buffers) and self._timer.IsRunning():
+            self._timer.Stop()
+
+    def OnConfigMsg(self, msg):
+        """Update the backup settings
+        @param msg: Message Object
+
+        """
+        self._bkupmgr = None
+
+#-----------------------------------------------------------------------------#
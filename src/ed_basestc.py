@@ -32,6 +32,7 @@ import ed_msg
 import ed_txt
 from syntax import syntax
 from syntax import synglob
+from syntax import syndata
 import autocomp
 from extern import vertedit
 from profiler import Profile_Get
@@ -54,6 +55,10 @@ MARKER_VERT_EDIT = ed_marker.NewMarkerId()
 ALT_SHIFT = wx.stc.STC_SCMOD_ALT|wx.stc.STC_SCMOD_SHIFT
 CTRL_SHIFT = wx.stc.STC_SCMOD_CTRL|wx.stc.STC_SCMOD_SHIFT
 
+# Styling
+STYLE_MARGIN = 100          # Lines after the visible text to style right away
+STYLE_CHUNK = 64 * 1024     # Bytes of text to style on each idle event
+
 #-----------------------------------------------------------------------------#
 
 class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
@@ -80,6 +85,7 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
         self.vert_edit = vertedit.VertEdit(self, markerNumber=MARKER_VERT_EDIT)
         self._line_num = True # Show line numbers
         self._last_cwidth = 1 # one pixel
+        self._styling = False # Styling the rest of the document on idle
 
         # Set Up Margins
         ## Outer Left Margin Bookmarks
@@ -112,6 +118,7 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
 
         # Event Handlers
         self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy, self)
+        self.Bind(wx.EVT_IDLE, self.OnIdle)
         self.Bind(wx.stc.EVT_STC_CHANGE, self.OnChanged)
         self.Bind(wx.stc.EVT_STC_MODIFIED, self.OnModified)
         self.Bind(wx.stc.EVT_STC_AUTOCOMP_SELECTION, self.OnAutoCompSel)
@@ -446,7 +453,7 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
         # Set Lexer
         self.SetLexer(lexer)
         # Set Keywords
-        self.SetKeyWords(syn_data.Keywords)
+        self.SetKeyWords(syn_data.Keywords, syn_data.KeywordList)
         # Set Lexer/Syntax Specifications
         self.SetSyntax(syn_data.SyntaxSpec)
         # Set Extra Properties
@@ -617,7 +624,7 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
                            "ksh" : "ksh", "php" : "php", "booi" : "boo",
                            "pike" : "pike"}
                 self.ConfigureLexer(ex_map.get(interp, interp))
-        self.Colourise(0, -1)
+        self.RestyleDocument()
 
     def FireModified(self):
         """Fire a modified event"""
@@ -842,6 +849,19 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
         ed_msg.PostMessage(ed_msg.EDMSG_FILE_OPENING, path)
         self.file.SetPath(path)
         txt = self.file.Read()
+        return self.LoadDocument(self.file, txt)
+
+    def LoadDocument(self, doc, txt):
+        """Load the text of a document that has already been read (i.e by
+        a background thread) into the buffer. Returns True if no errors and
+        False otherwise, the same as L{LoadFile}.
+        @param doc: EdFile that the text was read from
+        @param txt: text returned by doc.Read()
+
+        """
+        if doc is not self.file:
+            self.SetDocument(doc)
+
         if txt is not None:
             if self.file.IsRawBytes() and not ebmlib.IsUnicode(txt):
                 self.AddStyledText(txt)
@@ -905,6 +925,25 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
         else:
             evt.Skip()
 
+    def OnIdle(self, evt):
+        """Style the next chunk of the document when restyling it in the
+        background after a call to L{RestyleDocument}.
+        @param evt: wx.IdleEvent
+
+        """
+        evt.Skip()
+        if not self._styling:
+            return
+
+        length = self.GetLength()
+        start = self.PositionFromLine(self.LineFromPosition(self.GetEndStyled()))
+        if start < length:
+            self.Colourise(start, min(start + STYLE_CHUNK, length))
+            if self.GetEndStyled() > start:
+                evt.RequestMore()
+                return
+        self._styling = False
+
     def OnStyleNeeded(self, evt):
         """Perform custom styling when registered for a container lexer"""
         if self._code['clexer'] is not None:
@@ -942,6 +981,19 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
             if bmp.IsOk():
                 self.RegisterImage(idx, bmp)
 
+    def RestyleDocument(self):
+        """Restyle the document after the lexer has changed. Only the visible
+        text and a margin of lines after it are styled right away, the rest
+        of the document is styled in chunks when the application is idle.
+
+        """
+        self.StartStyling(0, 0)
+        first = self.GetFirstVisibleLine()
+        last = self.DocLineFromVisible(first + self.LinesOnScreen())
+        last = min(last + STYLE_MARGIN, self.GetLineCount() - 1)
+        self.Colourise(0, self.GetLineEndPosition(last))
+        self._styling = self.GetEndStyled() < self.GetLength()
+
     def SearchText(self, text, regex=False, back=False):
         """Search for text forward or backward
         @param text: string
@@ -998,15 +1050,15 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
         """Set the buffers filename attributes from the given path"""
         self.file.SetPath(path)
 
-    def SetKeyWords(self, kw_lst):
+    def SetKeyWords(self, kw_lst, words=None):
         """Sets the keywords from a list of keyword sets
         @param kw_lst: [ (KWLVL, "KEWORDS"), (KWLVL2, "KEYWORDS2"), ect...]
+        @keyword words: sorted list of the unique keywords to use for
+                        autocompletion, it is made from kw_lst if not given.
 
         """
         # Parse Keyword Settings List simply ignoring bad values and badly
         # formed lists
-        self._code['keywords'] = list()
-        kwlist = ""
         for keyw in kw_lst:
             if len(keyw) != 2:
                 continue
@@ -1015,19 +1067,13 @@ class EditraBaseStc(wx.stc.StyledTextCtrl, ed_style.StyleMgr):
                    not isinstance(keyw[1], basestring):
                     continue
                 else:
-                    kwlist += keyw[1]
                     super(EditraBaseStc, self).SetKeyWords(keyw[0], keyw[1])
 
-        # Can't have ? in scintilla autocomp list unless specifying an image
-        # TODO: this should be handled by the autocomp service
-        if '?' in kwlist:
-            kwlist.replace('?', '')
-
-        kwlist = kwlist.split()         # Split into a list of words
-        kwlist = list(set(kwlist))      # Remove duplicates from the list
-        kwlist.sort()                   # Sort into alphabetical order
-
-        self._code['keywords'] = kwlist
+        # NOTE: the list may be shared with other buffers so it must not
+        #       be modified.
+        if words is None:
+            words = syndata.MakeKeywordList(kw_lst)
+        self._code['keywords'] = words
 
     def SetLexer(self, lexer):
         """Set the buffers lexer
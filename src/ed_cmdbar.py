@@ -1020,9 +1020,12 @@ class LineCtrl(eclib.CommandEntryBase):
 
         val = int(val) - 1
         doc = self.GetDoc()
-        lines = doc.GetLineCount()
-        if val > lines:
-            val = lines
+        # Large file views only have part of the file in the buffer and
+        # limit the line to the end of the file themselves.
+        if not doc.IsLargeFileView():
+            lines = doc.GetLineCount()
+            if val > lines:
+                val = lines
         doc.GotoLine(val)
         doc.SetFocus()
         self.GetParent().Hide()
@@ -27,11 +27,13 @@ import ed_glob
 import ed_menu
 import ed_msg
 import ed_stc
+import ed_filemon
 import ed_tab
 from doctools import DocPositionMgr
 from profiler import Profile_Get
 from util import Log, SetClipboardText
 import syntax.synglob as synglob
+import syntax.syntax as syntax
 from ebmlib import GetFileModTime, ContextMenuManager, GetFileName
 
 # External libs
@@ -88,6 +90,8 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         self._spell = STCSpellCheck(self, check_region=self.IsNonCode)
         self._caret_w = 1
         self._focused = True
+        self._watched = None    # Path registered with the file monitor
+        self._modcheck = False  # File may have changed on disk
         spref = Profile_Get('SPELLCHECK', default=dict())
         self._spell_data = dict(choices=list(),
                                 word=('', -1, -1),
@@ -125,13 +129,60 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
                     'SHOW_WS', 'WRAP', 'VIEWVERTSPACE'):
             ed_msg.Subscribe(self.OnConfigMsg,
                              ed_msg.EDMSG_PROFILE_CHANGE + (opt,))
+        ed_msg.Subscribe(self.OnFileChanged, ed_msg.EDMSG_FILE_CHANGED)
 
     def OnDestroy(self, evt):
         """Cleanup message handlers on destroy"""
         if evt.Id == self.Id:
             ed_msg.Unsubscribe(self.OnConfigMsg)
+            ed_msg.Unsubscribe(self.OnFileChanged)
+            if self._watched:
+                ed_filemon.EdFileMonitor().RemoveFile(self._watched)
+                self._watched = None
         evt.Skip()
 
+    def _CheckDiskFile(self):
+        """Check the file on disk after the file monitor has reported a
+        change to it and prompt to reload it if necessary.
+
+        """
+        if Profile_Get('CHECKMOD'):
+            cfile = self.GetFileName()
+            lmod = GetFileModTime(cfile)
+            mtime = self.GetModTime()
+            if mtime and not lmod and not os.path.exists(cfile):
+                # File was deleted since last check
+                wx.CallAfter(self.PromptToReSave, cfile)
+            elif mtime < lmod:
+                # Check if we should automatically reload the file or not
+                if Profile_Get('AUTO_RELOAD', default=False) and \
+                   not self.GetModify():
+                    wx.CallAfter(self.DoReloadFile)
+                else:
+                    wx.CallAfter(self.AskToReload, cfile)
+
+        # Check for changes to permissions
+        if self.File.IsReadOnly() != self._ro_img:
+            self._nb.SetPageBitmap(self.GetTabIndex(), self.GetTabImage())
+            self._nb.Refresh()
+
+    def _WatchFile(self, path):
+        """Register the file in the buffer with the file monitor in place
+        of the one that was registered before.
+        @param path: file path
+
+        """
+        monitor = ed_filemon.EdFileMonitor()
+        if self._watched:
+            monitor.RemoveFile(self._watched)
+            self._watched = None
+
+        if path:
+            monitor.AddFile(path)
+            self._watched = path
+            # Check once for changes made before the file was watched
+            self._modcheck = True
+
     #---- EdTab Methods ----#
 
     def DoDeactivateTab(self):
@@ -159,28 +210,15 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
             self._focused = False
             self.CallTipCancel()
 
-        # Check for changes to on disk file
-        if not self._has_dlg and Profile_Get('CHECKMOD'):
-            cfile = self.GetFileName()
-            lmod = GetFileModTime(cfile)
-            mtime = self.GetModTime()
-            if mtime and not lmod and not os.path.exists(cfile):
-                # File was deleted since last check
-                wx.CallAfter(self.PromptToReSave, cfile)
-            elif mtime < lmod:
-                # Check if we should automatically reload the file or not
-                if Profile_Get('AUTO_RELOAD', default=False) and \
-                   not self.GetModify():
-                    wx.CallAfter(self.DoReloadFile)
-                else:
-                    wx.CallAfter(self.AskToReload, cfile)
+        # Keep the file monitor watching the file that is in the buffer
+        cfile = self.GetFileName()
+        if (cfile or None) != self._watched:
+            self._WatchFile(cfile)
 
-        # Check for changes to permissions
-        if self.File.IsReadOnly() != self._ro_img:
-            self._nb.SetPageBitmap(self.GetTabIndex(), self.GetTabImage())
-            self._nb.Refresh()
-        else:
-            pass
+        # Check for changes to on disk file reported by the file monitor
+        if self._modcheck and not self._has_dlg:
+            self._modcheck = False
+            self._CheckDiskFile()
 
         # Handle Low(er) priority idle events
         self._lprio += 1
@@ -329,6 +367,20 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
         if csel != idx:
             parent.SetSelection(idx)
 
+    def OnFileChanged(self, msg):
+        """Flag the file to be checked on the next idle if the file
+        monitor reports that it was changed.
+        @param msg: ed_msg.EDMSG_FILE_CHANGED
+
+        """
+        if not self or not self._watched:
+            return
+
+        for path, mtime in msg.GetData():
+            if path == self._watched:
+                self._modcheck = True
+                break
+
     def OnSpelling(self, buff, evt):
         """Context menu subscriber callback
         @param buff: buffer menu event happened in
@@ -639,3 +691,73 @@ class EdEditorView(ed_stc.EditraStc, ed_tab.EdTabBase):
                 tlw.OnSave(evt)
 
         return result
+
+#--------------------------------------------------------------------------#
+
+class EdPlaceholderView(wx.Panel, ed_tab.EdTabBase):
+    """Lightweight stand in for an L{EdEditorView} in the main notebook. It
+    only holds what is needed to open the file, the notebook replaces it
+    with an editor when the tab is first shown.
+
+    """
+    def __init__(self, parent, path, pos=0, encoding=None):
+        """Create the placeholder
+        @param parent: notebook
+        @param path: file path
+        @keyword pos: caret position to restore (0 to use the saved one)
+        @keyword encoding: encoding to open the file with (None to detect)
+
+        """
+        wx.Panel.__init__(self, parent)
+        ed_tab.EdTabBase.__init__(self)
+
+        # Attributes
+        self._path = path
+        self._pos = pos
+        self._enc = encoding
+
+        self.Hide()
+
+    Encoding = property(lambda self: self._enc)
+    Position = property(lambda self: self._pos)
+
+    #---- EdTab Methods ----#
+    def DoTabClosing(self):
+        """Save the position of an unloaded buffer for the next load"""
+        if self._pos > 0:
+            EdEditorView.DOCMGR.AddRecord([self._path, self._pos])
+
+    def GetName(self):
+        """Gets the unique name for this tab control.
+        @return: (unicode) string
+
+        """
+        return u"EditraPlaceholder"
+
+    def GetTabImage(self):
+        """Get the Bitmap to use for the tab
+        @return: wx.Bitmap (16x16)
+
+        """
+        fname = GetFileName(self._path)
+        ext = os.path.splitext(fname)[1][1:] or fname
+        lang_id = str(syntax.GetIdFromExt(ext.lower()))
+        bmp = wx.ArtProvider.GetBitmap(lang_id, wx.ART_MENU)
+        if bmp.IsNull():
+            bmp = wx.ArtProvider.GetBitmap(str(synglob.ID_LANG_TXT), wx.ART_MENU)
+        return bmp
+
+    def GetTitleString(self):
+        """Get the title string to display in the MainWindows title bar
+        @return: (unicode) string
+
+        """
+        return u"%s - file://%s" % (GetFileName(self._path), self._path)
+
+    #---- Public Api ----#
+    def GetFileName(self):
+        """Get the path of the file the tab will open
+        @return: string
+
+        """
+        return self._path
@@ -0,0 +1,46 @@
+###############################################################################
+# Name: ed_filemon.py                                                         #
+# Purpose: Shared monitor for changes to the files open in the editor         #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Provides the single file monitor that watches all the files that are open in
+the editor for changes on disk. Changes are posted on the main thread as an
+EDMSG_FILE_CHANGED message so that buffers don't need to check their files
+themselves.
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import wx
+
+# Local Imports
+import ed_msg
+import ebmlib
+
+#-----------------------------------------------------------------------------#
+
+class EdFileMonitor(ebmlib.FileMonitor):
+    """Singleton FileMonitor"""
+    __metaclass__ = ebmlib.Singleton
+    def __init__(self):
+        super(EdFileMonitor, self).__init__(EdFileMonitor._Notify)
+        self.start()
+
+    @staticmethod
+    def _Notify(changes):
+        """Post the changes on the main thread
+        @param changes: list of (path, mtime) tuples
+
+        """
+        wx.CallAfter(ed_msg.PostMessage, ed_msg.EDMSG_FILE_CHANGED, changes)
+
+#-----------------------------------------------------------------------------#
@@ -0,0 +1,331 @@
+###############################################################################
+# Name: ed_largefile.py                                                       #
+# Purpose: Read only view of files too large to load into a buffer            #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Large file view for the main text buffer. Files that are too large to be
+loaded into memory are memory mapped and only a window of their lines is
+put into the buffer at a time. The window is moved through the file as the
+buffer is scrolled, so memory use stays bounded no matter how big the file
+is. The buffer is read only while it is showing a large file.
+
+@summary: Large file viewer
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import re
+import wx
+import wx.stc
+
+# Editra Libraries
+import ed_basestc
+import ed_thread
+import ebmlib
+from util import Log
+
+#-----------------------------------------------------------------------------#
+# Globals
+WINDOW_LINES = 10000            # Lines put into the buffer at a time
+WINDOW_BYTES = 8 * 1024 * 1024  # Limit on the size of the window
+_EDGE_LINES = WINDOW_LINES // 5 # Move window when this close to its edge
+
+#-----------------------------------------------------------------------------#
+
+def CreateView(stc, path):
+    """Open a file in a large file view in the given buffer
+    @param stc: EditraStc
+    @param path: file path
+    @return: L{LargeFileView} or None if the file cannot be viewed
+
+    """
+    try:
+        mapped = ebmlib.MappedFile(path)
+    except (EnvironmentError, ValueError, OverflowError), msg:
+        Log("[ed_largefile][err] Failed to map %s: %s" % (path, msg))
+        return None
+
+    # Lines are found by their newline bytes so the encoding must be
+    # compatible with ascii.
+    doc = stc.GetDocument()
+    doc.DetectEncoding(mapped.Read(0, 4096))
+    enc = doc.GetEncoding()
+    try:
+        compatible = u"\n".encode(enc) == "\n"
+    except (LookupError, UnicodeError):
+        compatible = False
+
+    if not compatible:
+        Log("[ed_largefile][info] Can't view %s encoded file" % enc)
+        mapped.Close()
+        return None
+    return LargeFileView(stc, mapped, enc)
+
+#-----------------------------------------------------------------------------#
+
+class LargeFileView(object):
+    """Pages windows of the lines in a memory mapped file into a buffer"""
+    def __init__(self, stc, mapped, encoding):
+        """Create the view
+        @param stc: EditraStc
+        @param mapped: ebmlib.MappedFile
+        @param encoding: encoding of the file
+
+        """
+        super(LargeFileView, self).__init__()
+
+        # Attributes
+        self._stc = stc
+        self._file = mapped
+        self._enc = encoding
+        self._start = 0     # Line number of the first line in the buffer
+        self._count = 0     # Number of lines in the buffer
+        self._range = (0, 0) # Byte range of the file in the buffer
+        self._moving = False
+
+        # Index the rest of the file in the background so that jumps to
+        # lines further into the file don't have to.
+        ed_thread.EdThreadPool().QueueJob(mapped.IndexLines,
+                                          lambda: self._file is not mapped)
+
+        # Event Handlers
+        stc.Bind(wx.stc.EVT_STC_PAINTED, self.OnPainted)
+
+    File = property(lambda self: self._file)
+    Encoding = property(lambda self: self._enc)
+
+    #---- Implementation ----#
+
+    def _IsShown(self, line):
+        """Is the line in the buffer and not too close to the edge of the
+        window (unless the window is at the start or end of the file).
+        @param line: line number in the file
+
+        """
+        rel = line - self._start
+        if rel < 0 or rel >= self._count:
+            return False
+
+        edge = min(_EDGE_LINES, self._count // 5)
+        if rel < edge and self._range[0] > 0:
+            return False
+        if rel >= self._count - edge and self._range[1] < self._file.Size:
+            return False
+        return True
+
+    def _LoadWindow(self, line):
+        """Put the window of lines around the given line in the buffer
+        @param line: line number in the file
+        @return: bool (False if the window is already loaded)
+
+        """
+        window = self._file.GetWindow(line, WINDOW_LINES, WINDOW_BYTES)
+        if window == self._range and self._count:
+            return False
+
+        start, end = window
+        text = self._file.Read(start, end).decode(self._enc, 'replace')
+        stc = self._stc
+        stc.SetReadOnly(False)
+        stc.SetText(text)
+        stc.SetReadOnly(True)
+        stc.EmptyUndoBuffer()
+        stc.SetSavePoint()
+
+        self._range = window
+        self._start = self._file.GetLineFromOffset(start)
+        self._count = stc.GetLineCount()
+        self._UpdateLineNumbers()
+        return True
+
+    def _OffsetFromPosition(self, pos):
+        """Convert a buffer position to a byte offset in the file
+        @param pos: buffer position
+        @return: int
+
+        """
+        stc = self._stc
+        line = stc.LineFromPosition(pos)
+        text = stc.GetTextRange(stc.PositionFromLine(line), pos)
+        offset = self._file.GetLineOffset(self._start + line)
+        return offset + len(text.encode(self._enc, 'replace'))
+
+    def _PositionFromOffset(self, offset):
+        """Convert a byte offset in the file to a position in the buffer
+        @param offset: byte offset (must be in the window)
+        @return: int
+
+        """
+        line = self._file.GetLineFromOffset(offset)
+        start = self._file.GetLineOffset(line)
+        text = self._file.Read(start, offset).decode(self._enc, 'replace')
+        lstart = self._stc.PositionFromLine(line - self._start)
+        return lstart + len(text.encode('utf-8'))
+
+    def _UpdateLineNumbers(self):
+        """Show the line numbers of the file instead of the buffer in the
+        line number margin.
+
+        """
+        stc = self._stc
+        if not hasattr(stc, 'MarginSetText'):
+            return # Text margins not supported by this version of wx
+
+        stc.SetMarginType(ed_basestc.NUM_MARGIN, wx.stc.STC_MARGIN_RTEXT)
+        style = wx.stc.STC_STYLE_LINENUMBER
+        for line in xrange(self._count):
+            stc.MarginSetText(line, str(self._start + line + 1))
+            stc.MarginSetStyle(line, style)
+
+        if stc.GetMarginWidth(ed_basestc.NUM_MARGIN):
+            last = str(self._start + self._count)
+            width = max(15, stc.TextWidth(style, last) + 8)
+            stc.SetMarginWidth(ed_basestc.NUM_MARGIN, width)
+
+    #---- Public Api ----#
+
+    def CheckScroll(self):
+        """Move the window if the buffer has been scrolled close to its
+        edges, keeping the same lines and selection in view.
+
+        """
+        stc = self._stc
+        if not stc or self._moving or self._file is None:
+            return
+
+        first = stc.DocLineFromVisible(stc.GetFirstVisibleLine())
+        last = stc.DocLineFromVisible(stc.GetFirstVisibleLine() + \
+                                      stc.LinesOnScreen())
+        if self._IsShown(self._start + first) and \
+           self._IsShown(self._start + last):
+            return
+
+        self._moving = True
+        try:
+            first += self._start
+            last += self._start
+            anchor = self._OffsetFromPosition(stc.GetAnchor())
+            cpos = self._OffsetFromPosition(stc.GetCurrentPos())
+            if self._LoadWindow(first + (last - first) // 2):
+                stc.SetFirstVisibleLine(stc.VisibleFromDocLine(first - self._start))
+                start, end = self._range
+                if start <= anchor <= end and start <= cpos <= end:
+                    stc.SetAnchor(self._PositionFromOffset(anchor))
+                    stc.SetCurrentPos(self._PositionFromOffset(cpos))
+                else:
+                    pos = stc.PositionFromLine(first - self._start)
+                    stc.SetEmptySelection(pos)
+        finally:
+            self._moving = False
+
+    def Close(self):
+        """Close the file and restore the buffer's line number margin"""
+        self._stc.Unbind(wx.stc.EVT_STC_PAINTED, handler=self.OnPainted)
+        if hasattr(self._stc, 'MarginTextClearAll'):
+            self._stc.MarginTextClearAll()
+            self._stc.SetMarginType(ed_basestc.NUM_MARGIN,
+                                    wx.stc.STC_MARGIN_NUMBER)
+        if self._file is not None:
+            self._file.Close()
+            self._file = None
+
+    def Find(self, regex, pos, down=True, wrap=False):
+        """Find the next match of a regular expression in the file. The
+        window is moved to show the match.
+        @param regex: compiled regex object
+        @param pos: buffer position to search from
+        @keyword down: search towards the end of the file
+        @keyword wrap: ignore pos and search from the start (or end) of
+                       the file
+        @return: tuple (start, end) buffer positions or None
+
+        """
+        # Search the encoded bytes of the file
+        pattern = regex.pattern
+        if ebmlib.IsUnicode(pattern):
+            pattern = pattern.encode(self._enc, 'replace')
+        bregex = re.compile(pattern, regex.flags & ~re.UNICODE)
+
+        if wrap:
+            if down:
+                offset = 0
+            else:
+                offset = self._file.Size
+        else:
+            offset = self._OffsetFromPosition(pos)
+
+        match = self._file.Find(bregex, offset, down)
+        if match is None:
+            return None
+
+        start, end = match
+        line = self._file.GetLineFromOffset(start)
+        if not self._IsShown(line) or end > self._range[1]:
+            self._moving = True
+            try:
+                self._LoadWindow(line)
+            finally:
+                self._moving = False
+        end = min(end, self._range[1])
+        return (self._PositionFromOffset(start), self._PositionFromOffset(end))
+
+    def GetLine(self, line):
+        """Get the line number in the file of a line in the buffer
+        @param line: buffer line
+        @return: int
+
+        """
+        return self._start + line
+
+    def ShowLine(self, line):
+        """Move the window to show a line of the file if necessary
+        @param line: line number (zero based)
+        @return: int (line in the buffer)
+
+        """
+        line = max(0, line)
+        if self._file.GetLineOffset(line) >= self._file.Size and line:
+            line = self._file.GetLineCount() - 1
+
+        if not self._IsShown(line):
+            self._moving = True
+            try:
+                self._LoadWindow(line)
+            finally:
+                self._moving = False
+        return line - self._start
+
+    def OnPainted(self, evt):
+        """Check if the window needs to be moved after the buffer has been
+        scrolled.
+        @param evt: wx.stc.EVT_STC_PAINTED
+
+        """
+        evt.Skip()
+        if not self._moving:
+            wx.CallAfter(self.CheckScroll)
+
+    def Reload(self):
+        """Remap the file after it has been changed on disk, keeping the
+        current line in view.
+        @raise EnvironmentError: if the file cannot be mapped
+
+        """
+        mapped = ebmlib.MappedFile(self._file.Path)
+        line = self.GetLine(self._stc.GetCurrentLine())
+        self._file.Close()
+        self._file = mapped
+        self._range = (0, 0)
+        self._count = 0
+        ed_thread.EdThreadPool().QueueJob(mapped.IndexLines,
+                                          lambda: self._file is not mapped)
+        self._stc.GotoLine(line)
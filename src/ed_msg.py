@@ -111,6 +111,10 @@ EDMSG_FILE_SAVE = EDMSG_FILE_ALL + ('save',)
 # context == MainWindows ID
 EDMSG_FILE_SAVED = EDMSG_FILE_ALL + ('saved',)
 
+# Open files changed on disk (see ed_filemon) / msgdata == [(path, mtime),]
+# mtime is 0 if the file was deleted
+EDMSG_FILE_CHANGED = EDMSG_FILE_ALL + ('changed',)
+
 #---- End File Action Messages ----#
 
 #---- UI Action Messages ----#
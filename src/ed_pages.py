@@ -35,6 +35,7 @@ import ed_msg
 import ed_txt
 import ed_mdlg
 import ed_session
+import ed_thread
 import ebmlib
 import eclib
 from extern import aui
@@ -70,6 +71,7 @@ class EdPages(ed_book.EdBaseBook):
         # Notebook attributes
         self.LOG = wx.GetApp().GetLog()
         self._idletimer = wx.Timer(self, ID_IDLE_TIMER)
+        self._idlepage = None         # Page updated on the last idle tick
         self.DocMgr = ed_editv.EdEditorView.DOCMGR
         self._searchctrl = ed_search.SearchController(self, self.GetCurrentCtrl)
         self._searchctrl.SetLookinChoices(Profile_Get('SEARCH_LOC',
@@ -81,6 +83,9 @@ class EdPages(ed_book.EdBaseBook):
         self.control = None
         self.frame = self.GetTopLevelParent() # MainWindow
         self._ses_load = False
+        self._ses_id = 0              # Identifies the current session load
+        self._ses_pending = 0         # Files still being read for a session
+        self._ses_pages = dict()      # Session index -> page
         self._menu = ebmlib.ContextMenuManager()
 
         # Setup Tab Navigator
@@ -225,6 +230,29 @@ class EdPages(ed_book.EdBaseBook):
 
         return result == wx.ID_YES
 
+    def _SetupEditor(self, control, path, addpage):
+        """Setup an editor that a file was loaded in and put it in the
+        notebook.
+        @param control: EdEditorView
+        @param path: file path
+        @param addpage: callable(control) that puts the editor in the notebook
+
+        """
+        # Setup Document
+        control.FindLexer()
+        control.EmptyUndoBuffer()
+        doc = control.GetDocument()
+        doc.AddModifiedCallback(control.FireModified)
+
+        addpage(control)
+        self.frame.AddFileToHistory(path)
+
+        if Profile_Get('WARN_EOL', default=True) and not doc.IsRawBytes():
+            control.CheckEOL()
+
+        if not control.IsLoading():
+            self.DoPostLoad(control)
+
     def AddPage(self, page, text=u'', select=True, imgId=-1):
         """Add a page to the notebook"""
         bNewPage = False
@@ -274,10 +302,12 @@ class EdPages(ed_book.EdBaseBook):
 
         """
         rlist = list()
-        for buff in self.GetTextControls():
-            fname = buff.GetFileName()
-            if fname != wx.EmptyString:
-                rlist.append(fname)
+        for page in xrange(self.GetPageCount()):
+            buff = self.GetPage(page)
+            if buff.GetName() in (u"EditraTextCtrl", u"EditraPlaceholder"):
+                fname = buff.GetFileName()
+                if fname != wx.EmptyString:
+                    rlist.append(fname)
         return rlist
 
     def GetFindDialog(self):
@@ -346,13 +376,20 @@ class EdPages(ed_book.EdBaseBook):
         try:
             mgr = ed_session.EdSessionMgr()
             flist = self.GetFileNames()
-            bSaved = mgr.SaveSession(session, flist)
+            current = -1
+            if self.control and self.control.GetFileName() in flist:
+                current = flist.index(self.control.GetFileName())
+            bSaved = mgr.SaveSession(session, flist, current)
         except Exception, msg:
             self.LOG("[ed_pages][err] SaveSession error %s" % msg)
         return None
 
     def LoadSessionFile(self, session):
-        """Load files from saved session data in profile
+        """Load files from saved session data in profile. The file that was
+        selected when the session was saved is opened first. The rest are
+        added as placeholder tabs that are loaded when they are first shown
+        or, if lazy tabs are turned off, read on background threads and
+        added to the notebook as they finish loading.
         @param session: session filename
         @return: tuple (error desc, error msg), or None if no error
 
@@ -362,7 +399,7 @@ class EdPages(ed_book.EdBaseBook):
         mgr = ed_session.EdSessionMgr()
         flist = list()
         try:
-            flist = mgr.LoadSession(session)
+            flist, current = mgr.LoadSessionInfo(session)
         except Exception, msg:
             self._ses_load = False
             errdict = dict(sessionname=session, error=msg)
@@ -376,33 +413,177 @@ class EdPages(ed_book.EdBaseBook):
         # Close current files
         self.CloseAllPages()
 
+        # Start a new load, results from any previous one are ignored
+        self._ses_id += 1
+        self._ses_pending = 0
+        self._ses_pages = dict()
+
         missingfns = []
-        for loadfn in flist:
+        files = list()
+        for idx, loadfn in enumerate(flist):
             if os.path.exists(loadfn) and os.access(loadfn, os.R_OK):
                 if not ebmlib.IsUnicode(loadfn):
                     try:
                         loadfn = loadfn.decode(sys.getfilesystemencoding())
                     except UnicodeDecodeError:
                         self.LOG("[ed_pages][err] LoadSessionFile: Failed to decode file name")
-                self.OpenPage(os.path.dirname(loadfn),
-                              os.path.basename(loadfn))
+                # Resolve links to real file
+                if ebmlib.IsLink(loadfn):
+                    loadfn = ebmlib.ResolveRealPath(loadfn)
+                files.append((idx, loadfn))
             else:
                 missingfns.append(loadfn)
 
+        # Open the active file right away so it can be edited while the
+        # rest of the session is loading.
+        active = [item for item in files if item[0] == current]
+        if not active:
+            active = files[:1]
+        seen = set()
+        for idx, loadfn in active:
+            self.OpenPage(os.path.dirname(loadfn), os.path.basename(loadfn))
+            seen.add(loadfn)
+            if self.control.GetFileName() == loadfn:
+                self._ses_pages[idx] = self.control
+
+        lazy = Profile_Get('LAZY_TABS', default=True)
+        for idx, loadfn in files:
+            if loadfn in seen:
+                continue
+            seen.add(loadfn)
+
+            if lazy:
+                page = ed_editv.EdPlaceholderView(self, loadfn)
+                self._InsertSessionPage(idx, page)
+                continue
+
+            # Files open in another window share its document
+            if self.DocDuplicated(loadfn):
+                self._ses_pages[idx] = self.control
+                continue
+
+            self._ses_pending += 1
+            ed_thread.EdThreadPool().QueueJob(_ReadSessionFile, self,
+                                              self._ses_id, idx, loadfn)
+
+        if active and active[0][0] in self._ses_pages:
+            pg = self.GetPageIndex(self._ses_pages[active[0][0]])
+            if pg >= 0:
+                self.ChangePage(pg)
+
+        if not self._ses_pending:
+            self._FinishSessionLoad()
+
         if missingfns:
             rmsg = (_("Missing session files"),
                     _("Some files in saved session could not be found on disk:\n")+
                     u'\n'.join(missingfns))
-            self._ses_load = False
             return rmsg
 
+        return None
+
+    def _FinishSessionLoad(self):
+        """Finish loading a session after all of its files have been
+        opened.
+
+        """
         self._ses_load = False
+        self._ses_pages = dict()
 
         if self.GetPageCount() == 0:
             self.NewPage()
 
         self.Refresh()
-        return None
+
+    def _OnSessionFileRead(self, sesid, idx, path, doc, txt, err):
+        """Add a page for a session file that was read by a background
+        thread. Called on the main thread by L{_ReadSessionFile}.
+        @param sesid: session load id
+        @param idx: index of the file in the session
+        @param path: file path
+        @param doc: EdFile the file was read into or None to load the file
+                    in the buffer
+        @param txt: text read from the file
+        @param err: error message if the file could not be read or None
+
+        """
+        if not self or sesid != self._ses_id:
+            return # Window was closed or another session was loaded
+
+        self._ses_pending -= 1
+        try:
+            if err is not None:
+                self.LOG("[ed_pages][err] Failed to open file %s\n" % path)
+                self.LOG("[ed_pages][err] %s" % err)
+            else:
+                self._AddSessionPage(idx, path, doc, txt)
+        finally:
+            if not self._ses_pending:
+                self._FinishSessionLoad()
+
+    def _AddSessionPage(self, idx, path, doc, txt):
+        """Create the page for a file in a session that is being loaded and
+        insert it in its position in the session.
+        @param idx: index of the file in the session
+        @param path: file path
+        @param doc: EdFile the file was read into or None
+        @param txt: text read from the file
+
+        """
+        with eclib.Freezer(self.TopLevelParent) as _tmp:
+            control = ed_editv.EdEditorView(self, wx.ID_ANY)
+            control.Hide()
+            try:
+                if doc is None:
+                    result = control.LoadFile(path)
+                else:
+                    ed_msg.PostMessage(ed_msg.EDMSG_FILE_OPENING, path)
+                    result = control.LoadDocument(doc, txt)
+            except Exception, msg:
+                self.LOG("[ed_pages][err] Failed to open file %s\n" % path)
+                self.LOG("[ed_pages][err] %s" % msg)
+                result = False
+
+            if not result:
+                control.Destroy()
+                return
+
+            self._SetupEditor(control, path,
+                              lambda ctrl: self._InsertSessionPage(idx, ctrl))
+            self.LOG("[ed_pages][evt] Opened Page: %s" % path)
+
+    def _LoadPlaceholder(self, page):
+        """Load a placeholder page after it has been selected
+        @param page: EdPlaceholderView
+
+        """
+        if not self or not page:
+            return # Window or page was closed
+
+        pg_num = self.GetPageIndex(page)
+        if pg_num >= 0:
+            self.LoadPage(pg_num)
+
+    def _InsertSessionPage(self, idx, page):
+        """Insert a page for a file in a session that is being loaded before
+        the next file in the session that is open, without selecting it.
+        @param idx: index of the file in the session
+        @param page: EdEditorView or EdPlaceholderView
+
+        """
+        pos = self.GetPageCount()
+        later = [key for key in self._ses_pages.keys() if key > idx]
+        for key in sorted(later):
+            pg = self.GetPageIndex(self._ses_pages[key])
+            if pg >= 0:
+                pos = pg
+                break
+        self._ses_pages[idx] = page
+
+        filename = ebmlib.GetFileName(page.GetFileName())
+        page.SetTabLabel(filename)
+        self.InsertPage(pos, page, filename)
+        self.SetPageBitmap(pos, page.GetTabImage())
 
     def NewPage(self):
         """Create a new notebook page with a blank text control
@@ -529,10 +710,14 @@ class EdPages(ed_book.EdBaseBook):
 
         ctrl = self.FindBuffer(fname)
         if ctrl is None:
-            # Open the file in the editor
             if fname is not None:
-                self.OpenPage(ebmlib.GetPathName(fname),
-                              ebmlib.GetFileName(fname))
+                if self.HasFileOpen(fname):
+                    # Tab has not been loaded yet
+                    self.GotoPage(fname)
+                else:
+                    # Open the file in the editor
+                    self.OpenPage(ebmlib.GetPathName(fname),
+                                  ebmlib.GetFileName(fname))
                 self.control.SetCaretPos(pos)
         else:
             # Raise page to top and goto position
@@ -794,53 +979,49 @@ class EdPages(ed_book.EdBaseBook):
                 control.Show()
                 self.control = control
 
-            # Setup Document
-            self.control.FindLexer()
-            self.control.EmptyUndoBuffer()
-            doc = self.control.GetDocument()
-            doc.AddModifiedCallback(self.control.FireModified)
-
-            # Add the buffer to the notebook
-            if new_pg:
-                self.AddPage(self.control, filename)
-            else:
-                self.frame.SetTitle(self.control.GetTitleString())
-
-            self.frame.AddFileToHistory(path2file)
-            self.SetPageText(self.GetSelection(), filename)
-
-            # Set tab image
-            cpage = self.GetSelection()
-            self.SetPageBitmap(cpage, self.control.GetTabImage())
+            def AddBuffer(ctrl):
+                """Add the buffer to the notebook"""
+                if new_pg:
+                    self.AddPage(ctrl, filename)
+                else:
+                    self.frame.SetTitle(ctrl.GetTitleString())
+                self.SetPageText(self.GetSelection(), filename)
 
-            if Profile_Get('WARN_EOL', default=True) and not doc.IsRawBytes():
-                self.control.CheckEOL()
+                # Set tab image
+                cpage = self.GetSelection()
+                self.SetPageBitmap(cpage, ctrl.GetTabImage())
 
-            if not control.IsLoading():
-                self.DoPostLoad()
+            self._SetupEditor(control, path2file, AddBuffer)
 
             # Refocus on selected page
             self.GoCurrentPage()
             self.LOG("[ed_pages][evt] Opened Page: %s" % filename)
 
-    def DoPostLoad(self):
-        """Perform post file open actions"""
+    def DoPostLoad(self, control=None):
+        """Perform post file open actions
+        @keyword control: buffer the file was opened in (current if None)
+
+        """
+        if control is None:
+            control = self.control
+
         # Ensure that document buffer is writable after an editable
         # document is opened in the buffer.
-        doc = self.control.GetDocument()
-        if not doc.IsReadOnly() and not doc.IsRawBytes():
-            self.control.SetReadOnly(False)
+        doc = control.GetDocument()
+        if not doc.IsReadOnly() and not doc.IsRawBytes() and \
+           not control.IsLargeFileView():
+            control.SetReadOnly(False)
 
         # Set last known caret position if the user setting is enabled
         # and the caret position has not been changed during a threaded
         # file loading operation.
-        if Profile_Get('SAVE_POS') and self.control.GetCurrentPos() <= 0:
-            pos = self.DocMgr.GetPos(self.control.GetFileName())
-            self.control.SetCaretPos(pos)
-            self.control.ScrollToColumn(0)
+        if Profile_Get('SAVE_POS') and control.GetCurrentPos() <= 0:
+            pos = self.DocMgr.GetPos(control.GetFileName())
+            control.SetCaretPos(pos)
+            control.ScrollToColumn(0)
 
         ed_msg.PostMessage(ed_msg.EDMSG_FILE_OPENED,
-                           self.control.GetFileName(),
+                           control.GetFileName(),
                            context=self.frame.Id)
 
     def GoCurrentPage(self):
@@ -851,7 +1032,9 @@ class EdPages(ed_book.EdBaseBook):
         current_page = self.GetSelection()
         if current_page >= 0:
             control = self.GetPage(current_page)
-            self.control = control
+            # Placeholders are replaced as soon as they are shown
+            if not self.IsPlaceholder(current_page):
+                self.control = control
         return current_page
 
     def GotoPage(self, fname):
@@ -938,10 +1121,7 @@ class EdPages(ed_book.EdBaseBook):
         @return: bool indicating whether file is currently open or not
 
         """
-        for ctrl in self.GetTextControls():
-            if fpath == ctrl.GetFileName():
-                return True
-        return False
+        return fpath in self.GetFileNames()
 
     def FindBuffer(self, fpath):
         """Find the buffer containing the given file
@@ -955,6 +1135,101 @@ class EdPages(ed_book.EdBaseBook):
                 return ctrl
         return None
 
+    def IsPlaceholder(self, pg_num):
+        """Is the page a placeholder for a tab that has not been loaded
+        @param pg_num: page index
+        @return: bool
+
+        """
+        page = self.GetPage(pg_num)
+        return page is not None and page.GetName() == u"EditraPlaceholder"
+
+    def LoadPage(self, pg_num):
+        """Replace a placeholder page with an editor for its file. The
+        placeholder is closed if the file can't be opened.
+        @param pg_num: page index
+        @return: EdEditorView or None on failure
+
+        """
+        page = self.GetPage(pg_num)
+        if not self.IsPlaceholder(pg_num):
+            return page
+
+        path = page.GetFileName()
+        with eclib.Freezer(self.TopLevelParent) as _tmp:
+            control = ed_editv.EdEditorView(self, wx.ID_ANY)
+            control.Hide()
+            if page.Encoding is not None:
+                control.SetEncoding(page.Encoding)
+
+            result = False
+            try:
+                result = control.LoadFile(path)
+            except Exception, msg:
+                self.LOG("[ed_pages][err] Failed to open file %s\n" % path)
+                self.LOG("[ed_pages][err] %s" % msg)
+                ed_mdlg.OpenErrorDlg(self, path, msg)
+                control.GetDocument().ClearLastError()
+            else:
+                # Check if there was encoding errors
+                if not result:
+                    result = self._HandleEncodingError(control)
+
+            if not result:
+                control.Destroy()
+                self._ClosePageNum(pg_num)
+                return None
+
+            filename = ebmlib.GetFileName(path)
+
+            def SwapPage(ctrl):
+                """Swap the editor in for the placeholder"""
+                if page.Position > 0 and not ctrl.IsLoading():
+                    ctrl.SetCaretPos(page.Position)
+                ctrl.SetTabLabel(filename)
+                select = pg_num == self.GetSelection()
+                self.InsertPage(pg_num, ctrl, filename, select)
+                self.DeletePage(self.GetPageIndex(page))
+                self.UpdateIndexes()
+                self.SetPageBitmap(pg_num, ctrl.GetTabImage())
+
+            self._SetupEditor(control, path, SwapPage)
+            self.LOG("[ed_pages][evt] Loaded Page: %s" % filename)
+        return control
+
+    def UnloadPage(self, pg_num):
+        """Replace the editor on a page with a placeholder that will open
+        the file again when the page is shown, freeing the memory used by
+        the editor. Only unmodified files in background pages can be
+        unloaded.
+        @param pg_num: page index
+        @return: bool
+
+        """
+        control = self.GetPage(pg_num)
+        if control is None or control.GetName() != u"EditraTextCtrl" or \
+           pg_num == self.GetSelection() or control.GetModify() or \
+           control.IsLoading() or control.IsLargeFileView() or \
+           not control.GetFileName() or control.GetBookmarks():
+            return False
+
+        doc = control.GetDocument()
+        enc = None
+        if not doc.HasBom() and not doc.IsRawBytes():
+            enc = doc.GetEncoding()
+        page = ed_editv.EdPlaceholderView(self, control.GetFileName(),
+                                          control.GetCurrentPos(), enc)
+
+        with eclib.Freezer(self.TopLevelParent) as _tmp:
+            control.DoTabClosing()
+            page.SetTabLabel(control.GetTabLabel())
+            self.InsertPage(pg_num, page, self.GetPageText(pg_num))
+            self.DeletePage(pg_num + 1)
+            self.UpdateIndexes()
+            self.SetPageBitmap(pg_num, page.GetTabImage())
+        self.LOG("[ed_pages][evt] Unloaded Page: %s" % page.GetFileName())
+        return True
+
     #---- Event Handlers ----#
     def OnDrop(self, files):
         """Opens dropped files
@@ -1014,15 +1289,21 @@ class EdPages(ed_book.EdBaseBook):
         return
 
     def OnIdle(self, evt):
-        """Update tabs and check if files have been modified
+        """Update the current tab and check if its file has been modified.
+        The page that was current on the last tick is updated once more so
+        that it can hide its caret, other pages are checked when they are
+        selected again.
         @param evt: wx.TimerEvent
 
         """
         if wx.GetApp().IsActive():
-            for idx in range(self.GetPageCount()):
-                page = self.GetPage(idx)
-                if page is not None and page.IsShown():
-                    page.DoOnIdle()
+            page = self.GetCurrentPage()
+            last = self._idlepage
+            self._idlepage = page
+            if last and last is not page and last.IsShown():
+                last.DoOnIdle()
+            if page and page.IsShown():
+                page.DoOnIdle()
 
     def OnPageChanging(self, evt):
         """Page changing event handler.
@@ -1048,6 +1329,10 @@ class EdPages(ed_book.EdBaseBook):
         @keyword old: previous selection
 
         """
+        # Create the editor for a tab that has not been shown yet
+        if self.IsPlaceholder(pg_num) and self.LoadPage(pg_num) is None:
+            return
+
         cpage = self.GetSelection()
         if cpage != pg_num:
             self.SetSelection(pg_num)
@@ -1076,6 +1361,12 @@ class EdPages(ed_book.EdBaseBook):
 
         """
         cpage = evt.GetSelection()
+        if self.IsPlaceholder(cpage):
+            # The notebook is still showing the page, so replace it with
+            # its editor once the selection change has finished.
+            wx.CallAfter(self._LoadPlaceholder, self.GetPage(cpage))
+            return
+
         self.ChangePage(cpage, old=evt.GetOldSelection())
         self.LOG("[ed_pages][evt] Page Changed to %d" % cpage)
 
@@ -1284,3 +1575,25 @@ class EdPages(ed_book.EdBaseBook):
             control.Configure()
 
 #---- End Function Definitions ----#
+
+#--------------------------------------------------------------------------#
+
+def _ReadSessionFile(nbook, sesid, idx, path):
+    """Read and decode a file in a session that is being loaded. Runs on a
+    background thread and passes the result back to the notebook on the
+    main thread.
+    @param nbook: EdPages
+    @param sesid: session load id
+    @param idx: index of the file in the session
+    @param path: file path
+
+    """
+    doc = txt = err = None
+    # Large files are left to the buffer's own asynchronous loading
+    if ebmlib.GetFileSize(path) < 1048576: # 1MB
+        doc = ed_txt.EdFile(path)
+        try:
+            txt = doc.Read()
+        except Exception, msg:
+            err = msg
+    wx.CallAfter(nbook._OnSessionFileRead, sesid, idx, path, doc, txt, err)
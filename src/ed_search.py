@@ -25,6 +25,9 @@ import os
 import sys
 import re
 import unicodedata
+import hashlib
+import tempfile
+import threading
 import wx
 
 # Local imports
@@ -43,6 +46,156 @@ import ed_thread
 # Globals
 
 _ = wx.GetTranslation
+
+_SEARCH_INDEXES = dict()    # Search root -> ebmlib.TrigramIndex
+_INDEX_LOCK = threading.Lock()
+_INDEX_REFRESHING = set()   # Roots with a refresh job in progress
+#--------------------------------------------------------------------------#
+
+def GetSearchIndex(path):
+    """Get the shared trigram index for the given search root. The index
+    is persisted in the cache directory and is kept up to date by a
+    background job that only rereads files that have changed.
+    @param path: directory path
+    @return: ebmlib.TrigramIndex
+
+    """
+    path = os.path.normpath(path)
+    with _INDEX_LOCK:
+        index = _SEARCH_INDEXES.get(path, None)
+        if index is None:
+            key = path
+            if ebmlib.IsUnicode(key):
+                key = key.encode('utf-8')
+            key = hashlib.md5(key).hexdigest()
+            cache = os.path.join(ed_glob.CONFIG['CACHE_DIR'],
+                                 u"searchidx", key + u".idx")
+            index = ebmlib.TrigramIndex(path, cache)
+            _SEARCH_INDEXES[path] = index
+            load = True
+        else:
+            load = False
+
+    # NOTE: must be done after releasing the lock as the refresh takes it
+    if load:
+        RefreshSearchIndex(index, True)
+    return index
+
+def RefreshSearchIndex(index, load=False):
+    """Queue a background job to bring a search index up to date with
+    the file system.
+    @param index: ebmlib.TrigramIndex
+    @keyword load: load the persisted index before refreshing
+
+    """
+    with _INDEX_LOCK:
+        if index.Root in _INDEX_REFRESHING:
+            return
+        _INDEX_REFRESHING.add(index.Root)
+
+    def DoRefresh():
+        """Refresh the index on a background thread"""
+        try:
+            if load:
+                index.Load()
+            if index.Refresh():
+                index.Save()
+        finally:
+            with _INDEX_LOCK:
+                _INDEX_REFRESHING.discard(index.Root)
+
+    ed_thread.EdThreadPool().QueueJob(DoRefresh)
+
+def ReplaceInFiles(parent, replacer, paths):
+    """Queue a background job to replace all matches in the given files.
+    Progress is reported to the parent window's status bar and the user is
+    asked whether to keep or revert the changes when the job is done.
+    @param parent: main window
+    @param replacer: ebmlib.FileReplacer
+    @param paths: iterable of file paths (i.e a directory walk)
+
+    """
+    pid = parent.GetTopLevelParent().GetId()
+    jroot = os.path.join(ed_glob.CONFIG['CACHE_DIR'], u"replace")
+    replacer.SetEncodingFunction(_GetFileEncoding)
+
+    def DoReplace():
+        """Replace in the files on a background thread"""
+        try:
+            if not os.path.exists(jroot):
+                os.makedirs(jroot)
+            jpath = tempfile.mkdtemp(dir=jroot)
+            replacer.SetJournal(ebmlib.ReplaceJournal(jpath))
+
+            flist = list(paths)
+            total = len(flist)
+            step = max(1, total // 100)
+            for idx, result in enumerate(replacer.ReplaceInFiles(flist)):
+                if idx % step == 0:
+                    ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE,
+                                       (pid, idx + 1, total))
+        finally:
+            # Stopping the progress bar stops its timer so do it on the
+            # main thread.
+            wx.CallAfter(ed_msg.PostMessage, ed_msg.EDMSG_PROGRESS_STATE,
+                         (pid, 0, 0))
+            wx.CallAfter(_OnReplaceInFilesDone, parent, replacer)
+
+    ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_SHOW, (pid, True))
+    ed_thread.EdThreadPool().QueueJob(DoReplace)
+
+def _GetFileEncoding(fname, sample):
+    """Detect the encoding of a file the same way as when it is opened
+    @param fname: file path
+    @param sample: bytes from the start of the file
+    @return: encoding name
+
+    """
+    fobj = ed_txt.EdFile(fname)
+    fobj.DetectEncoding(sample)
+    return fobj.GetEncoding()
+
+def _OnReplaceInFilesDone(parent, replacer):
+    """Report the results of L{ReplaceInFiles} and let the user revert
+    the changes.
+    @param parent: main window
+    @param replacer: ebmlib.FileReplacer
+
+    """
+    journal = replacer.Journal
+    if not parent or not replacer.Count:
+        if journal is not None:
+            journal.Discard()
+        if parent:
+            ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
+                               (ed_glob.SB_INFO, _("No matches were found")))
+        return
+
+    msg = _("%(count)d matches were replaced in %(files)d files.") % \
+          dict(count=replacer.Count, files=replacer.FileCount)
+    ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT, (ed_glob.SB_INFO, msg))
+
+    errors = replacer.GetErrors()
+    if len(errors):
+        msg += u"\n\n" + _("The following files could not be changed:")
+        msg += u"\n" + u"\n".join([fname for fname, err in errors[:10]])
+    msg += u"\n\n" + _("Keep the changes? Choosing No will restore the "
+                        "original files.")
+    dlg = wx.MessageDialog(parent, msg, _("Replace All"),
+                           style=wx.ICON_QUESTION|wx.YES_NO|wx.CENTER)
+    result = dlg.ShowModal()
+    dlg.Destroy()
+
+    if result == wx.ID_NO:
+        errors = journal.Revert()
+        if len(errors):
+            msg = _("The following files could not be restored:")
+            msg += u"\n" + u"\n".join([fname for fname, err in errors[:10]])
+            msg += u"\n\n" + _("The original files are in: %s") % journal.Path
+            wx.MessageBox(msg, _("Replace All"), wx.OK|wx.ICON_ERROR)
+    else:
+        journal.Discard()
+
 #--------------------------------------------------------------------------#
 
 class EdSearchEngine(ebmlib.SearchEngine):
@@ -91,13 +244,124 @@ class EdSearchEngine(ebmlib.SearchEngine):
 
     def SetSearchPool(self, pool):
         """Set the search pool"""
+        if pool is self.GetSearchPool():
+            return # Unchanged
+
         if not ebmlib.IsUnicode(pool):
             pool = pool.decode('utf-8')
-        pool = unicodedata.normalize('NFC', pool)
         super(EdSearchEngine, self).SetSearchPool(pool)
 
 #--------------------------------------------------------------------------#
 
+class BufferSearchPool(object):
+    """Search pool that keeps a normalized snapshot of a buffers text. The
+    snapshot is kept up to date by listening to the buffers modification
+    events and only refetching the lines that have been edited, so that
+    repeated searches in an unchanged buffer (i.e incremental search) reuse
+    the same text object.
+
+    """
+    _RE_EOL = re.compile(u"\r\n|\r|\n")
+    def __init__(self):
+        super(BufferSearchPool, self).__init__()
+
+        # Attributes
+        self._stc = None
+        self._lines = None  # Normalized lines (None == needs refetch)
+        self._text = None   # Normalized text
+
+    def _SplitLines(self, text):
+        """Split text into lines the same way the buffer does keeping the
+        line endings.
+        @param text: string
+        @return: list of strings
+
+        """
+        lines = list()
+        start = 0
+        for match in self._RE_EOL.finditer(text):
+            lines.append(text[start:match.end()])
+            start = match.end()
+        lines.append(text[start:])
+        return lines
+
+    def Clear(self):
+        """Drop the cached text"""
+        self._lines = None
+        self._text = None
+
+    def GetText(self, stc):
+        """Get the normalized text of the given buffer
+        @param stc: EditraStc
+        @return: unicode
+
+        """
+        if stc is not self._stc:
+            self.SetBuffer(stc)
+
+        if self._text is not None and self._lines is None:
+            return self._text
+
+        if self._lines is None or len(self._lines) != stc.GetLineCount():
+            # Full refresh
+            text = stc.GetText()
+            if not ebmlib.IsUnicode(text):
+                text = ed_txt.DecodeString(text)
+            self._text = unicodedata.normalize('NFC', text)
+            self._lines = None
+        elif self._text is None:
+            # Refetch only the lines that were edited
+            lines = self._lines
+            for idx, line in enumerate(lines):
+                if line is None:
+                    line = stc.GetLine(idx)
+                    if not ebmlib.IsUnicode(line):
+                        line = ed_txt.DecodeString(line)
+                    lines[idx] = unicodedata.normalize('NFC', line)
+            self._text = u"".join(lines)
+        return self._text
+
+    def OnModified(self, evt):
+        """Invalidate the lines that were touched by an edit
+        @param evt: wx.stc.StyledTextEvent
+
+        """
+        evt.Skip()
+        mod = evt.GetModificationType()
+        if not (mod & (wx.stc.STC_MOD_INSERTTEXT|wx.stc.STC_MOD_DELETETEXT)):
+            return
+
+        if self._lines is None:
+            if self._text is None:
+                return # Nothing cached yet
+            self._lines = self._SplitLines(self._text)
+
+        # Lines [line, line + removed] were replaced by [line, line + added]
+        line = self._stc.LineFromPosition(evt.GetPosition())
+        added = evt.GetLinesAdded()
+        removed = max(0, -added)
+        self._lines[line:line + removed + 1] = [None] * (max(0, added) + 1)
+        self._text = None
+
+    def SetBuffer(self, stc):
+        """Set the buffer this pool tracks
+        @param stc: EditraStc or None
+
+        """
+        if self._stc is not None:
+            try:
+                self._stc.Unbind(wx.stc.EVT_STC_MODIFIED,
+                                 handler=self.OnModified)
+            except wx.PyDeadObjectError:
+                pass
+
+        self.Clear()
+        self._stc = stc
+        if stc is not None:
+            stc.Bind(wx.stc.EVT_STC_MODIFIED, self.OnModified)
+
+#--------------------------------------------------------------------------#
+
 class SearchController(object):
     """Controls the interface to the text search engine"""
     def __init__(self, owner, getstc):
@@ -119,6 +383,7 @@ class SearchController(object):
         self._filters  = None
         self._clients = list()
         self._engine = EdSearchEngine(u"") # For incremental searches
+        self._pool = BufferSearchPool()
 
         # Setup
         self._engine.SetResultFormatter(self._engine.FormatResult)
@@ -139,6 +404,7 @@ class SearchController(object):
     def __del__(self):
         """Cleanup message handlers"""
         ed_msg.Unsubscribe(self._OnShowFindMsg)
+        self._pool.SetBuffer(None)
         if self._finddlg:
             self._finddlg.Destroy()
 
@@ -414,9 +680,20 @@ class SearchController(object):
                           style=wx.OK|wx.CENTER|wx.ICON_ERROR)
             return
 
-        # XXX: may be inefficient to copy whole buffer each time for files
-        #      that are large.
-        self._engine.SetSearchPool(stc.GetText())
+        # Files in a large file view are searched through their mapping
+        # instead of the part of the file that is in the buffer.
+        view = None
+        if getattr(stc, 'IsLargeFileView', lambda: False)():
+            view = stc.GetLargeFileView()
+        else:
+            # Pool text is cached between searches and only updated for the
+            # regions of the buffer that have been edited.
+            self._engine.SetSearchPool(self._pool.GetText(stc))
+
+        def DoFind(pos, wrap=False):
+            if view is None:
+                return self._engine.Find(pos)
+            return view.Find(self._engine.GetQueryObject(), pos, isdown, wrap)
 
         # Get the search start position
         if evt.GetEventType() == eclib.edEVT_FIND:
@@ -438,15 +715,10 @@ class SearchController(object):
                     spos = min(start, end)
 
         # Do the find
-        match = self._engine.Find(spos)
+        match = DoFind(spos)
         if match is not None:
             start, end = match
-            if isdown:
-                start = start + spos
-                end = end + spos
-                stc.SetSelection(start, end)
-            else:
-                stc.SetSelection(start, end)
+            stc.SetSelection(start, end)
 
             # Ensure caret and the line its in is exposed
             stc.EnsureCaretVisible()
@@ -460,11 +732,11 @@ class SearchController(object):
         else:
             # try search from top again
             if isdown:
-                match = self._engine.Find(0)
+                match = DoFind(0, True)
                 ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
                                   (ed_glob.SB_INFO, _("Search wrapped to top")))
             else:
-                match = self._engine.Find(-1)
+                match = DoFind(-1, True)
                 ed_msg.PostMessage(ed_msg.EDMSG_UI_SB_TXT,
                                   (ed_glob.SB_INFO,
                                   _("Search wrapped to bottom")))
@@ -499,6 +771,7 @@ class SearchController(object):
         engine = EdSearchEngine(query, evt.IsRegEx(), True,
                                 evt.IsMatchCase(), evt.IsWholeWord())
         engine.SetResultFormatter(engine.FormatResult)
+        engine.SetWorkerCount(Profile_Get('SEARCH_WORKERS', 'int', 4))
 
         # Send the search function over to any interested parties that wish
         # to process the results.
@@ -521,20 +794,20 @@ class SearchController(object):
             ed_msg.PostMessage(ed_msg.EDMSG_START_SEARCH,
                                (engine.FindAllLines,))
         elif smode == eclib.LOCATION_OPEN_DOCS:
-            files = [fname.GetFileName()
-                     for fname in self._parent.GetTextControls()]
+            files = self._parent.GetFileNames()
             ed_msg.PostMessage(ed_msg.EDMSG_START_SEARCH,
                                (engine.SearchInFiles, [files,], dict()))
-        elif smode == eclib.LOCATION_IN_CURRENT_DIR:
-            stc = self._stc()
-            path = ebmlib.GetPathName(stc.GetFileName())
-            engine.SetFileFilters(evt.GetFileFilters())
-            ed_msg.PostMessage(ed_msg.EDMSG_START_SEARCH,
-                               (engine.SearchInDirectory,
-                               [path,], dict(recursive=evt.IsRecursive())))
-        elif smode == eclib.LOCATION_IN_FILES:
-            path = evt.GetDirectory()
+        elif smode in (eclib.LOCATION_IN_CURRENT_DIR, eclib.LOCATION_IN_FILES):
+            if smode == eclib.LOCATION_IN_CURRENT_DIR:
+                stc = self._stc()
+                path = ebmlib.GetPathName(stc.GetFileName())
+            else:
+                path = evt.GetDirectory()
             engine.SetFileFilters(evt.GetFileFilters())
+            if Profile_Get('SEARCH_INDEX', 'bool', False):
+                index = GetSearchIndex(path)
+                engine.SetSearchIndex(index)
+                RefreshSearchIndex(index)
             ed_msg.PostMessage(ed_msg.EDMSG_START_SEARCH,
                                (engine.SearchInDirectory,
                                 [path,], dict(recursive=evt.IsRecursive())))
@@ -668,6 +941,17 @@ class SearchController(object):
             else:
                 pass # TODO: notify of no matches?
         elif smode == eclib.LOCATION_OPEN_DOCS:
+            # Load the tabs that have not been shown yet. Pages move when a
+            # file can't be opened and its tab is closed so find each one
+            # again before it is loaded.
+            nbook = self._parent
+            pages = [nbook.GetPage(pg_num)
+                     for pg_num in xrange(nbook.GetPageCount())
+                     if nbook.IsPlaceholder(pg_num)]
+            for page in pages:
+                pg_num = nbook.GetPageIndex(page)
+                if pg_num >= 0:
+                    nbook.LoadPage(pg_num)
             for ctrl in self._parent.GetTextControls():
                 engine.SetSearchPool(ctrl.GetText())
                 matches = engine.FindAll()
@@ -675,23 +959,36 @@ class SearchController(object):
                     self.ReplaceInStc(ctrl, matches, rstring, evt.IsRegEx())
                     results += len(matches)
         elif smode in (eclib.LOCATION_IN_CURRENT_DIR, eclib.LOCATION_IN_FILES):
+            if engine.GetQueryObject() is None:
+                return
+
+            try:
+                replacer = ebmlib.FileReplacer(engine.GetQueryObject(),
+                                               rstring, evt.IsRegEx())
+            except re.error, err:
+                msg = _("Error in regular expression expansion."
+                        "The replace action cannot be completed.\n\n"
+                        "Error Message: %s") % err.message
+                wx.MessageBox(msg, _("Replace Error"), wx.OK|wx.ICON_ERROR)
+                return
+
             dlg = wx.MessageDialog(self._parent,
-                                   _("Sorry will be ready for future version"),
-                                   _("Not implemented"),
-#                                   _("Warning this cannot be undone!"),
-#                                   _("Do Replace All?"),
+                                   _("Replace all matches in the files on disk?"),
+                                   _("Do Replace All?"),
                                    style=wx.ICON_WARNING|wx.OK|wx.CANCEL|wx.CENTER)
             result = dlg.ShowModal()
             dlg.Destroy()
+            if result != wx.ID_OK:
+                return
 
-            if result == wx.ID_OK:
-                pass
-#                path = evt.GetDirectory()
-#                ed_msg.PostMessage(ed_msg.EDMSG_START_SEARCH,
-#                                   (engine.SearchInDirectory,
-#                                    [path,], dict(recursive=evt.IsRecursive())))
+            if smode == eclib.LOCATION_IN_CURRENT_DIR:
+                stc = self._stc()
+                path = ebmlib.GetPathName(stc.GetFileName())
             else:
-                return
+                path = evt.GetDirectory()
+            engine.SetFileFilters(evt.GetFileFilters())
+            ReplaceInFiles(self._parent, replacer,
+                           engine.GetDirectoryFiles(path, evt.IsRecursive()))
 
         # Post number of matches that were replaced to the status bar
         if results > 0:
@@ -751,18 +1048,20 @@ class SearchController(object):
             self._clients.remove(client)
 
     @staticmethod
-    def ReplaceInStc(stc, matches, rstring, isregex=True):
-        """Replace the strings at the position in the given StyledTextCtrl
-        @param stc: StyledTextCtrl
+    def _GetReplaceEdits(matches, rstring, isregex, nbytes, offset=0):
+        """Get the edits needed to replace the matches in a buffer. The
+        match offsets are converted to the byte positions used by the
+        StyledTextCtrl.
         @param matches: list of match objects
         @param rstring: Replace string
-        @keyword isregex: Is it a regular expression operation (bool)
+        @param isregex: Is it a regular expression operation (bool)
+        @param nbytes: length of the searched text in the buffer (bytes)
+        @keyword offset: buffer position of the searched text
+        @return: list of tuples [(start, end, replacement),]
 
         """
-        if not len(matches):
-            return
         def GetSub(match):
-            """replace substitution callable for re.sub"""
+            """Get the replacement text for a match"""
             value = rstring
             if isregex:
                 try:
@@ -770,38 +1069,98 @@ class SearchController(object):
                 except:
                     pass
             return value
-        text = re.sub(matches[0].re, GetSub, stc.GetText())
+
+        text = matches[0].string
+        if not ebmlib.IsUnicode(text) or len(text) == nbytes:
+            # Character and byte positions are the same
+            return [(offset + match.start(), offset + match.end(),
+                     GetSub(match)) for match in matches]
+
+        edits = list()
+        bpos = offset
+        cpos = 0
+        for match in matches:
+            start, end = match.span()
+            bpos += len(text[cpos:start].encode('utf-8'))
+            bend = bpos + len(text[start:end].encode('utf-8'))
+            edits.append((bpos, bend, GetSub(match)))
+            bpos = bend
+            cpos = end
+        return edits
+
+    @staticmethod
+    def _GetTextMatches(matches, text):
+        """Get the matches in the text of the buffer. The search pool is
+        normalized so when the buffer has decomposed characters the match
+        offsets don't line up with it, in which case the search is redone
+        on the buffer's text.
+        @param matches: list of match objects
+        @param text: text that was searched
+        @return: list of match objects
+
+        """
+        if matches[0].string == text:
+            return matches
+        return list(matches[0].re.finditer(text))
+
+    @staticmethod
+    def _ApplyReplaceEdits(stc, edits):
+        """Apply the replacements to the buffer as a single undo action.
+        Edits are applied from the end of the buffer back so that the
+        positions of the remaining edits are not changed by earlier ones.
+        @param stc: StyledTextCtrl
+        @param edits: list of tuples from L{_GetReplaceEdits}
+        @return: int (change in length of the buffer)
+
+        """
+        delta = 0
+        stc.BeginUndoAction()
+        try:
+            for start, end, value in reversed(edits):
+                stc.SetTargetStart(start)
+                stc.SetTargetEnd(end)
+                stc.ReplaceTarget(value)
+                delta += (stc.GetTargetEnd() - start) - (end - start)
+        finally:
+            stc.EndUndoAction()
+        return delta
+
+    @staticmethod
+    def ReplaceInStc(stc, matches, rstring, isregex=True):
+        """Replace the strings at the position in the given StyledTextCtrl
+        @param stc: StyledTextCtrl
+        @param matches: list of match objects
+        @param rstring: Replace string
+        @keyword isregex: Is it a regular expression operation (bool)
+
+        """
+        if not len(matches):
+            return
+        matches = SearchController._GetTextMatches(matches, stc.GetText())
+        if not len(matches):
+            return
+        edits = SearchController._GetReplaceEdits(matches, rstring, isregex,
+                                                  stc.GetLength())
         # Update the view
         with eclib.Freezer(stc) as _tmp:
-            stc.BeginUndoAction()
-            cpos = stc.CurrentPos
-            stc.ClearAll()
-            stc.SetText(text)
-            stc.GotoPos(cpos)
-            stc.EndUndoAction()
+            SearchController._ApplyReplaceEdits(stc, edits)
 
     @staticmethod
     def ReplaceInStcSelection(stc, matches, rstring, isregex=True):
         """Replace all the matches in the selection"""
         if not len(matches):
             return
-        def GetSub(match):
-            """replace substitution callable for re.sub"""
-            value = rstring
-            if isregex:
-                try:
-                    value = match.expand(rstring)
-                except:
-                    pass
-            return value
-        text = re.sub(matches[0].re, GetSub, stc.GetSelectedText())
+        matches = SearchController._GetTextMatches(matches,
+                                                   stc.GetSelectedText())
+        if not len(matches):
+            return
+        start, end = stc.GetSelection()
+        edits = SearchController._GetReplaceEdits(matches, rstring, isregex,
+                                                  end - start, start)
         # Update the view
         with eclib.Freezer(stc) as _tmp:
-            stc.BeginUndoAction()
-            start, end = stc.GetSelection()
-            stc.ReplaceSelection(text)
-            stc.SetSelection(start, start+len(text))
-            stc.EndUndoAction()
+            delta = SearchController._ApplyReplaceEdits(stc, edits)
+            stc.SetSelection(start, end + delta)
 
     def SetFileFilters(self, filters):
         """Set the file filter to use
@@ -1535,14 +1894,11 @@ class SearchResultList(eclib.OutputBuffer):
         """
         mainw = wx.GetApp().GetActiveWindow()
         nbook = mainw.GetNotebook()
-        buffers = [ page.GetFileName() for page in nbook.GetTextControls() ]
-        if fname in buffers:
-            page = buffers.index(fname)
-            nbook.ChangePage(page)
-            cpage = nbook.GetPage(page)
+        if nbook.HasFileOpen(fname):
+            nbook.GotoPage(fname)
         else:
             nbook.OnDrop([fname])
-            cpage = nbook.GetPage(nbook.GetSelection())
+        cpage = nbook.GetPage(nbook.GetSelection())
 
         cpage.GotoLine(line)
         cpage.SetFocus()
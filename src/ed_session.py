@@ -101,29 +101,43 @@ class SessionManager(object):
         @param name: session name
         @return: list of paths
 
+        """
+        return self.LoadSessionInfo(name)[0]
+
+    def LoadSessionInfo(self, name):
+        """Load a named session and the index of the file that was
+        selected when it was saved.
+        @param name: session name
+        @return: tuple (list of paths, index of current file or -1)
+
         """
         session = self.PathFromSessionName(name)
         assert os.path.exists(session)
         flist = list()
+        current = -1
         with open(session, 'rb') as f_handle:
             # Load and validate file
             try:
-                flist = cPickle.load(f_handle)
+                sdata = cPickle.load(f_handle)
                 # TODO: Extend in future to support loading sessions
                 #       for multiple windows.
-                flist = flist.get('win1', list())
+                flist = sdata.get('win1', list())
                 for item in flist:
                     if type(item) not in (unicode, str):
                         raise TypeError("Invalid item in unpickled sequence")
+                current = sdata.get('win1_current', -1)
+                if type(current) is not int or current >= len(flist):
+                    current = -1
             except (cPickle.UnpicklingError, TypeError, EOFError), e:
                 util.Log("[ed_session][err] %s" % e)
                 raise e # Re throw
-        return flist
+        return flist, current
 
-    def SaveSession(self, name, paths):
+    def SaveSession(self, name, paths, current=-1):
         """Save the given list of files as a session with the given name
         @param name: session name
         @param paths: list of file paths
+        @keyword current: index of the selected file in paths
         @return: bool
 
         """
@@ -132,7 +146,7 @@ class SessionManager(object):
         with open(session, 'wb') as f_handle:
             try:
                 # TODO multi window support
-                sdata = dict(win1=paths)
+                sdata = dict(win1=paths, win1_current=current)
                 cPickle.dump(sdata, f_handle)
                 bOk = True
             except Exception, msg:
@@ -25,6 +25,8 @@ __revision__ = "$Revision$"
 # Imports
 
 import os
+import time
+import collections
 import wx, wx.stc
 
 # Local Imports
@@ -38,10 +40,11 @@ import ed_marker
 import ed_msg
 import ed_mdlg
 import ed_txt
+import ed_largefile
+import ed_backup
 from ed_keyh import KeyHandler, ViKeyHandler
 import eclib
 import ebmlib
-import ed_thread
 
 #-------------------------------------------------------------------------#
 # Globals
@@ -57,6 +60,11 @@ SPACECHARS = " \t\r\n"
 NONSPACE = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"
 OPERATORS = "./\?[]{}<>!@#$%^&*():=-+\"';,"
 
+# Asynchronous load settings
+_LOAD_FLUSH_TIME = 0.05     # Target time to spend appending text per update
+_LOAD_FLUSH_DELAY = 10      # ms between updates while text is pending
+_LOAD_MIN_BATCH = 64 * 1024 # Smallest amount of text to append per update
+
 #-------------------------------------------------------------------------#
 
 def jumpaction(func):
@@ -125,9 +133,13 @@ class EditraStc(ed_basestc.EditraBaseStc):
         # Attributes
         self.LOG = wx.GetApp().GetLog()
         self._loading = None
+        self._bigview = None # Large file view
+        self._loadbuf = collections.deque() # Text waiting to be appended
+        self._loadbatch = _LOAD_MIN_BATCH
+        self._loadcall = None
+        self._loaddone = False
+        self._loadprog = 0
         self.key_handler = KeyHandler(self)
-        self._backup_done = True
-        self._bktimer = wx.Timer(self)
         self._dwellsent = False
 
         # Macro Attributes
@@ -160,7 +172,6 @@ class EditraStc(ed_basestc.EditraBaseStc):
         self.Bind(wx.EVT_CHAR, self.OnChar)
         self.Bind(wx.EVT_KEY_UP, self.OnKeyUp)
         self.Bind(wx.EVT_LEFT_UP, self.OnLeftUp)
-        self.Bind(wx.EVT_TIMER, self.OnBackupTimer)
 
         # Async file load events
         self.Bind(ed_txt.EVT_FILE_LOAD, self.OnLoadProgress)
@@ -442,13 +453,11 @@ class EditraStc(ed_basestc.EditraBaseStc):
         @param enable: bool
 
         """
+        self._config['autobkup'] = enable
         if enable:
-            # TODO: make backup interval configurable
-            if not self._bktimer.IsRunning():
-                self._bktimer.Start(30000) # every 30 seconds
+            ed_backup.EdBackupService().AddBuffer(self)
         else:
-            if self._bktimer.IsRunning():
-                self._bktimer.Stop()
+            ed_backup.EdBackupService().RemoveBuffer(self)
 
     def InvertCase(self):
         """Invert the case of the selected text
@@ -536,6 +545,9 @@ class EditraStc(ed_basestc.EditraBaseStc):
         @param line: line to go to (int)
 
         """
+        if self._bigview is not None:
+            line = self._bigview.ShowLine(line)
+
         if line > self.GetLineCount():
             line = self.GetLineCount()
         elif line < 0:
@@ -615,45 +627,24 @@ class EditraStc(ed_basestc.EditraBaseStc):
         """
         return self._config['autocomp']
 
-    def OnBackupTimer(self, evt):
-        """Backup the buffer to a backup file.
-        @param evt: wx.TimerEvent
+    def OnDestroy(self, evt):
+        """Stop the automatic backups of the buffer and close the large file
+        view (if any) when it is destroyed.
 
         """
-        fname = self.GetFileName()
-        # If the file is loading or is over 5MB don't do automatic backups.
-        if self.IsLoading() or ebmlib.GetFileSize(fname) > 5242880:
-            return
-
-        # If the file is different than the last save point make the backup.
-        suffix = _PGET('AUTOBACKUP_SUFFIX', default=u'.edbkup')
-        bkupmgr = ebmlib.FileBackupMgr(None, u"%s" + suffix)
-        path = _PGET('AUTOBACKUP_PATH', default=u"")
-        if path and os.path.exists(path):
-            bkupmgr.SetBackupDirectory(path)
-
-        if not self._backup_done and \
-           (not bkupmgr.HasBackup(fname) or bkupmgr.IsBackupNewer(fname)):
-            msg = _("File backup performed: %s") % fname
-            idval = self.Id
-            target = self.TopLevelParent
-            def BackupJob(fobj, text):
-                writer = bkupmgr.GetBackupWriter(fobj)
-                try:
-                    writer(text)
-                except Exception, msg:
-                    return
-                nevt = ed_event.StatusEvent(ed_event.edEVT_STATUS, idval,
-                                            msg, ed_glob.SB_INFO)
-                wx.PostEvent(target, nevt)
-            ed_thread.EdThreadPool().QueueJob(BackupJob, self.File, self.GetText())
-            self._backup_done = True
+        if evt.GetId() == self.GetId():
+            if self._config['autobkup']:
+                ed_backup.EdBackupService().RemoveBuffer(self)
+            if self._bigview is not None:
+                self._bigview.Close()
+                self._bigview = None
+        super(EditraStc, self).OnDestroy(evt)
 
     def OnModified(self, evt):
         """Overrides base modified handler"""
         super(EditraStc, self).OnModified(evt)
-        if not self.IsLoading():
-            self._backup_done = False
+        if self._config['autobkup'] and not self.IsLoading():
+            ed_backup.EdBackupService().MarkDirty(self)
 
     def OnKeyDown(self, evt):
         """Handles keydown events, currently only deals with
@@ -843,39 +834,90 @@ class EditraStc(ed_basestc.EditraBaseStc):
 #            util.SetClipboardText(stxt, primary=True)
         self.PostPositionEvent()
 
+    def _FinishLoad(self):
+        """Finalize the buffer after an asynchronous load has completed"""
+        self.SetReadOnly(False)
+        pid = self.TopLevelParent.Id
+        ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE, (pid, 0, 0))
+        self.SetSavePoint()
+        self.SetUndoCollection(True)
+        del self._loading
+        self._loading = None
+        parent = self.GetParent()
+        if hasattr(parent, 'DoPostLoad'):
+            parent.DoPostLoad(self)
+
+    def _FlushLoadBuffer(self):
+        """Append the text that has been read by the asynchronous loader
+        to the buffer. Text is appended in batches that are sized to take
+        about L{_LOAD_FLUSH_TIME} so that the ui stays responsive.
+
+        """
+        self._loadcall = None
+        if not self or self._loading is None:
+            return # Destroyed or aborted
+
+        if len(self._loadbuf):
+            stime = time.time()
+            text = list()
+            size = 0
+            while len(self._loadbuf) and size < self._loadbatch:
+                txt = self._loadbuf.popleft()
+                text.append(txt)
+                size += len(txt)
+
+            self.SetReadOnly(False)
+            self.AppendText(u"".join(text))
+            self.SetSavePoint()
+            self.SetReadOnly(True)
+
+            # Adapt the batch size to how fast the text is being appended
+            etime = max(time.time() - stime, 0.001)
+            batch = int(size * (_LOAD_FLUSH_TIME / etime))
+            self._loadbatch = max(_LOAD_MIN_BATCH,
+                                  min(batch, self._loadbatch * 2))
+
+            pid = self.TopLevelParent.Id
+            total = max(self.File.GetSize(), 1)
+            prog = min(self._loadprog, total)
+            ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE, (pid, prog, total))
+
+        if len(self._loadbuf):
+            self._loadcall = wx.CallLater(_LOAD_FLUSH_DELAY,
+                                          self._FlushLoadBuffer)
+        elif self._loaddone:
+            self._FinishLoad()
+
     def OnLoadProgress(self, evt):
         """Receives file loading events from asynchronous file loading"""
         pid = self.TopLevelParent.Id
         if evt.GetState() == ed_txt.FL_STATE_READING:
             if evt.HasText():
-                # TODO: get gauge updates working properly
-#                sb = self.GetTopLevelParent().GetStatusBar()
-#                gauge = sb.GetGauge()
-#                gauge.SetValue(evt.GetProgress())
-#                gauge.Show()
-#                gauge.ProcessPendingEvents()
-#                sb.ProcessPendingEvents()
-                self.SetReadOnly(False)
-                self.AppendText(evt.GetValue())
-                self.SetSavePoint()
-                self.SetReadOnly(True)
-                # wx.GetApp().Yield(True) # Too slow on windows...
+                # Text is batched and appended on a timer to avoid the
+                # overhead of updating the buffer for every chunk.
+                self._loadbuf.append(evt.GetValue())
+                self._loadprog = evt.GetProgress()
+                if self._loadcall is None:
+                    self._loadcall = wx.CallLater(_LOAD_FLUSH_DELAY,
+                                                  self._FlushLoadBuffer)
         elif evt.GetState() == ed_txt.FL_STATE_END:
-            self.SetReadOnly(False)
-            ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE, (pid, 0, 0))
-            self.SetSavePoint()
-            self.SetUndoCollection(True)
-            del self._loading
-            self._loading = None
-            parent = self.GetParent()
-            if hasattr(parent, 'DoPostLoad'):
-                parent.DoPostLoad()
+            self._loaddone = True
+            if self._loadcall is None:
+                self._FlushLoadBuffer()
         elif evt.GetState() == ed_txt.FL_STATE_START:
+            self._loadbuf.clear()
+            self._loadbatch = _LOAD_MIN_BATCH
+            self._loaddone = False
+            self._loadprog = 0
             ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_SHOW, (pid, True))
             ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE, (pid, 0, self.File.GetSize()))
             self.SetReadOnly(True)
             self.SetUndoCollection(False)
         elif evt.GetState() == ed_txt.FL_STATE_ABORTED:
+            self._loadbuf.clear()
+            if self._loadcall is not None:
+                self._loadcall.Stop()
+                self._loadcall = None
             self.SetReadOnly(False)
             self.ClearAll()
 
@@ -1305,6 +1347,23 @@ class EditraStc(ed_basestc.EditraBaseStc):
                   }
         return eol_map.get(self.GetEOLMode(), ed_glob.ID_EOL_UNIX)
 
+    def GetLargeFileView(self):
+        """Get the large file view that the file is shown in
+        @return: ed_largefile.LargeFileView or None
+
+        """
+        return self._bigview
+
+    def GetPos(self):
+        """Update Line/Column information
+        @return: tuple (line, column)
+
+        """
+        line, column = super(EditraStc, self).GetPos()
+        if self._bigview is not None:
+            line = self._bigview.GetLine(line)
+        return (line, column)
+
     def IsBracketHlOn(self):
         """Returns whether bracket highlighting is being used by this
         control or not.
@@ -1338,6 +1397,13 @@ class EditraStc(ed_basestc.EditraBaseStc):
         #       are reporting a yet unexplainable AttributeError here
         return getattr(self, '_loading', None) is not None
 
+    def IsLargeFileView(self):
+        """Is the file shown in a read only large file view
+        @return: bool
+
+        """
+        return self._bigview is not None
+
     def IsRecording(self):
         """Returns whether the control is in the middle of recording
         a macro or not.
@@ -1816,12 +1882,26 @@ class EditraStc(ed_basestc.EditraBaseStc):
         @param path: path to file
 
         """
+        if self._bigview is not None:
+            self._bigview.Close()
+            self._bigview = None
+
         fsize = ebmlib.GetFileSize(path)
         if fsize < 1048576: # 1MB
             return super(EditraStc, self).LoadFile(path)
         else:
             ed_msg.PostMessage(ed_msg.EDMSG_FILE_OPENING, path)
             self.file.SetPath(path)
+
+            # Memory map files that are too large to load into the buffer
+            limit = _PGET('LARGEFILE_SIZE', 'int', 0) * 1048576
+            if limit and fsize >= limit:
+                self._bigview = ed_largefile.CreateView(self, path)
+                if self._bigview is not None:
+                    self._bigview.ShowLine(0)
+                    self.SetModTime(ebmlib.GetFileModTime(path))
+                    return True
+
             self._loading = wx.BusyCursor()
             self.file.ReadAsync(self)
             return True
@@ -1833,7 +1913,17 @@ class EditraStc(ed_basestc.EditraBaseStc):
 
         """
         cfile = self.GetFileName()
-        if os.path.exists(cfile):
+        if os.path.exists(cfile) and self._bigview is not None:
+            try:
+                self._bigview.Reload()
+            except EnvironmentError, msg:
+                self.LOG("[ed_stc][err] Failed to Reload %s" % cfile)
+                return False, msg
+            self.SetModTime(ebmlib.GetFileModTime(cfile))
+            context = self.TopLevelParent.Id
+            ed_msg.PostMessage(ed_msg.EDMSG_FILE_OPENED, cfile, context)
+            return True, ''
+        elif os.path.exists(cfile):
             try:
                 self.BeginUndoAction()
                 marks = self.GetBookmarks()
@@ -1914,6 +2004,11 @@ class EditraStc(ed_basestc.EditraBaseStc):
                               _("Read Only"),
                               style=wx.OK|wx.CENTER|wx.ICON_WARNING)
                 return True
+            elif self._bigview is not None:
+                wx.MessageBox(_("Files shown in the large file view cannot be saved"),
+                              _("Read Only"),
+                              style=wx.OK|wx.CENTER|wx.ICON_WARNING)
+                return True
             else:
                 if not self.File.IsRawBytes():
                     self.File.Write(self.GetText())
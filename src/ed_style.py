@@ -31,6 +31,7 @@ import wx
 
 # Editra Libraries
 import ed_glob
+import ed_msg
 import util
 from profiler import Profile_Get, Profile_Set
 import eclib
@@ -351,6 +352,8 @@ class StyleMgr(object):
 
     """
     STYLES         = dict()         # Static cache for loaded style set(s)
+    COMPILED       = dict()         # (style set, fonts) -> compiled styles
+    LOADED         = set()          # Sheets loaded since last theme change
     FONT_PRIMARY   = u"primary"
     FONT_SECONDARY = u"secondary"
     FONT_SIZE      = u"size"
@@ -368,6 +371,7 @@ class StyleMgr(object):
         self.fonts = self.GetFontDictionary()
         self.style_set = custom
         self.syntax_set = list()
+        self._style_tags = dict()   # style id -> style tag
         self.LOG = wx.GetApp().GetLog()
 
         # Get the Style Set
@@ -378,6 +382,16 @@ class StyleMgr(object):
         else:
             self.LOG("[ed_style][err] Failed to import styles from %s" % custom)
 
+    def _ClearCompiledStyles(self, name):
+        """Forget the compiled styles of a style set after it has changed
+        @param name: style set name
+
+        """
+        StyleMgr.LOADED.discard(name)
+        for key in StyleMgr.COMPILED.keys():
+            if key[0] == name:
+                del StyleMgr.COMPILED[key]
+
     def BlankStyleDictionary(self):
         """Returns a dictionary of unset style items based on the
         tags defined in the current dictionary.
@@ -401,10 +415,7 @@ class StyleMgr(object):
         @return: style tag string
 
         """
-        for data in self.syntax_set:
-            if style_id == data[0]:
-                return data[1]
-        return 'default_style'
+        return self._style_tags.get(style_id, 'default_style')
 
     def GetFontDictionary(self, default=True):
         """Does a system lookup to build a default set of fonts using
@@ -507,18 +518,9 @@ class StyleMgr(object):
         @return: style item (may be empty/null style item)
 
         """
-        scheme = self.GetStyleSet()
-        if name in scheme:
-            item = scheme[name]
-
-            # Set font value if need be
-            ival = unicode(item)
-            if u"%" in ival:
-                val = ival % self.fonts
-                item = StyleItem()
-                item.SetAttrFromStr(val)
-
-            return item
+        compiled = self.GetCompiledStyles().get(name, None)
+        if compiled is not None:
+            return compiled[0]
         else:
             return StyleItem()
 
@@ -542,12 +544,38 @@ class StyleMgr(object):
         @return: style item in string form
 
         """
-        if self.HasNamedStyle(name):
-            stystr = unicode(self.GetItemByName(name))
-            return stystr.replace("modifiers:", "")
+        compiled = self.GetCompiledStyles().get(name, None)
+        if compiled is not None:
+            return compiled[1]
         else:
             return u""
 
+    def GetCompiledStyles(self):
+        """Get the styles of the current style set with the fonts
+        substituted in. The compiled styles are shared by all the managers
+        that use the same style set and fonts.
+        @return: dict(tag -> (StyleItem, style spec string))
+
+        """
+        key = (self.style_set, tuple(sorted(self.fonts.items())))
+        compiled = StyleMgr.COMPILED.get(key, None)
+        if compiled is None:
+            compiled = dict()
+            for tag, item in self.GetStyleSet().iteritems():
+                ival = unicode(item)
+                if u"%" in ival:
+                    try:
+                        val = ival % self.fonts
+                    except (KeyError, ValueError, TypeError):
+                        self.LOG("[ed_style][err] Bad font value in %s" % tag)
+                    else:
+                        item = StyleItem()
+                        item.SetAttrFromStr(val)
+                        ival = unicode(item)
+                compiled[tag] = (item, ival.replace(u"modifiers:", u""))
+            StyleMgr.COMPILED[key] = compiled
+        return compiled
+
     def GetStyleSet(self):
         """Returns the current set of styles or the default set if
         there is no current set.
@@ -627,6 +655,8 @@ class StyleMgr(object):
                 return False
             ret_val = self.SetStyles(style_sheet, style_data)
             reader.close()
+            if ret_val:
+                StyleMgr.LOADED.add(style_sheet)
             return ret_val
         elif style_sheet not in StyleMgr.STYLES:
             self.LOG("[ed_style][warn] Style sheet %s does not exists" % style_sheet)
@@ -848,6 +878,7 @@ class StyleMgr(object):
             return False
 
         StyleMgr.STYLES[self.style_set][style_tag] = value
+        self._ClearCompiledStyles(self.style_set)
         return True
 
     def SetStyles(self, name, style_dict, nomerge=False):
@@ -861,6 +892,7 @@ class StyleMgr(object):
         if nomerge:
             self.style_set = name
             StyleMgr.STYLES[name] = self.PackStyleSet(style_dict)
+            self._ClearCompiledStyles(name)
             return True
 
         # Merge the given style set with the default set to fill in any
@@ -889,6 +921,7 @@ class StyleMgr(object):
                         style_dict[tag] = style_dict['default_style'].Clone()
 
             StyleMgr.STYLES[name] = self.PackStyleSet(style_dict)
+            self._ClearCompiledStyles(name)
             return True
         else:
             self.LOG("[ed_style][err] SetStyles expects a " \
@@ -912,6 +945,9 @@ class StyleMgr(object):
                 valid_settings.append(syn)
 
         self.syntax_set = valid_settings
+        self._style_tags = dict()
+        for style_id, tag in valid_settings:
+            self._style_tags.setdefault(style_id, tag)
         return True
 
     def StyleDefault(self):
@@ -921,7 +957,6 @@ class StyleMgr(object):
         """
         self.StyleClearAll()
         self.SetCaretForeground(wx.BLACK)
-        self.Colourise(0, -1)
 
     def UpdateAllStyles(self, spec_style=None):
         """Refreshes all the styles and attributes of the control
@@ -930,7 +965,12 @@ class StyleMgr(object):
 
         """
         if spec_style and (spec_style != self.style_set):
-            self.LoadStyleSheet(self.GetStyleSheet(spec_style), force=True)
+            sheet = self.GetStyleSheet(spec_style)
+            if sheet in StyleMgr.LOADED:
+                # Already reloaded by another buffer since the theme changed
+                self.style_set = sheet
+            else:
+                self.LoadStyleSheet(sheet, force=True)
         self.SetSyntax(self.GetSyntaxParams())
         self.Refresh()
 
@@ -988,11 +1028,23 @@ class StyleMgr(object):
         self.SetEdgeColour(edge_colour.GetFore())
         self.SetCaretForeground(default_fore)
         self.SetCaretLineBack(self.GetItemByName('caret_line').GetBack())
-        self.Colourise(0, -1)
 
 #-----------------------------------------------------------------------------#
 # Utility Functions
 
+def _OnStyleChange(msg):
+    """Clear the compiled styles when the theme or fonts have changed
+    @param msg: Message Object
+
+    """
+    StyleMgr.COMPILED.clear()
+    StyleMgr.LOADED.clear()
+
+ed_msg.Subscribe(_OnStyleChange, ed_msg.EDMSG_THEME_CHANGED)
+ed_msg.Subscribe(_OnStyleChange, ed_msg.EDMSG_PROFILE_CHANGE + ('FONT1',))
+ed_msg.Subscribe(_OnStyleChange, ed_msg.EDMSG_PROFILE_CHANGE + ('FONT2',))
+ed_msg.Subscribe(_OnStyleChange, ed_msg.EDMSG_PROFILE_CHANGE + ('SYNTHEME',))
+
 def NullStyleItem():
     """Create a null style item
     @return: empty style item that cannot be merged
@@ -17,6 +17,7 @@ __revision__ = "$Revision$"
 
 #--------------------------------------------------------------------------#
 # Imports
+import os
 import sys
 import re
 import time
@@ -24,6 +25,8 @@ import wx
 import codecs
 import encodings as enclib
 import locale
+import shutil
+import tempfile
 from StringIO import StringIO
 
 # Local Imports
@@ -54,6 +57,17 @@ BOM = { 'utf-8'  : codecs.BOM_UTF8,
 # The first group from this expression will be the encoding.
 RE_MAGIC_COMMENT = re.compile("coding[:=]\s*\"*([-\w.]+)\"*")
 
+# Read sizes used by the asynchronous file loader. Reads start small so that
+# the first text is shown quickly and grow to reduce per chunk overhead.
+ASYNC_MIN_CHUNK = 64 * 1024
+ASYNC_MAX_CHUNK = 8 * 1024 * 1024
+
+# Number of characters encoded at a time when writing
+WRITE_CHUNK = 1024 * 1024
+
+# Number of files whose detected encoding is remembered
+ENCODING_CACHE_SIZE = 512
+
 # File Load States
 FL_STATE_START   = 0
 FL_STATE_READING = 1
@@ -97,13 +111,14 @@ class EdFile(ebmlib.FileObjectImpl):
         self._raw = False           # Raw bytes?
         self._fuzzy_enc = False
         self._job = None # async file read job
+        self._nread = 0  # bytes read by the read generator
 
     def _SanitizeBOM(self, bstring):
         """Remove byte order marks that get automatically added by some codecs"""
         for enc in ('utf-8', 'utf-32', 'utf-16'):
             bmark = BOM.get(enc)
             if bstring.startswith(bmark):
-                bstring = bstring.lstrip(bmark)
+                bstring = bstring[len(bmark):]
                 break
         return bstring
 
@@ -120,6 +135,24 @@ class EdFile(ebmlib.FileObjectImpl):
         self._raw = True
         return '\0'.join(bytes_value)+'\0'
 
+    def _ReadAll(self, chunk=512):
+        """Read the rest of the open file using a single read sized to the
+        file instead of many small reads.
+        @keyword chunk: minimum read size
+        @return: string
+
+        """
+        try:
+            size = os.fstat(self.Handle.fileno()).st_size
+        except (OSError, AttributeError, ValueError):
+            size = 0
+        bytes_value = self.Handle.read(max(size, chunk))
+        # File may have grown since the stat
+        tail = self.Handle.read()
+        if len(tail):
+            bytes_value += tail
+        return bytes_value
+
     def _ResetBuffer(self):
         Log("[ed_txt][info] Resetting buffer")
         if self.__buffer is not None:
@@ -129,6 +162,69 @@ class EdFile(ebmlib.FileObjectImpl):
 
     Encoding = property(lambda self: self.GetEncoding())
 
+    def _WriteChunks(self, chunks):
+        """Write the byte strings to the file through a temporary file
+        that is moved over the file when complete.
+        @param chunks: list of byte strings
+        @throws: WriteError Failed to write the file
+
+        """
+        if not len(self.Path):
+            raise WriteError("No file path")
+
+        # Replace the file a link points to and not the link itself
+        path = os.path.realpath(self.Path)
+        dname, bname = os.path.split(path)
+        try:
+            fd, tmp = tempfile.mkstemp(prefix=u".%s." % bname,
+                                       suffix=u".tmp", dir=dname)
+        except (IOError, OSError), msg:
+            # Directory is not writable, so fall back to writing in place
+            Log("[ed_txt][warn] Failed to create temp file: %s" % msg)
+            if self.DoOpen('wb'):
+                Log("[ed_txt][info] Opened %s, writing as %s" % (self.Path, self.Encoding))
+                try:
+                    self.Handle.writelines(chunks)
+                finally:
+                    self.Close()
+                return
+            else:
+                raise WriteError, self.GetLastError()
+
+        Log("[ed_txt][info] Opened %s, writing as %s" % (tmp, self.Encoding))
+        try:
+            handle = os.fdopen(fd, 'wb')
+            try:
+                handle.writelines(chunks)
+                handle.flush()
+                os.fsync(handle.fileno())
+            finally:
+                handle.close()
+
+            # Keep the permissions of the original file or use the
+            # default ones for a new file.
+            if os.path.exists(path):
+                shutil.copymode(path, tmp)
+                if hasattr(os, 'chown'):
+                    fstat = os.stat(path)
+                    try:
+                        os.chown(tmp, fstat.st_uid, fstat.st_gid)
+                    except OSError:
+                        pass
+            else:
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(tmp, 0666 & ~umask)
+
+            ebmlib.ReplaceFile(tmp, path)
+        except (IOError, OSError), msg:
+            self.SetLastError(unicode(msg))
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise WriteError, self.GetLastError()
+
     def AddModifiedCallback(self, callback):
         """Set modified callback method
         @param callback: callable
@@ -155,21 +251,23 @@ class EdFile(ebmlib.FileObjectImpl):
             fileobj.AddModifiedCallback(cback)
         return fileobj
 
-    def DecodeText(self):
+    def DecodeText(self, bytes_value=None):
         """Decode the text in the buffer and return a unicode string.
+        @keyword bytes_value: bytes to decode instead of the buffer
         @return: unicode or str
 
         """
-        assert self.__buffer is not None, "No buffer!"
         assert self.encoding is not None, "Encoding Not Set!"
+        if bytes_value is None:
+            assert self.__buffer is not None, "No buffer!"
+            bytes_value = self.__buffer.getvalue()
 
-        bytes_value = self.__buffer.getvalue()
         ustr = u""
         try:
             if not self._fuzzy_enc or not EdFile._Checker.IsBinaryBytes(bytes_value):
-                if self.bom is not None:
+                if self.bom is not None and bytes_value.startswith(self.bom):
                     Log("[ed_txt][info] Stripping %s BOM from text" % self.encoding)
-                    bytes_value = bytes_value.replace(self.bom, '', 1)
+                    bytes_value = bytes_value[len(self.bom):]
 
                 Log("[ed_txt][info] Attempting to decode with: %s" % self.encoding)
                 ustr = bytes_value.decode(self.encoding)
@@ -230,9 +328,12 @@ class EdFile(ebmlib.FileObjectImpl):
 
         return ustr
 
-    def DetectEncoding(self):
+    def DetectEncoding(self, bytes_value=None):
         """Try to determine the files encoding
-        @precondition: File handle has been opened and is valid
+        @keyword bytes_value: bytes read from the start of the file to check
+                              instead of reading from the file handle.
+        @precondition: File handle has been opened and is valid or the
+                       bytes_value is given.
         @postcondition: encoding and bom attributes will be set
 
         """
@@ -242,9 +343,23 @@ class EdFile(ebmlib.FileObjectImpl):
             Log(msg)
             return
 
-        assert self.Handle is not None, "File handle not initialized"
-        lines = [ self.Handle.readline() for x in range(2) ]
-        self.Handle.seek(0)
+        # Unchanged files don't need to be checked again
+        key = _GetEncodingKey(self.GetPath(), self._magic['bad'])
+        cached = _ENC_CACHE.Get(key)
+        if cached is not None:
+            enc, self.bom, self._magic['comment'], self._fuzzy_enc = cached
+            if enc is None:
+                enc = Profile_Get('ENCODING', default=DEFAULT_ENCODING)
+            Log("[ed_txt][info] DetectEncoding - Cached encoding %s" % enc)
+            self.encoding = enc
+            return
+
+        if bytes_value is None:
+            assert self.Handle is not None, "File handle not initialized"
+            lines = [ self.Handle.readline() for x in range(2) ]
+            self.Handle.seek(0)
+        else:
+            lines = GetFirstLines(bytes_value, 2)
         enc = None
         if len(lines):
             # First check for a Byte Order Mark
@@ -264,45 +379,54 @@ class EdFile(ebmlib.FileObjectImpl):
 
         if enc is None:
             Log("[ed_txt][info] Doing brute force encoding check")
-            enc = GuessEncoding(self.GetPath(), 4096)
+            if bytes_value is None:
+                enc = GuessEncoding(self.GetPath(), 4096)
+            else:
+                enc = GuessEncodingBytes(bytes_value[:4096])
 
         if enc is None:
             self._fuzzy_enc = True
+            # Fuzzy matches use whatever the default is when the file is read
+            if key is not None:
+                _ENC_CACHE.Put(key, (None, self.bom, self._magic['comment'],
+                                     True))
             enc = Profile_Get('ENCODING', default=DEFAULT_ENCODING)
+        elif key is not None:
+            _ENC_CACHE.Put(key, (enc, self.bom, self._magic['comment'],
+                                 self._fuzzy_enc))
 
         Log("[ed_txt][info] DetectEncoding - Set Encoding to %s" % enc)
         self.encoding = enc 
 
-    def EncodeText(self):
-        """Do a trial run of encoding all the text to ensure that we can
-        determine an encoding that will correctly be able to write the data
-        to disk.
-        @return: bool
+    def EncodeText(self, value):
+        """Encode the text to a byte string to be written to disk. The text
+        is encoded once with an incremental encoder. If it cannot be
+        encoded with the current encoding the next candidate encoding that
+        is able to encode the failed text is tried.
+        @param value: unicode
+        @return: list of byte strings
+        @throws: WriteError if no encoding is able to encode the text
 
         """
-        bOk = True
-        txt = self.__buffer.read(8)
-        self.__buffer.seek(0)
-        if not ebmlib.IsUnicode(txt):
-            # Already a string so nothing to do
-            return bOk
-
         encs = GetEncodings()
         if self.encoding is None:
             self.encoding = Profile_Get('ENCODING', default=DEFAULT_ENCODING)
         encs.insert(0, self.encoding)
         cenc = self.encoding
 
-        readsize = min(self.__buffer.len, 4096)
+        failed = None
         for enc in encs:
-            self.__buffer.seek(0)
+            # Check the characters the last encoding failed on first to
+            # avoid encoding everything up to them again.
+            if failed is not None:
+                try:
+                    failed.encode(enc)
+                except (LookupError, UnicodeError):
+                    continue
+
             try:
-                tmpchars = self.__buffer.read(readsize)
-                while len(tmpchars):
-                    tmpchars.encode(enc)
-                    tmpchars = self.__buffer.read(readsize)
+                chunks = EncodeChunks(value, enc)
                 self.encoding = enc
-                self.__buffer.seek(0)
                 self.ClearLastError()
             except LookupError, msg:
                 Log("[ed_txt][err] Invalid encoding: %s" % enc)
@@ -312,10 +436,10 @@ class EdFile(ebmlib.FileObjectImpl):
                 Log("[ed_txt][err] Failed to encode text with %s" % enc)
                 Log("[ed_txt][err] %s" % msg)
                 self.SetLastError(unicode(msg))
+                failed = msg.object[msg.start:msg.end]
             else:
                 break
         else:
-            bOk = False
             raise WriteError("Failed to encode text to byte string")
 
         # Log if the encoding changed due to encoding errors
@@ -323,8 +447,37 @@ class EdFile(ebmlib.FileObjectImpl):
             Log("[ed_txt][warn] Used encoding %s differs from original %s" %\
                 (self.encoding, cenc))
 
-        self.__buffer.seek(0)
-        return bOk
+        return chunks
+
+    def EncodeForWrite(self, value):
+        """Encode text to the byte strings that are written to disk for it.
+        The encoding is updated if the text has a magic comment and the BOM
+        is added if the file has one.
+        @param value: (Unicode) String of text
+        @return: list of byte strings
+        @throws: WriteError if no encoding is able to encode the text
+
+        """
+        # Check if a magic comment was added or changed
+        enc = CheckMagicComment(GetFirstLines(value, 2))
+
+        # Update encoding if necessary
+        if enc is not None:
+            Log("[ed_txt][info] Write: found magic comment: %s" % enc)
+            self.encoding = enc
+
+        if ebmlib.IsUnicode(value):
+            chunks = self.EncodeText(value)
+            chunks[0] = self._SanitizeBOM(chunks[0])
+            Log("[ed_txt][info] Write Successful encode with %s" % self.Encoding)
+        else:
+            # Already a string so nothing to do
+            chunks = [value]
+
+        if self.HasBom():
+            Log("[ed_txt][info] Adding BOM back to text")
+            chunks.insert(0, self.bom)
+        return chunks
 
     def FireModified(self):
         """Fire the modified callback(s)"""
@@ -379,35 +532,32 @@ class EdFile(ebmlib.FileObjectImpl):
 
     def Read(self, chunk=512):
         """Get the contents of the file as a string, automatically handling
-        any decoding that may be needed.
-        @keyword chunk: read size
+        any decoding that may be needed. The file is read in one go and the
+        encoding detection and decoding are done on the bytes in memory.
+        @keyword chunk: minimum read size
         @return: unicode str
         @throws: ReadError Failed to open file for reading
 
         """
         if self.DoOpen('rb'):
-            self.DetectEncoding()
+            self._raw = False
 
+            Log("[ed_txt][info] Read - Start reading")
+            try:
+                bytes_value = self._ReadAll(chunk)
+            finally:
+                self.Close()
+            Log("[ed_txt][info] Read - End reading")
+
+            self.DetectEncoding(bytes_value)
             if self.encoding is None:
                 # fall back to user setting
                 self.encoding = Profile_Get('ENCODING', default=DEFAULT_ENCODING)
                 Log(("[ed_txt][warn] Failed to detect encoding "
                     "falling back to default: %s") % self.encoding)
 
-            self._ResetBuffer()
-            self._raw = False
-
-            Log("[ed_txt][info] Read - Start reading")
-            tmp = self.Handle.read(chunk)
-            while len(tmp):
-                self.__buffer.write(tmp)
-                tmp = self.Handle.read(chunk)
-            Log("[ed_txt][info] Read - End reading")
-
-            self.Close()
-            txt = self.DecodeText()
+            txt = self.DecodeText(bytes_value)
             self.SetModTime(ebmlib.GetFileModTime(self.GetPath()))
-            self._ResetBuffer()
             return txt
         else:
             Log("[ed_txt][err] Read Error: %s" % self.GetLastError())
@@ -423,49 +573,57 @@ class EdFile(ebmlib.FileObjectImpl):
         filesize = ebmlib.GetFileSize(self.GetPath())
         ed_msg.PostMessage(ed_msg.EDMSG_PROGRESS_STATE, (pid, 1, filesize))
         # Fork off async job to threadpool
-        self._job = FileReadJob(control, self.ReadGenerator, 4096)
+        self._job = FileReadJob(control, self.ReadGenerator, ASYNC_MIN_CHUNK)
+        self._job.SetProgressFunction(lambda: self._nread)
         ed_thread.EdThreadPool().QueueJob(self._job.run)
 
     def ReadGenerator(self, chunk=512):
         """Get the contents of the file as a string, automatically handling
-        any decoding that may be needed.
+        any decoding that may be needed. The read size doubles after each
+        chunk up to a limit based on the size of the file.
 
-        @keyword chunk: read size
+        @keyword chunk: initial read size
         @return: unicode (generator)
         @throws: ReadError Failed to open file for reading.
 
         """
         if self.DoOpen('rb'):
-            # Throttle yielded text to reduce event over head
             filesize = ebmlib.GetFileSize(self.Path)
-            throttle = max(chunk, filesize/100)
+            maxchunk = min(max(filesize // 32, ASYNC_MIN_CHUNK), ASYNC_MAX_CHUNK)
+            chunk = min(chunk, maxchunk)
 
             self.DetectEncoding()
             try:
-                # Must use codec reader to ensure correct number of
-                # bytes are read in to be decoded.
-                reader = codecs.getreader(self.Encoding)(self.Handle)
-                buffered_data = StringIO()
-                while True:
-                    tmp = reader.read(chunk)
-                    if not len(tmp):
-                        if buffered_data.len:
-                            yield buffered_data.getvalue()
-                            buffered_data.close()
-                        break
-
-                    buffered_data.write(tmp)
-                    if buffered_data.len >= throttle:
-                        yield buffered_data.getvalue()
-                        buffered_data.close()
-                        buffered_data = StringIO()
+                # Incremental decoder keeps any partial characters at the
+                # end of a read to be decoded with the next one.
+                decoder = codecs.getincrementaldecoder(self.Encoding)()
+                bom = self.bom is not None
+                self._nread = 0
+                bytes_value = self.Handle.read(chunk)
+                while len(bytes_value):
+                    self._nread += len(bytes_value)
+                    txt = decoder.decode(bytes_value)
+                    if bom and len(txt):
+                        # Some decoders (utf-16) require the BOM and consume
+                        # it, others leave it in the text.
+                        bom = False
+                        if txt.startswith(u"\ufeff"):
+                            txt = txt[1:]
+                    if len(txt):
+                        yield txt
+                    chunk = min(chunk * 2, maxchunk)
+                    bytes_value = self.Handle.read(chunk)
+
+                txt = decoder.decode('', True)
+                if len(txt):
+                    yield txt
             except Exception, msg:
                 Log("[ed_txt][err] Error while reading with %s" % self.Encoding)
                 Log("[ed_txt][err] %s" % msg)
                 self.SetLastError(unicode(msg))
-                self.Close()
                 if self._magic['comment']:
                     self._magic['bad'] = True
+            self.Close()
 
             Log("[ed_txt][info] Decoded %s with %s" % (self.Path, self.Encoding))
             self.SetModTime(ebmlib.GetFileModTime(self.Path))
@@ -505,7 +663,9 @@ class EdFile(ebmlib.FileObjectImpl):
         raise NotImplementedError
 
     def Write(self, value):
-        """Write the given value to the file
+        """Write the given value to the file. The data is written to a
+        temporary file that replaces the file once it has been completely
+        written so that a failure during the write cannot truncate the file.
         @param value: (Unicode) String of text to write to disk
         @note: exceptions are allowed to be raised for the writing
         @throws: WriteError Failed to open file for writing
@@ -515,51 +675,14 @@ class EdFile(ebmlib.FileObjectImpl):
         ctime = time.time()
         Log("[ed_txt][info] Write - Called: %s - Time: %d" % (self.Path, ctime))
 
-        # Check if a magic comment was added or changed
-        self._ResetBuffer()
-        self.__buffer.write(value)
-        self.__buffer.seek(0)
-        enc = CheckMagicComment([ self.__buffer.readline() for x in range(2) ])
-        self.__buffer.seek(0)
-
-        # Update encoding if necessary
-        if enc is not None:
-            Log("[ed_txt][info] Write: found magic comment: %s" % enc)
-            self.encoding = enc
-
         # Encode to byte string
         # Do before opening file so that encoding failures don't cause file
         # data to get lost!
-        if self.EncodeText():
-            Log("[ed_txt][info] Write Successful test encode with %s" % self.Encoding)
+        chunks = self.EncodeForWrite(value)
 
-            # Open and write the file
-            if self.DoOpen('wb'):
-                Log("[ed_txt][info] Opened %s, writing as %s" % (self.Path, self.Encoding))
-                
-                if self.HasBom():
-                    Log("[ed_txt][info] Adding BOM back to text")
-                    self.Handle.write(self.bom)
-
-                # Write the file to disk
-                chunk = min(self.__buffer.len, 4096)
-                buffer_read = self.__buffer.read
-                filewrite = self.Handle.write
-                fileflush = self.Handle.flush
-                sanitize = self._SanitizeBOM
-                tmp = buffer_read(chunk)
-                while len(tmp):
-                    tmp_bytes = sanitize(tmp.encode(self.Encoding))
-                    filewrite(tmp_bytes)
-                    fileflush()
-                    tmp = buffer_read(chunk)
-
-                self._ResetBuffer() # Free buffer
-                self.Close()
-                Log("[ed_txt][info] %s was written successfully" % self.Path)
-            else:
-                self._ResetBuffer()
-                raise WriteError, self.GetLastError()
+        # Write the file to disk
+        self._WriteChunks(chunks)
+        Log("[ed_txt][info] %s was written successfully" % self.Path)
 
         Log("[ed_txt][info] Write - Complete: %s - Time: %d" % 
             (self.Path, time.time() - ctime))
@@ -584,23 +707,26 @@ class FileReadJob(object):
         self.receiver = receiver
         self._args = args
         self._kwargs = kwargs
+        self._progress = None
         self.pid = receiver.TopLevelParent.Id
 
     def run(self):
         """Read the text"""
         evt = FileLoadEvent(edEVT_FILE_LOAD, wx.ID_ANY, None, FL_STATE_START)
         wx.PostEvent(self.receiver, evt)
-        time.sleep(.75) # give ui a chance to get ready
 
-        count = 1
+        progress = 0
         for txt in self._task(*self._args, **self._kwargs):
             if self.cancel:
                 break
 
+            if self._progress is None:
+                progress += len(txt)
+            else:
+                progress = self._progress()
             evt = FileLoadEvent(edEVT_FILE_LOAD, wx.ID_ANY, txt)
-            evt.SetProgress(count * self._args[0])
+            evt.SetProgress(progress)
             wx.PostEvent(self.receiver, evt)
-            count += 1
 
         evt = FileLoadEvent(edEVT_FILE_LOAD, wx.ID_ANY, None, FL_STATE_END)
         wx.PostEvent(self.receiver, evt)
@@ -609,6 +735,14 @@ class FileReadJob(object):
         """Cancel the running task"""
         self.cancel = True
 
+    def SetProgressFunction(self, funct):
+        """Set the function to get the progress of the task with, by
+        default the progress is the length of the text read so far.
+        @param funct: callable() returning int (i.e bytes read)
+
+        """
+        self._progress = funct
+
 #-----------------------------------------------------------------------------#
 
 edEVT_FILE_LOAD = wx.NewEventType()
@@ -650,7 +784,7 @@ class FileLoadEvent(wx.PyEvent):
         return self._value
 
     def SetProgress(self, progress):
-        """Set the number of bytes that have been read
+        """Set the amount of text that has been read
         @param progress: int
 
         """
@@ -759,30 +893,99 @@ def FallbackReader(fname):
 
     return (None, None)
 
+def EncodeChunks(value, enc, chunk=WRITE_CHUNK):
+    """Encode a unicode string in chunks with an incremental encoder
+    @param value: unicode
+    @param enc: encoding name
+    @keyword chunk: number of characters to encode at a time
+    @return: list of byte strings
+    @throws: LookupError, UnicodeEncodeError
+
+    """
+    encoder = codecs.getincrementalencoder(enc)()
+    chunks = list()
+    pos = 0
+    while pos < len(value):
+        end = pos + chunk
+        # Don't split a surrogate pair (narrow builds)
+        if end < len(value) and u'\ud800' <= value[end - 1] <= u'\udbff':
+            end += 1
+        chunks.append(encoder.encode(value[pos:end]))
+        pos = end
+    chunks.append(encoder.encode(u"", True))
+    return chunks
+
+def GetFirstLines(bytes_value, count):
+    """Get the first lines of a byte string the same way that calling
+    readline on a file would.
+    @param bytes_value: string
+    @param count: number of lines to get
+    @return: list of strings
+
+    """
+    lines = list()
+    pos = 0
+    for x in range(count):
+        end = bytes_value.find('\n', pos)
+        if end < 0:
+            end = len(bytes_value)
+        else:
+            end += 1
+        lines.append(bytes_value[pos:end])
+        pos = end
+    return lines
+
 def GuessEncoding(fname, sample):
     """Attempt to guess an encoding
     @param fname: filename
     @param sample: pre-read amount
     @return: encoding or None
 
+    """
+    try:
+        with open(fname, 'rb') as handle:
+            bytes_value = handle.read(sample)
+    except (IOError, OSError):
+        return None
+    return GuessEncodingBytes(bytes_value)
+
+def GuessEncodingBytes(bytes_value):
+    """Attempt to guess the encoding of a sample of bytes from the start
+    of a file by trying to decode it with each of the candidate encodings.
+    @param bytes_value: string
+    @return: encoding or None
+
     """
     for enc in GetEncodings():
         try:
-            with open(fname, 'rb') as handle:
-                with codecs.getreader(enc)(handle) as reader:
-                    value = reader.read(sample)
-                    if str('\0') in value:
-                        continue
-                    else:
-                        return enc
+            # Incomplete characters at the end of the sample are allowed
+            decoder = codecs.getincrementaldecoder(enc)()
+            value = decoder.decode(bytes_value)
         except Exception, msg:
             continue
+
+        if str('\0') not in value:
+            return enc
     return None
 
 def GetEncodings():
-    """Get a list of possible encodings to try from the locale information
+    """Get a list of possible encodings to try from the locale information.
+    The list is only built again after the encoding or language preference
+    has changed.
     @return: list of strings
 
+    """
+    global _ENCODINGS
+    encs = _ENCODINGS
+    if encs is None:
+        encs = _BuildEncodings()
+        _ENCODINGS = encs
+    return list(encs)
+
+def _BuildEncodings():
+    """Build the list of candidate encodings
+    @return: tuple of strings
+
     """
     encodings = list()
     encodings.append(Profile_Get('ENCODING', None))
@@ -833,4 +1036,44 @@ def GetEncodings():
                         rlist.append(enc)
                 except LookupError:
                     pass
-    return rlist
+    return tuple(rlist)
+
+#-----------------------------------------------------------------------------#
+# Encoding caches
+
+_ENCODINGS = None # Candidate encodings, built on first use
+
+def _GetEncodingKey(path, badmagic=False):
+    """Get the key that a files detected encoding is cached under
+    @param path: file path
+    @keyword badmagic: was the files magic comment found to be wrong
+    @return: tuple (path, mtime, size, badmagic) or None
+
+    """
+    if not path:
+        return None
+    try:
+        fstat = os.stat(path)
+    except (OSError, EnvironmentError, UnicodeError):
+        return None
+    return (os.path.normcase(os.path.abspath(path)),
+            fstat.st_mtime, fstat.st_size, badmagic)
+
+# Encodings detected for files keyed on L{_GetEncodingKey} so a file that
+# has changed is detected again.
+_ENC_CACHE = ebmlib.LRUCache(ENCODING_CACHE_SIZE)
+
+def _OnEncodingPrefChanged(msg):
+    """Clear the encoding caches when the preferences that they are based
+    on have changed.
+    @param msg: Message Object
+
+    """
+    global _ENCODINGS
+    _ENCODINGS = None
+    _ENC_CACHE.Clear()
+
+ed_msg.Subscribe(_OnEncodingPrefChanged,
+                 ed_msg.EDMSG_PROFILE_CHANGE + ('ENCODING',))
+ed_msg.Subscribe(_OnEncodingPrefChanged,
+                 ed_msg.EDMSG_PROFILE_CHANGE + ('LANG',))
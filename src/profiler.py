@@ -44,6 +44,7 @@ _DEFAULTS = {
            'AALIASING'  : False,            # Use Anti-Aliasing if availble
            'APPSPLASH'  : True,             # Show splash at startup
            'AUTOBACKUP' : False,            # Automatically backup files
+           'AUTOBACKUP_COUNT' : 1,          # Number of backups to keep
            'AUTOBACKUP_PATH' : '',          # Backup path
            'AUTOBACKUP_SUFFIX' : '.edbkup', # Backup suffix (e.g. .edbkup, ~)
            'AUTO_COMP'  : True,             # Use Auto-comp if available
@@ -75,7 +76,10 @@ _DEFAULTS = {
            'ISBINARY'   : False,            # Is this instance a binary
            'KEY_PROFILE': None,             # Keybinding profile
            'LANG'       : 'Default',        # UI language
+           'LARGEFILE_SIZE' : 128,          # Open files over this size (MB)
+                                            # in the large file view (0=off)
            'LASTCHECK'  : 0,                # Last time update check was done
+           'LAZY_TABS'  : True,             # Create editors when tabs are shown
            #'LEXERMENU'  : [lang_name,]     # Created on an as needed basis
            'MAXIMIZED'  : False,            # Was window maximized on exit
            'MODE'       : 'CODE',           # Overall editor mode
@@ -88,6 +92,8 @@ _DEFAULTS = {
            'SAVE_SESSION' : False,          # Load previous session on startup
            'SEARCH_LOC' : list(),           # Recent Search Locations
            'SEARCH_FILTER' : '',            # Last used search filter
+           'SEARCH_INDEX' : False,          # Use trigram index for find in files
+           'SEARCH_WORKERS' : 4,            # Find in files worker threads
            'SESSION_KEY' : '',              # Ipc Session Server Key
            'SET_WPOS'   : True,             # Remember window position
            'SET_WSIZE'  : True,             # Remember mainwindow size on exit
@@ -20,11 +20,13 @@ __revision__ = "$Revision$"
 
 #-----------------------------------------------------------------------------#
 # Imports
+import re
 import wx.stc as stc
 
 #Local Imports
 import synglob
 import syndata
+import synlexer
 
 #-----------------------------------------------------------------------------#
 # Style Id's
@@ -55,6 +57,7 @@ SYNTAX_ITEMS = [
     ]
    
 issl_table = ';+-?.#~'
+_LINE_RE = re.compile(u"[^\r\n]*(?:\r\n|\r|\n)?")
 
 #-----------------------------------------------------------------------------#
 
@@ -93,35 +96,31 @@ def StyleText(stc, start, end):
     @param end: end position
 
     """
+    LEXER.StyleText(stc, start, end)
 
-    # First, figure out the line based on the position.
-    line = stc.LineFromPosition(start)
+class IssueListLexer(synlexer.ContainerLexer):
+    """Styles each line by its first character, lines that don't start with
+    one of the issue characters have the style of the line before them.
 
-    # Find the start of the line that's been styled before this one.
-    while line > 0 and stc.GetLineState(line) == 0:
-        line -= 1
-
-    eline = stc.LineFromPosition(end)
-
-    state = stc.GetLineState(line) - 1
-    if state < 0:
-        state = 0
-
-    for ln in range(line, eline + 1):
-        text = stc.GetLine(ln).encode('utf-8')
-        len_text = len(text)
-        text = text.strip()
-
-        if len(text) == 0:
-            state = 0
-        else:
-            if len(text) > 0:
-                ch = text[0]
-                ix = issl_table.find(ch)
+    """
+    def Tokenize(self, text, state):
+        """Split the text into lines
+        @see: L{synlexer.ContainerLexer.Tokenize}
+
+        """
+        state = state or STC_ISSL_DEFAULT
+        for match in _LINE_RE.finditer(text):
+            line = match.group()
+            if not len(line):
+                break
+
+            ltext = line.strip()
+            if not len(ltext):
+                state = STC_ISSL_DEFAULT
+            else:
+                ix = issl_table.find(ltext[0])
                 if ix >= 0:
                     state = ix + 1
+            yield match.start(), line, state, state
 
-        stc.StartStyling(stc.PositionFromLine(ln), 0xFF)
-        stc.SetStyling(len_text, state)
-
-        stc.SetLineState(ln, state + 1)
+LEXER = IssueListLexer(0xff)
@@ -21,11 +21,11 @@ __revision__ = "$Revision$"
 # Imports
 import wx.stc as stc
 from pygments.token import Token
-from pygments.lexers import get_lexer_by_name
 
 # Local Imports
 import synglob
 import syndata
+import synlexer
 
 #-----------------------------------------------------------------------------#
 # Style Id's
@@ -96,27 +96,19 @@ def StyleText(stc, start, end):
     @param end: end position
 
     """
-    cpos = 0
-    stc.StartStyling(cpos, 0x1f)
-    lexer = get_lexer_by_name("html+mako")
-    doctxt = stc.GetTextRange(0, end)
-    wineol = stc.GetEOLChar() == "\r\n"
-    for token, txt in lexer.get_tokens(doctxt):
-#        print token, txt
-        style = TOKEN_MAP.get(token, STC_MAKO_DEFAULT)
-        if style == STC_MAKO_PREPROCESSOR and txt.startswith(u'#'):
-            style = STC_MAKO_COMMENT
-#        elif style == STC_MAKO_STRING and txt[-1] not in '"\'':
-#            style = STC_MAKO_STRINGEOL
-
-        tlen = len(txt)
-        if wineol and "\n" in txt:
-            tlen += txt.count("\n")
-
-        if tlen:
-            stc.SetStyling(tlen, style)
-        cpos += tlen
-        stc.StartStyling(cpos, 0x1f)
+    LEXER.StyleText(stc, start, end)
+
+def _GetStyle(token, value):
+    """Get the style of a token
+    @param token: pygments token type
+    @param value: token text
+    @return: style id
+
+    """
+    style = TOKEN_MAP.get(token, STC_MAKO_DEFAULT)
+    if style == STC_MAKO_PREPROCESSOR and value.startswith(u'#'):
+        style = STC_MAKO_COMMENT
+    return style
 
 #-----------------------------------------------------------------------------#
 
@@ -131,4 +123,5 @@ TOKEN_MAP = { Token.Literal.String : STC_MAKO_STRING,
               Token.Name.Attribute : STC_MAKO_ATTRIBUTE,
               Token.String.Interpol : STC_MAKO_SCALAR,
               Token.Name.Tag : STC_MAKO_TAG }
-              
\ No newline at end of file
+
+LEXER = synlexer.PygmentsLexer("html+mako", _GetStyle)
@@ -31,6 +31,7 @@ import re
 #Local Imports
 import synglob
 import syndata
+import synlexer
 
 #-----------------------------------------------------------------------------#
 # Style Id's
@@ -111,15 +112,16 @@ def StyleText(_stc, start, end):
     @param end: end position
 
     """
-    for index, token, txt in lexer.get_tokens_unprocessed(_stc.GetTextRange(0, end)):
-#        print index, token, txt
-        style = TOKEN_MAP.get(token, STC_NONMEM_DEFAULT)
+    LEXER.StyleText(_stc, start, end)
 
-#        print "Text=%s, len=%s" % (txt, len(txt))
-        _stc.StartStyling(index, 0x1f)
-        tlen = len(txt)
-        if tlen:
-            _stc.SetStyling(len(txt), style)
+def _GetStyle(token, value):
+    """Get the style of a token
+    @param token: pygments token type
+    @param value: token text
+    @return: style id
+
+    """
+    return TOKEN_MAP.get(token, STC_NONMEM_DEFAULT)
 
 TOKEN_MAP = { Token.String : STC_NONMEM_STRING,
               Token.Comment.Multiline : STC_NONMEM_COMMENT,
@@ -194,6 +196,7 @@ class NONMEMLexer(RegexLexer):
     }
 
 lexer = NONMEMLexer()
+LEXER = synlexer.PygmentsLexer(lexer, _GetStyle)
 
 if __name__=='__main__':
     import codecs, sys
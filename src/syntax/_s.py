@@ -20,13 +20,13 @@ __revision__ = "$Revision$"
 #-----------------------------------------------------------------------------#
 # Imports
 from pygments.token import Token
-from pygments.lexers import get_lexer_by_name
 import wx
 import wx.stc as stc
 
 #Local Imports
 import synglob
 import syndata
+import synlexer
 
 #-----------------------------------------------------------------------------#
 # Style Id's
@@ -195,27 +195,18 @@ def StyleText(_stc, start, end):
     @param _stc: Styled text control instance
     @param start: Start position
     @param end: end position
-    @todo: performance improvements
-    @todo: style errors caused by unicode characters (related to internal utf8)
 
     """
-    cpos = 0
-    _stc.StartStyling(cpos, 0x1f)
-    lexer = get_lexer_by_name("s")
-    is_wineol = _stc.GetEOLMode() == stc.STC_EOL_CRLF
-    for token, txt in lexer.get_tokens(_stc.GetTextRange(0, end)):
-        style = TOKEN_MAP.get(token, STC_S_DEFAULT)
+    LEXER.StyleText(_stc, start, end)
 
-        tlen = len(txt)
+def _GetStyle(token, value):
+    """Get the style of a token
+    @param token: pygments token type
+    @param value: token text
+    @return: style id
 
-        # Account for \r\n end of line characters
-        if is_wineol and "\n" in txt:
-            tlen += txt.count("\n")
-
-        if tlen:
-            _stc.SetStyling(tlen, style)
-        cpos += tlen
-        _stc.StartStyling(cpos, 0x1f)
+    """
+    return TOKEN_MAP.get(token, STC_S_DEFAULT)
 
 #-----------------------------------------------------------------------------#
 
@@ -228,4 +219,5 @@ TOKEN_MAP = { Token.Literal.String  : STC_S_STRING,
               Token.Literal.Number  : STC_S_NUMBER,
               Token.Keyword         : STC_S_KEYWORD,
               Token.Keyword.Constant: STC_S_KEYWORD }
-              
\ No newline at end of file
+
+LEXER = synlexer.PygmentsLexer("s", _GetStyle)
@@ -17,7 +17,7 @@ __author__ = "Cody Precord <cprecord@editra.org>"
 __svnid__ = "$Id$"
 __revision__ = "$Revision$"
 
-__all__ = ['SyntaxDataBase',]
+__all__ = ['SyntaxDataBase', 'MakeKeywordList']
 
 #-----------------------------------------------------------------------------#
 # Imports
@@ -38,6 +38,8 @@ class SyntaxDataBase(object):
         self._langid = langid
         self._lexer = stc.STC_LEX_NULL
         self._features = dict()
+        self._keywords = None   # Cached keyword sets
+        self._kwlist = None     # Cached sorted list of keywords
 
     @property
     def CommentPattern(self):
@@ -45,7 +47,15 @@ class SyntaxDataBase(object):
 
     @property
     def Keywords(self):
-        return self.GetKeywords()
+        if self._keywords is None:
+            self._keywords = self.GetKeywords()
+        return self._keywords
+
+    @property
+    def KeywordList(self):
+        if self._kwlist is None:
+            self._kwlist = MakeKeywordList(self.Keywords)
+        return self._kwlist
 
     @property
     def LangId(self):
@@ -139,3 +149,16 @@ class SyntaxDataBase(object):
         self._langid = lid
 
 #-----------------------------------------------------------------------------#
+
+def MakeKeywordList(kw_lst):
+    """Make the sorted list of the unique words in a list of keyword sets
+    @param kw_lst: [ (KWLVL, "KEWORDS"), (KWLVL2, "KEYWORDS2"), ect...]
+    @return: list of strings
+
+    """
+    words = set()
+    for keyw in kw_lst:
+        if len(keyw) == 2 and isinstance(keyw[0], int) and \
+           isinstance(keyw[1], basestring):
+            words.update(keyw[1].split())
+    return sorted(words)
@@ -421,8 +421,18 @@ class ExtensionRegister(dict):
         """
         if not cls.instance:
             cls.instance = dict.__new__(cls, *args, **kargs)
+            cls.instance._extmap = dict() # lowercase extension -> file type
         return cls.instance
 
+    def __delitem__(self, i):
+        """Remove a file type and its associations
+        @param i: file type to remove
+
+        """
+        exts = self.get(i, list())
+        dict.__delitem__(self, i)
+        self._Unindex(i, exts)
+
     def __missing__(self, key):
         """Return the default value if an item is not found
         @return: txt extension for plain text
@@ -441,12 +451,18 @@ class ExtensionRegister(dict):
         """
         if not isinstance(y, list):
             raise TypeError, "Extension Register Expects a List"
-        for key, val in self.iteritems():
-            for item in y:
+        y = [x.strip() for x in y]
+        for item in y:
+            owner = self._extmap.get(item.lower(), None)
+            if owner is not None and owner != i:
+                val = self.get(owner, list())
                 if item in val:
                     val.pop(val.index(item))
+        old = self.get(i, list())
         y.sort()
-        dict.__setitem__(self, i, [x.strip() for x in y])
+        dict.__setitem__(self, i, y)
+        self._Unindex(i, [item for item in old if item not in y])
+        self._Index(i, y)
 
     def __str__(self):
         """Converts the Register to a string that is formatted
@@ -461,6 +477,34 @@ class ExtensionRegister(dict):
             tmp.append("%s=%s" % (key, u':'.join(self.__getitem__(key))))
         return os.linesep.join(tmp)
 
+    def _Index(self, ftype, exts):
+        """Add extensions to the extension to file type index
+        @param ftype: file type description string
+        @param exts: list of extensions
+
+        """
+        for ext in exts:
+            self._extmap[ext.lower()] = ftype
+
+    def _Unindex(self, ftype, exts):
+        """Remove extensions of a file type from the extension to file type
+        index. If another file type is also associated with an extension
+        the extension is indexed to it instead.
+        @param ftype: file type description string
+        @param exts: list of extensions
+
+        """
+        for ext in exts:
+            ext = ext.lower()
+            if self._extmap.get(ext, None) != ftype:
+                continue
+
+            del self._extmap[ext]
+            for key, val in self.iteritems():
+                if ext in [ext2.lower() for ext2 in val]:
+                    self._extmap[ext] = key
+                    break
+
     def Associate(self, ftype, ext):
         """Associate a given file type with the given file extension(s).
         The ext parameter can be a string of space separated extensions
@@ -479,6 +523,7 @@ class ExtensionRegister(dict):
             assoc = list(set(exts))
         assoc.sort()
         super(ExtensionRegister, self).__setitem__(ftype, assoc)
+        self._Index(ftype, exts)
 
     def Disassociate(self, ftype, ext):
         """Disassociate a file type with a given extension or space
@@ -490,10 +535,13 @@ class ExtensionRegister(dict):
         to_drop = ext.strip().split()
         assoc = self.get(ftype, None)
         if assoc:
+            dropped = list()
             for item in to_drop:
                 if item in assoc:
                     assoc.remove(item)
+                    dropped.append(item)
             super(ExtensionRegister, self).__setitem__(ftype, assoc)
+            self._Unindex(ftype, dropped)
         else:
             pass
 
@@ -505,11 +553,7 @@ class ExtensionRegister(dict):
         @param ext: extension to lookup
 
         """
-        ext = ext.lower()
-        for key, val in self.iteritems():
-            if ext in [ext2.lower() for ext2 in val]:
-                return key
-        return LANG_TXT
+        return self._extmap.get(ext.lower(), LANG_TXT)
 
     def GetAllExtensions(self):
         """Returns a sorted list of all extensions registered
@@ -528,6 +572,7 @@ class ExtensionRegister(dict):
 
         """
         self.clear()
+        self._extmap.clear()
         for key in EXT_MAP:
             self.__setitem__(EXT_MAP[key], key.split())
 
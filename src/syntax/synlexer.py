@@ -0,0 +1,430 @@
+###############################################################################
+# Name: synlexer.py                                                           #
+# Purpose: Incremental styling for container lexers                          #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""
+Incremental styling engine for the container lexers (STC_LEX_CONTAINER).
+
+The buffer asks a container lexer to style the text from the end of the
+styled text up to a position. Instead of lexing the document from the start
+each time, a L{ContainerLexer} saves the state of the lexer at the start of
+each line in the buffer's line states. It then restarts lexing from a line
+with a known state a little before the end of the styled text. When
+the lexer reaches an unmodified line whose saved state is the same as the new
+state, the rest of the requested text is already styled and lexing stops.
+
+L{PygmentsLexer} drives pygments lexers with this engine. It keeps the lexer
+instance and tracks the state stacks of RegexLexers and of DelegatingLexers
+built from two RegexLexers (i.e html+django). Other pygments lexers have no
+states, so they are always lexed from the start of the document.
+
+@summary: Incremental container lexer engine
+
+"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+__all__ = ['ContainerLexer', 'PygmentsLexer']
+
+#-----------------------------------------------------------------------------#
+# Imports
+import weakref
+import wx.stc as stc
+from pygments.lexer import RegexLexer, ExtendedRegexLexer, \
+                           DelegatingLexer, do_insertions
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Text, Error, _TokenType
+
+#-----------------------------------------------------------------------------#
+# Globals
+BACKTRACK_LINES = 32    # Lines before a change to restart lexing from
+LOOKAHEAD_SIZE = 16384  # Text after the styled range given to the lexer
+
+#-----------------------------------------------------------------------------#
+
+class _BufferInfo(object):
+    """Tracks which lines of a buffer have trusted line states"""
+    def __init__(self):
+        super(_BufferInfo, self).__init__()
+
+        # Attributes
+        self.lexer = None   # ContainerLexer that set the line states
+        self.known = 0      # Lines before this one are styled and have states
+        self.dirty = -1     # Last line modified since it was styled
+
+    def Reset(self, lexer):
+        """Forget the line states
+        @param lexer: ContainerLexer that is styling the buffer
+
+        """
+        self.lexer = lexer
+        self.known = 0
+        self.dirty = -1
+
+    def OnModified(self, evt):
+        """Track the lines that have been modified
+        @param evt: wx.stc.StyledTextEvent
+
+        """
+        evt.Skip()
+        if evt.GetModificationType() & \
+           (stc.STC_MOD_INSERTTEXT | stc.STC_MOD_DELETETEXT):
+            buff = evt.GetEventObject()
+            added = evt.GetLinesAdded()
+            line = buff.LineFromPosition(evt.GetPosition())
+            if self.dirty >= line:
+                self.dirty = max(line, self.dirty + added)
+            self.dirty = max(self.dirty, line + max(added, 0))
+            if self.known > line:
+                self.known = max(line, self.known + added)
+
+_BUFFERS = weakref.WeakKeyDictionary()
+
+def _GetBufferInfo(buff):
+    """Get the line state information of a buffer
+    @param buff: EditraStc
+    @return: _BufferInfo
+
+    """
+    info = _BUFFERS.get(buff, None)
+    if info is None:
+        info = _BufferInfo()
+        buff.Bind(stc.EVT_STC_MODIFIED, info.OnModified)
+        _BUFFERS[buff] = info
+    return info
+
+#-----------------------------------------------------------------------------#
+
+class ContainerLexer(object):
+    """Base class for incremental container lexers. Subclasses implement
+    L{Tokenize} to split text into styled runs starting from a lexer state.
+
+    """
+    def __init__(self, mask=0x1f):
+        """Create the lexer
+        @keyword mask: style bits that are set by the lexer
+
+        """
+        super(ContainerLexer, self).__init__()
+
+        # Attributes
+        self._mask = mask
+        self._states = list()   # line state - 1 -> lexer state
+        self._ids = dict()      # lexer state -> line state
+
+    def _GetLineState(self, state):
+        """Get the line state value to save a lexer state as
+        @param state: hashable lexer state or None
+        @return: int (0 if the state is not known)
+
+        """
+        if state is None:
+            return 0
+        val = self._ids.get(state, None)
+        if val is None:
+            self._states.append(state)
+            val = len(self._states)
+            self._ids[state] = val
+        return val
+
+    def Tokenize(self, text, state):
+        """Split text into styled runs
+        @param text: text to lex, it starts at the start of a line
+        @param state: lexer state at the start of the text or None for the
+                      start of the document
+        @return: iterator of (pos, value, style, state) tuples. pos is the
+                 index of the run in the text and state is the lexer state
+                 after the run or None if it is not known.
+
+        """
+        raise NotImplementedError
+
+    def StyleText(self, buff, start, end):
+        """Style the text of the buffer
+        @param buff: EditraStc
+        @param start: position that styling is needed from
+        @param end: position that styling is needed to
+
+        """
+        info = _GetBufferInfo(buff)
+        if info.lexer is not self or start == 0:
+            info.Reset(self)
+
+        # Find the nearest line with a known lexer state. The lexers can look
+        # ahead past the end of a line, so a change can alter the tokens of
+        # the lines just before it, start lexing a few lines further back.
+        line = buff.LineFromPosition(start) - BACKTRACK_LINES
+        line = max(0, min(line, info.known))
+        state = None
+        while line > 0:
+            val = buff.GetLineState(line)
+            if 0 < val <= len(self._states):
+                state = self._states[val - 1]
+                break
+            line -= 1
+
+        eline = buff.LineFromPosition(end)
+        if eline + 1 < buff.GetLineCount():
+            tend = buff.PositionFromLine(eline + 1)
+        else:
+            tend = buff.GetLength()
+
+        # The lexer is given some of the text after the range so that the
+        # tokens at the end of the range are the same as when lexing all of
+        # the text, unless a token is longer than the look ahead.
+        spos = buff.PositionFromLine(line)
+        text = buff.GetTextRange(spos, _GetTextEnd(buff, tend))
+
+        buff.StartStyling(spos, self._mask)
+        bpos = spos     # Buffer position (bytes)
+        for value, style, nstate in _Runs(text, self.Tokenize(text, state)):
+            if bpos >= tend:
+                break
+
+            if isinstance(value, unicode):
+                blen = len(value.encode('utf-8'))
+            else:
+                blen = len(value)
+            buff.SetStyling(blen, style)
+            bpos += blen
+
+            if u'\n' not in value and u'\r' not in value:
+                continue
+
+            # Save the state at the start of the next line, the lines that
+            # start inside of the run have no known state.
+            nline = buff.LineFromPosition(bpos)
+            if buff.PositionFromLine(nline) == bpos:
+                unknown = xrange(line + 1, nline)
+                val = self._GetLineState(nstate)
+            else:
+                unknown = xrange(line + 1, nline + 1)
+                val = None
+            for uline in unknown:
+                if buff.GetLineState(uline) != 0:
+                    buff.SetLineState(uline, 0)
+            line = nline
+
+            if val is not None:
+                old = buff.GetLineState(line)
+                if old != val:
+                    buff.SetLineState(line, val)
+                elif val and info.dirty < line < info.known and \
+                     eline < info.known:
+                    # Converged with the unmodified text after the change
+                    buff.StartStyling(tend, self._mask)
+                    bpos = tend
+                    break
+
+        info.known = max(info.known, line)
+        if info.dirty <= eline:
+            info.dirty = -1
+
+def _GetTextEnd(buff, pos):
+    """Get the end of the text to lex for styling up to a position
+    @param buff: EditraStc
+    @param pos: position styling is needed to
+    @return: int (position at a line start or the end of the buffer)
+
+    """
+    length = buff.GetLength()
+    if pos + LOOKAHEAD_SIZE >= length:
+        return length
+
+    line = buff.LineFromPosition(pos + LOOKAHEAD_SIZE)
+    if line + 1 < buff.GetLineCount():
+        return buff.PositionFromLine(line + 1)
+    return length
+
+def _Runs(text, tokens):
+    """Make the runs from L{ContainerLexer.Tokenize} cover the text without
+    gaps or overlaps, gaps between runs get the default style.
+    @param text: the text that was tokenized
+    @param tokens: iterator of (pos, value, style, state) tuples
+    @return: iterator of (value, style, state) tuples
+
+    """
+    cpos = 0
+    for pos, value, style, nstate in tokens:
+        if pos > cpos:
+            yield text[cpos:pos], 0, None
+        elif pos < cpos:
+            value = value[cpos - pos:]
+        if value:
+            yield value, style, nstate
+        cpos = max(cpos, pos + len(value))
+
+#-----------------------------------------------------------------------------#
+
+class PygmentsLexer(ContainerLexer):
+    """Incremental container lexer for a pygments lexer"""
+    def __init__(self, lexer, stylefunc, mask=0x1f):
+        """Create the lexer
+        @param lexer: pygments lexer alias or lexer instance
+        @param stylefunc: callable(token, value) returning the style id to
+                          use for the token
+        @keyword mask: style bits that are set by the lexer
+
+        """
+        super(PygmentsLexer, self).__init__(mask)
+
+        # Attributes
+        self._lexer = lexer
+        self._style = stylefunc
+
+    def GetLexer(self):
+        """Get the pygments lexer, created on first use
+        @return: pygments.lexer.Lexer
+
+        """
+        if isinstance(self._lexer, basestring):
+            self._lexer = get_lexer_by_name(self._lexer)
+        return self._lexer
+
+    def Tokenize(self, text, state):
+        """Split text into styled runs
+        @see: L{ContainerLexer.Tokenize}
+
+        """
+        lexer = self.GetLexer()
+        if _IsRegexLexer(lexer):
+            tokens = _LexRegex(lexer, text, state or ('root',))
+        elif isinstance(lexer, DelegatingLexer) and \
+             _IsRegexLexer(lexer.root_lexer) and \
+             _IsRegexLexer(lexer.language_lexer):
+            tokens = _LexDelegating(lexer, text, state)
+        else:
+            tokens = ((pos, token, value, None) for pos, token, value \
+                      in lexer.get_tokens_unprocessed(text))
+
+        stylefunc = self._style
+        for pos, token, value, nstate in tokens:
+            yield pos, value, stylefunc(token, value), nstate
+
+#-----------------------------------------------------------------------------#
+
+def _IsRegexLexer(lexer):
+    """Can the states of the lexer be tracked by L{_LexRegex}
+    @param lexer: pygments.lexer.Lexer
+    @return: bool
+
+    """
+    return isinstance(lexer, RegexLexer) and \
+           not isinstance(lexer, ExtendedRegexLexer)
+
+def _LexRegex(lexer, text, stack):
+    """Lex text with a RegexLexer the same way that its
+    get_tokens_unprocessed method does, but also give the state stack
+    after each token.
+    @param lexer: pygments.lexer.RegexLexer
+    @param text: text to lex
+    @param stack: state stack at the start of the text
+    @return: iterator of (pos, token, value, stack) tuples, stack is None
+             when a match is split into multiple tokens by a callback.
+
+    """
+    pos = 0
+    tokendefs = lexer._tokens
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    while True:
+        for rexmatch, action, new_state in statetokens:
+            m = rexmatch(text, pos)
+            if m:
+                if type(action) is _TokenType:
+                    items = [(pos, action, m.group())]
+                else:
+                    items = list(action(lexer, m))
+                pos = m.end()
+                if new_state is not None:
+                    # state transition
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == '#pop':
+                                statestack.pop()
+                            elif state == '#push':
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        # pop
+                        del statestack[new_state:]
+                    elif new_state == '#push':
+                        statestack.append(statestack[-1])
+                    else:
+                        assert False, "wrong state def: %r" % new_state
+                    statetokens = tokendefs[statestack[-1]]
+
+                last = len(items) - 1
+                for idx, (ipos, token, value) in enumerate(items):
+                    if idx == last and ipos + len(value) == pos:
+                        yield ipos, token, value, tuple(statestack)
+                    else:
+                        yield ipos, token, value, None
+                break
+        else:
+            if pos >= len(text):
+                break
+            if text[pos] == u'\n':
+                # at EOL, reset state to "root"
+                statestack = ['root']
+                statetokens = tokendefs['root']
+                yield pos, Text, u'\n', ('root',)
+            else:
+                yield pos, Error, text[pos], tuple(statestack)
+            pos += 1
+
+def _LexDelegating(lexer, text, state):
+    """Lex text with a DelegatingLexer made of two RegexLexers the same way
+    that its get_tokens_unprocessed method does. The state of the lexer is
+    known at the line starts where both lexers are at the boundary of a
+    token.
+    @param lexer: pygments.lexer.DelegatingLexer
+    @param text: text to lex
+    @param state: tuple (language stack, root stack) or None
+    @return: iterator of (pos, token, value, state) tuples
+
+    """
+    if state is None:
+        state = (('root',), ('root',))
+    lstack, rstack = state
+
+    # Lex with the language lexer, collecting the text for the root lexer
+    buffered = list()
+    blen = 0
+    insertions = list()
+    lng_buffer = list()
+    marks = dict()      # buffered position -> (text position, language stack)
+    for pos, token, value, lstate in _LexRegex(lexer.language_lexer,
+                                               text, lstack):
+        if token is lexer.needle:
+            if lng_buffer:
+                insertions.append((blen, lng_buffer))
+                lng_buffer = list()
+            buffered.append(value)
+            blen += len(value)
+            if lstate is not None and value.endswith(u'\n'):
+                marks[blen] = (pos + len(value), lstate)
+        else:
+            lng_buffer.append((pos, token, value))
+    if lng_buffer:
+        insertions.append((blen, lng_buffer))
+
+    states = dict()     # text position -> state
+    def RootTokens():
+        """Lex the collected text with the root lexer"""
+        for pos, token, value, rstate in _LexRegex(lexer.root_lexer,
+                                                   u"".join(buffered), rstack):
+            mark = marks.get(pos + len(value), None)
+            if mark is not None and rstate is not None:
+                states[mark[0]] = (mark[1], rstate)
+            yield pos, token, value
+
+    for pos, token, value in do_insertions(insertions, RootTokens()):
+        yield pos, token, value, states.get(pos + len(value), None)
@@ -82,6 +82,7 @@ class SyntaxMgr(object):
             self._extreg = ExtensionRegister()
             self._config = config
             self._loaded = dict()
+            self._syntax = dict()       # Shared SyntaxData by language id
 
             # Syntax mode extensions
             self._extensions = dict()   # loaded extensions "py" : PythonMode()
@@ -194,6 +195,9 @@ class SyntaxMgr(object):
             self._extreg.Remove(lang)
 
         lex_cfg = synglob.LANG_MAP.get(lang, synglob.LANG_MAP[synglob.LANG_TXT])
+        syn_data = self._syntax.get(lex_cfg[LANG_ID], None)
+        if syn_data is not None:
+            return syn_data
 
         # Check if module is loaded and load if necessary
         if not self.LoadModule(lex_cfg[MODULE]):
@@ -205,6 +209,7 @@ class SyntaxMgr(object):
         # spec set(s) from the specified module
         mod = self._loaded[lex_cfg[MODULE]]
         syn_data = mod.SyntaxData(lex_cfg[LANG_ID])
+        self._syntax[lex_cfg[LANG_ID]] = syn_data
         return syn_data
 
     def LoadExtensions(self, path):
@@ -0,0 +1,116 @@
+###############################################################################
+# Name: benchEdFile.py                                                        #
+# Purpose: Benchmark ed_txt.EdFile reading                                    #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Benchmarks for reading and decoding files with EdFile"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+import glob
+from StringIO import StringIO
+
+# Local modules
+import benchcommon
+
+# Module to benchmark
+import ed_txt
+
+#-----------------------------------------------------------------------------#
+
+MB = 1024 * 1024
+
+def LegacyRead(path, chunk=512):
+    """Read and decode a file the way EdFile.Read used to, with chunked reads
+    into a buffer and a reopen of the file for each guessed encoding.
+    @param path: file path
+    @return: unicode
+
+    """
+    handle = open(path, 'rb')
+    lines = [ handle.readline() for x in range(2) ]
+    handle.seek(0)
+    enc = ed_txt.CheckBom(lines[0]) or ed_txt.CheckMagicComment(lines)
+    if enc is None:
+        for enc in ed_txt.GetEncodings():
+            try:
+                reader = ed_txt.codecs.getreader(enc)(open(path, 'rb'))
+                try:
+                    if '\0' not in reader.read(4096):
+                        break
+                finally:
+                    reader.close()
+            except Exception:
+                continue
+    buff = StringIO()
+    tmp = handle.read(chunk)
+    while len(tmp):
+        buff.write(tmp)
+        tmp = handle.read(chunk)
+    handle.close()
+    return buff.getvalue().decode(enc, 'replace')
+
+def Read(path):
+    """Read a file with EdFile
+    @param path: file path
+    @return: unicode
+
+    """
+    return ed_txt.EdFile(path).Read()
+
+def BenchDataFiles():
+    """Time reading the sample files in the unittest data directory"""
+    rows = list()
+    for path in sorted(glob.glob(os.path.abspath("../unittests/data/*.txt"))):
+        def ReadMany():
+            for x in range(200):
+                Read(path)
+        rows.append(("%s (x200)" % os.path.basename(path),
+                     benchcommon.TimeIt(ReadMany), None))
+    benchcommon.Report("Unittest data files", rows)
+
+def BenchLargeFiles(sizes=(1, 10, 100)):
+    """Time reading generated files of the given sizes in each encoding
+    @keyword sizes: file sizes in MB
+
+    """
+    root = benchcommon.MakeTempDir()
+    try:
+        block = benchcommon.MakeText(MB)
+        for size in sizes:
+            rows = list()
+            text = block * size
+            for enc, header in (('utf-8', u""),
+                                ('utf-16', u""),
+                                ('latin-1', u"# -*- coding: latin-1 -*-\n")):
+                path = os.path.join(root, u"file_%s.txt" % enc)
+                handle = open(path, 'wb')
+                handle.write((header + text).encode(enc))
+                handle.close()
+
+                base = benchcommon.TimeIt(LegacyRead, path, repeat=1)
+                rows.append((enc, benchcommon.TimeIt(Read, path, repeat=1),
+                             base))
+                os.remove(path)
+            benchcommon.Report("Generated %d MB files (vs legacy read)" % size,
+                               rows)
+    finally:
+        benchcommon.RemoveTempDir(root)
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    BenchDataFiles()
+    if len(sys.argv) > 1:
+        BenchLargeFiles([int(arg) for arg in sys.argv[1:]])
+    else:
+        BenchLargeFiles()
@@ -0,0 +1,129 @@
+###############################################################################
+# Name: benchSearchEngine.py                                                  #
+# Purpose: Benchmark ebmlib.SearchEngine                                      #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Benchmarks for Editra's text SearchEngine"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+
+# Local modules
+import benchcommon
+
+# Module to benchmark
+import ebmlib
+
+#-----------------------------------------------------------------------------#
+
+def Consume(gen):
+    """Exhaust the given generator"""
+    for _ in gen:
+        pass
+
+def BenchFindInFiles(nfiles=2000):
+    """Compare serial and parallel find in files on a synthetic tree"""
+    root = benchcommon.MakeTempDir()
+    try:
+        benchcommon.MakeTree(root, nfiles)
+
+        def Search(workers=0, processes=False, ordered=True):
+            engine = ebmlib.SearchEngine(u"omega\\s+psi", regex=True)
+            engine.SetWorkerCount(workers, processes)
+            engine.SetOrderedResults(ordered)
+            Consume(engine.SearchInDirectory(root))
+
+        base = benchcommon.TimeIt(Search)
+        rows = [("serial", base, None)]
+        for workers in (2, 4, 8):
+            secs = benchcommon.TimeIt(Search, workers)
+            rows.append(("%d threads (file order)" % workers, secs, base))
+            secs = benchcommon.TimeIt(Search, workers, ordered=False)
+            rows.append(("%d threads (arrival order)" % workers, secs, base))
+            secs = benchcommon.TimeIt(Search, workers, True)
+            rows.append(("%d processes (file order)" % workers, secs, base))
+        benchcommon.Report("Find in files: %d files" % nfiles, rows)
+    finally:
+        benchcommon.RemoveTempDir(root)
+
+def BenchFindNextPrev():
+    """Time FindNext/FindPrev stepping through pools of increasing size
+    against the previous slicing implementation.
+
+    """
+    for size in (1024, 1024 * 100, 1024 * 1024, 1024 * 1024 * 10,
+                 1024 * 1024 * 100):
+        pool = benchcommon.MakeText(size)
+        engine = ebmlib.SearchEngine(u"omega psi", regex=False)
+        engine.SetSearchPool(pool)
+        regex = engine.GetQueryObject()
+        spos = len(pool) // 2
+        repeat = 50
+
+        def SliceNext():
+            for _ in range(repeat):
+                regex.search(pool[spos:])
+
+        def SlicePrev():
+            for _ in range(repeat):
+                matches = [m for m in regex.finditer(pool[:spos])]
+
+        def FindNext():
+            for _ in range(repeat):
+                engine.FindNext(spos)
+
+        def FindPrev():
+            for _ in range(repeat):
+                engine.FindPrev(spos)
+
+        base = benchcommon.TimeIt(SliceNext)
+        rows = [("next (slice)", base, None),
+                ("next (pos/endpos)", benchcommon.TimeIt(FindNext), base)]
+        base = benchcommon.TimeIt(SlicePrev, repeat=1)
+        rows.extend([("prev (slice + finditer)", base, None),
+                     ("prev (chunked backwards)",
+                      benchcommon.TimeIt(FindPrev), base)])
+        benchcommon.Report("Find next/prev x%d: %d byte pool" % (repeat, size),
+                           rows)
+
+def BenchLargeFileGrep(nbytes=1024 * 1024 * 64):
+    """Compare line by line and memory mapped searches of a large file"""
+    root = benchcommon.MakeTempDir()
+    try:
+        path = os.path.join(root, u"large.log")
+        benchcommon.MakeFile(path, nbytes)
+        for query, isregex in ((u"omega psi", False),
+                               (u"zeta\\s+\\w+a\\b", True),
+                               (u"not in the file", False)):
+            def Search(mapsize):
+                engine = ebmlib.SearchEngine(query, isregex)
+                engine.SetMapThreshold(mapsize)
+                Consume(engine.SearchInFile(path))
+
+            base = benchcommon.TimeIt(Search, 0, repeat=1)
+            rows = [("line by line", base, None),
+                    ("memory mapped", benchcommon.TimeIt(Search, 1, repeat=1),
+                     base)]
+            benchcommon.Report("Grep %d byte file for %r" % (nbytes, query),
+                               rows)
+    finally:
+        benchcommon.RemoveTempDir(root)
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    BenchFindNextPrev()
+    BenchLargeFileGrep()
+    if len(sys.argv) > 1:
+        BenchFindInFiles(int(sys.argv[1]))
+    else:
+        BenchFindInFiles()
@@ -0,0 +1,77 @@
+###############################################################################
+# Name: benchTrigramIndex.py                                                  #
+# Purpose: Benchmark ebmlib.TrigramIndex                                      #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Benchmarks for the find in files trigram index"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+
+# Local modules
+import benchcommon
+
+# Module to benchmark
+import ebmlib
+
+#-----------------------------------------------------------------------------#
+
+def Consume(gen):
+    """Exhaust the given generator"""
+    for _ in gen:
+        pass
+
+def BenchTrigramIndex(nfiles=5000):
+    """Time building, loading, refreshing and querying an index"""
+    root = benchcommon.MakeTempDir()
+    try:
+        benchcommon.MakeTree(root, nfiles)
+        handle = open(os.path.join(root, u"needle.txt"), 'wb')
+        handle.write("the Zyzzyva was here\n")
+        handle.close()
+        cache = os.path.join(root, u".cache", u"index.idx")
+
+        index = ebmlib.TrigramIndex(root, cache)
+        build = benchcommon.TimeIt(lambda: (index.Clear(), index.Refresh()),
+                                   repeat=1)
+        save = benchcommon.TimeIt(index.Save, repeat=1)
+        index = ebmlib.TrigramIndex(root, cache)
+        load = benchcommon.TimeIt(index.Load)
+        refresh = benchcommon.TimeIt(index.Refresh)
+        benchcommon.Report("Index maintenance: %d files (%d bytes on disk)" % \
+                           (nfiles, os.path.getsize(cache)),
+                           [("build", build, None), ("save", save, None),
+                            ("load", load, None),
+                            ("refresh (no changes)", refresh, None)])
+
+        for query, isregex in ((u"zyzzyva", False), (u"Zyz+yva\\s", True),
+                               (u"omega psi", False), (u"o", False)):
+            def Search(useindex):
+                engine = ebmlib.SearchEngine(query, isregex, matchcase=False)
+                if useindex:
+                    engine.SetSearchIndex(index)
+                Consume(engine.SearchInDirectory(root))
+
+            base = benchcommon.TimeIt(Search, False)
+            rows = [("full search", base, None),
+                    ("indexed search", benchcommon.TimeIt(Search, True), base)]
+            benchcommon.Report("Query %r" % query, rows)
+    finally:
+        benchcommon.RemoveTempDir(root)
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        BenchTrigramIndex(int(sys.argv[1]))
+    else:
+        BenchTrigramIndex()
@@ -0,0 +1,127 @@
+###############################################################################
+# Name: benchcommon.py                                                        #
+# Purpose: Common utilities for the benchmark scripts.                        #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Common utilities for the benchmark scripts"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+# Put Editra/src on the path
+sys.path.append(os.path.abspath("../../src"))
+sys.path.append(os.path.abspath("../../src/extern"))
+
+#-----------------------------------------------------------------------------#
+
+WORDS = ("alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta",
+         "iota", "kappa", "lambda", "mu", "nu", "xi", "omicron", "pi", "rho",
+         "sigma", "tau", "upsilon", "phi", "chi", "psi", "omega", "def",
+         "class", "import", "return", "self", "print")
+
+#-----------------------------------------------------------------------------#
+
+def MakeTempDir():
+    """Create a new temporary directory for the benchmark data
+    @return: path
+
+    """
+    return tempfile.mkdtemp(prefix="edbench")
+
+def RemoveTempDir(path):
+    """Remove a temporary directory created by L{MakeTempDir}"""
+    shutil.rmtree(path, True)
+
+def MakeText(nbytes, seed=0):
+    """Generate lines of random words of approximately nbytes in size
+    @param nbytes: int
+    @keyword seed: random seed so that runs are repeatable
+    @return: string
+
+    """
+    rand = random.Random(seed)
+    lines = list()
+    size = 0
+    while size < nbytes:
+        line = u" ".join(rand.choice(WORDS)
+                         for _ in range(rand.randint(4, 12))) + u"\n"
+        lines.append(line)
+        size += len(line)
+    return u"".join(lines)
+
+def MakeTree(root, nfiles, nbytes=4096, width=10):
+    """Generate a synthetic source tree of text files
+    @param root: directory to create the tree in
+    @param nfiles: total number of files to create
+    @keyword nbytes: approximate size of each file
+    @keyword width: number of files per directory
+    @return: list of created file paths
+
+    """
+    paths = list()
+    for idx in range(nfiles):
+        dname = os.path.join(root, *[u"d%d" % (idx // (width ** level) % width)
+                                     for level in (2, 1)])
+        if not os.path.exists(dname):
+            os.makedirs(dname)
+        fname = os.path.join(dname, u"file%d.py" % idx)
+        handle = open(fname, 'wb')
+        handle.write(MakeText(nbytes, idx).encode('utf-8'))
+        handle.close()
+        paths.append(fname)
+    return paths
+
+def MakeFile(path, nbytes, encoding='utf-8'):
+    """Generate a single text file of about nbytes in size
+    @param path: file path
+    @param nbytes: int
+    @keyword encoding: encoding to write the file in
+
+    """
+    handle = open(path, 'wb')
+    handle.write(MakeText(nbytes).encode(encoding))
+    handle.close()
+
+def TimeIt(funct, *args, **kwargs):
+    """Time the best of a few calls to the given callable
+    @param funct: callable
+    @return: float (seconds)
+
+    """
+    repeat = kwargs.pop('repeat', 3)
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        funct(*args, **kwargs)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def Report(title, rows):
+    """Print a report table
+    @param title: string
+    @param rows: list of (label, seconds, baseline seconds or None)
+
+    """
+    print title
+    print "-" * 60
+    for label, secs, base in rows:
+        line = "%-36s %10.4fs" % (label, secs)
+        if base:
+            line += "   x%.2f" % (base / max(secs, 1e-9))
+        print line
+    print
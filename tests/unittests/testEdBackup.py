@@ -0,0 +1,89 @@
+###############################################################################
+# Name: testEdBackup.py                                                       #
+# Purpose: Unit tests for ed_backup                                           #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittest cases for testing the automatic backup service"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import time
+import unittest
+
+# Local imports
+import common
+
+# Module to test
+import ed_txt
+import ed_backup
+
+#-----------------------------------------------------------------------------#
+
+class TestBuffer(object):
+    """Minimal buffer with the methods used by the backup service"""
+    def __init__(self, path, text):
+        super(TestBuffer, self).__init__()
+        self.File = ed_txt.EdFile(path)
+        self._text = text
+
+    def GetFileName(self):
+        return self.File.GetPath()
+
+    def GetId(self):
+        return -1
+
+    def GetModify(self):
+        return True
+
+    def GetText(self):
+        return self._text
+
+    def GetTopLevelParent(self):
+        return None
+
+    def IsLoading(self):
+        return False
+
+#-----------------------------------------------------------------------------#
+# Test Class
+
+class EdBackupServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.path = common.MakeTempFile("backup.txt")
+        self.buff = TestBuffer(self.path, u"modified text")
+        self.service = ed_backup.EdBackupService()
+        self.service.AddBuffer(self.buff)
+
+    def tearDown(self):
+        self.service.RemoveBuffer(self.buff)
+        self.service._busy = False
+        common.CleanTempDir()
+
+    #---- Tests ----#
+
+    def testBackup(self):
+        """Test backing up a modified buffer"""
+        self.service.Backup()
+        bkup = self.service._GetBackupMgr().GetBackupFilename(self.path)
+        for x in range(50):
+            if os.path.exists(bkup) and os.path.getsize(bkup):
+                break
+            time.sleep(.1)
+        self.assertTrue(os.path.exists(bkup), "Backup was not written")
+        handle = open(bkup, 'rb')
+        txt = handle.read()
+        handle.close()
+        self.assertTrue(txt.endswith("modified text"))
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,6 +16,8 @@ __revision__ = "$Revision:  $"
 # Imports
 import os
 import unittest
+import wx
+import wx.stc
 import common
 
 # Module to test
@@ -68,3 +70,17 @@ class EdBaseStcTest(unittest.TestCase):
         path = common.GetDataFilePath("syntax.xml")
         self.assertTrue(self.stc.LoadFile(path))
         self.assertFalse(self.stc.GetReadOnly()) # should be good text
+
+    def testRestyleDocument(self):
+        """Test that only the start of a large document is styled right away"""
+        self.stc.SetText(u"# comment\nx = 1\n" * 50000)
+        self.stc.FindLexer(u'py')
+        end = self.stc.GetEndStyled()
+        self.assertTrue(0 < end < self.stc.GetLength())
+        self.assertEquals(self.stc.GetStyleAt(0), wx.stc.STC_P_COMMENTLINE)
+
+        # The rest of the document is styled when idle
+        while self.stc.GetEndStyled() < self.stc.GetLength():
+            self.stc.ProcessEvent(wx.IdleEvent())
+            self.assertTrue(self.stc.GetEndStyled() > end)
+            end = self.stc.GetEndStyled()
@@ -132,6 +132,21 @@ class EdFileTest(unittest.TestCase):
         new_bytes = common.GetFileContents(out)
         self.assertEquals(raw_bytes, new_bytes)
 
+    def testWriteEncodingFallback(self):
+        """Test writing text that the files encoding cannot encode"""
+        txt = u"caf\xe9 \u4e2d\n" * 10
+        out = common.GetTempFilePath('fallback_output.txt')
+        fobj = ed_txt.EdFile(out)
+        fobj.SetEncoding('ascii')
+        fobj.Write(txt)
+        self.assertNotEquals(fobj.Encoding, 'ascii')
+        self.assertEquals(common.GetFileContents(out).decode(fobj.Encoding),
+                          txt)
+
+        # Temporary file was moved over the output
+        self.assertEquals(os.listdir(common.GetTempDir()),
+                          ['fallback_output.txt'])
+
     def testReadUTF32Bom(self):
         """Test reading a file that has a UTF32 BOM"""
         fname = common.GetDataFilePath('test_read_utf32_bom.txt')
@@ -214,3 +229,56 @@ class EdFileTest(unittest.TestCase):
         uni = ed_txt.DecodeString(test, 'utf-8')
         self.assertTrue(isinstance(uni, types.UnicodeType), "Failed decode")
 
+
+    def testGetFirstLines(self):
+        """Test getting the first lines of a byte string"""
+        lines = ed_txt.GetFirstLines("one\ntwo\r\nthree\n", 2)
+        self.assertEquals(lines, ["one\n", "two\r\n"])
+        self.assertEquals(ed_txt.GetFirstLines("one", 2), ["one", ""])
+
+    def testGuessEncodingBytes(self):
+        """Test guessing the encoding of an in memory sample"""
+        sample = common.GetFileContents(self.path_utf16)
+        self.assertEquals(ed_txt.GuessEncodingBytes(sample),
+                          ed_txt.GuessEncoding(self.path_utf16, 4096))
+        # Incomplete character at the end of the sample
+        sample = u"\xe9t\xe9".encode('utf-8')[:-1]
+        self.assertTrue(ed_txt.GuessEncodingBytes(sample) is not None)
+
+    def testEncodeChunks(self):
+        """Test encoding text in chunks"""
+        txt = u"caf\xe9 " * 10
+        chunks = ed_txt.EncodeChunks(txt, 'utf-16', 7)
+        self.assertEquals("".join(chunks), txt.encode('utf-16'))
+        self.assertRaises(UnicodeEncodeError, ed_txt.EncodeChunks, txt, 'ascii')
+
+    def testGetEncodings(self):
+        """Test that the cached encoding list can't be changed by callers"""
+        encs = ed_txt.GetEncodings()
+        self.assertTrue(len(encs))
+        encs.insert(0, 'foo')
+        self.assertNotEquals(ed_txt.GetEncodings()[0], 'foo')
+
+    def testDetectEncodingCache(self):
+        """Test that detected encodings are cached until the file changes"""
+        path = common.MakeTempFile(u'enc_cache.txt')
+        with open(path, 'wb') as handle:
+            handle.write(u"caf\xe9\n".encode('utf-16'))
+        self.assertTrue(ed_txt._ENC_CACHE.Get(ed_txt._GetEncodingKey(path)) is None)
+        ed_txt.EdFile(path).Read()
+        cached = ed_txt._ENC_CACHE.Get(ed_txt._GetEncodingKey(path))
+        self.assertEquals(cached[0], 'utf-16')
+
+        # Cached result is used by new file objects
+        fileobj = ed_txt.EdFile(path)
+        self.assertEquals(fileobj.Read(), u"caf\xe9\n")
+        self.assertEquals(fileobj.GetEncoding(), 'utf-16')
+        self.assertTrue(fileobj.HasBom())
+
+        # Changed file is checked again
+        with open(path, 'wb') as handle:
+            handle.write("# -*- coding: latin-1 -*-\ncaf\xe9\n")
+        fileobj = ed_txt.EdFile(path)
+        fileobj.Read()
+        self.assertEquals(fileobj.GetEncoding(), 'latin-1')
+        self.assertFalse(fileobj.HasBom())
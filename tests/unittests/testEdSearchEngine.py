@@ -15,9 +15,14 @@ __revision__ = "$Revision:  $"
 
 #-----------------------------------------------------------------------------#
 # Imports
+import os
 import unittest
 import unicodedata
 
+# Local imports
+import common
+import ed_glob
+
 # Module to test
 import ed_search
 
@@ -93,7 +98,7 @@ class EdSearchEngineTest(unittest.TestCase):
         # Find Next
         t2 = self._def_eng.Find(t1[1])
         self.assertTrue(t2 is not None, "Find next failed")
-        self.assertEquals(t2[0] + t1[1], 32, "Find next: %d != 32" % t2[0])
+        self.assertEquals(t2[0], 32, "Find next: %d != 32" % t2[0])
 
         # Test not found
         self._def_eng.SetQuery('gyoza')
@@ -161,7 +166,7 @@ class EdSearchEngineTest(unittest.TestCase):
         # Find Next
         t2 = self._mc_eng.Find(t1[1])
         self.assertTrue(t2 is not None, "Find next failed")
-        self.assertEquals(t2[0] + t1[1], 48, "Find next: %d != 48" % t2[0])
+        self.assertEquals(t2[0], 48, "Find next: %d != 48" % t2[0])
 
         # Test not found
         self._mc_eng.SetQuery('TeSt')
@@ -189,7 +194,7 @@ class EdSearchEngineTest(unittest.TestCase):
         # Find Next
         t2 = self._regex_eng.Find(t1[1])
         self.assertTrue(t2 is not None, "Find next failed")
-        self.assertEquals(t2[0] + t1[1], 6, "Find next: %d != 6" % t2[0])
+        self.assertEquals(t2[0], 6, "Find next: %d != 6" % t2[0])
 
         # Test not found
         self._regex_eng.SetQuery('test{10,10}')
@@ -217,6 +222,28 @@ class EdSearchEngineTest(unittest.TestCase):
         val = search.Find()
         self.assertTrue(val is not None)
 
+    def testReplaceEditsDecomposed(self):
+        """Test that replace edits line up with text that isn't normalized"""
+        text = u"e\u0301t\u00e9 foo"
+        self._def_eng.SetSearchPool(text)
+        self._def_eng.SetQuery(u"foo")
+        ctrl = ed_search.SearchController
+        matches = ctrl._GetTextMatches(self._def_eng.FindAll(), text)
+        edits = ctrl._GetReplaceEdits(matches, u"bar", False,
+                                      len(text.encode('utf-8')))
+        start = len(u"e\u0301t\u00e9 ".encode('utf-8'))
+        self.assertEquals(edits, [(start, start + 3, u"bar")])
+
+    #---- Module Function Tests ----#
+
+    def testGetSearchIndex(self):
+        """Test getting the shared search index for a new search root"""
+        ed_glob.CONFIG['CACHE_DIR'] = common.GetTempDir()
+        root = os.path.join(common.GetTempDir(), u"searchroot")
+        index = ed_search.GetSearchIndex(root)
+        self.assertEquals(index.Root, os.path.normpath(root))
+        self.assertTrue(ed_search.GetSearchIndex(root) is index)
+
 #-----------------------------------------------------------------------------#
 
 if __name__ == '__main__':
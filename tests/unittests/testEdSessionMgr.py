@@ -61,6 +61,19 @@ class EdSessionMgrTest(unittest.TestCase):
         self.assertTrue(isinstance(rval, list))
         self.assertEquals(len(rval), 8)
 
+    def testLoadSessionInfo(self):
+        """Test loading a session with the index of its current file"""
+        files = ['foo.py', 'bar.py']
+        self.assertTrue(self._mgr.SaveSession('current', files, 1))
+        loaded, current = self._mgr.LoadSessionInfo('current')
+        self.assertEquals(loaded, files)
+        self.assertEquals(current, 1)
+        # Sessions saved without a current file
+        dsession = self._mgr.DefaultSession
+        loaded, current = self._mgr.LoadSessionInfo(dsession)
+        self.assertEquals(len(loaded), 8)
+        self.assertEquals(current, -1)
+
     def testSaveSession(self):
         """Test saving a session file to disk"""
         files = ['foo.py', 'bar.py']
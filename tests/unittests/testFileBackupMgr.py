@@ -16,6 +16,7 @@ __revision__ = "$Revision$"
 # Imports
 import wx
 import os
+import gzip
 import time
 import unittest
 
@@ -65,6 +66,11 @@ class FileBackupMgrTest(unittest.TestCase):
         bname = self.bkup.GetBackupFilename(fname)
         self.assertTrue(self.bkup.IsBackupNewer(fname))
 
+        # A backup copy is newer than the file too
+        os.remove(bname)
+        self.assertTrue(self.bkup.MakeBackupCopy(fname))
+        self.assertTrue(self.bkup.IsBackupNewer(fname))
+
     def testMakeBackupCopy(self):
         """Test making a backup copy of a file"""
         fname = common.MakeTempFile("test3.txt")
@@ -73,6 +79,33 @@ class FileBackupMgrTest(unittest.TestCase):
         bkup = self.bkup.GetBackupFilename(fname)
         self.assertTrue(os.path.exists(bkup))
 
+    def testMakeBackupCopyLarge(self):
+        """Test that a backup copy of a large file is complete"""
+        fname = common.MakeTempFile("test_large.txt")
+        data = "".join([ "%08d\n" % num for num in range(300000) ])
+        handle = open(fname, 'wb')
+        handle.write(data)
+        handle.close()
+        self.assertTrue(self.bkup.MakeBackupCopy(fname))
+        bkup = self.bkup.GetBackupFilename(fname)
+        self.assertEquals(common.GetFileContents(bkup), data)
+
+    def testSetBackupCount(self):
+        """Test keeping a number of rotated backups"""
+        self.assertEquals(self.bkup.GetBackupCount(), 1)
+        self.assertRaises(AssertionError, self.bkup.SetBackupCount, 0)
+        self.bkup.SetBackupCount(3)
+        bkup = self.bkup.GetBackupFilename(self.path)
+        for num in range(4):
+            handle = open(self.path, 'wb')
+            handle.write(str(num))
+            handle.close()
+            self.assertTrue(self.bkup.MakeBackupCopy(self.path))
+        self.assertEquals(common.GetFileContents(bkup), "3")
+        self.assertEquals(common.GetFileContents(bkup + u".1"), "2")
+        self.assertEquals(common.GetFileContents(bkup + u".2"), "1")
+        self.assertFalse(os.path.exists(bkup + u".3"))
+
     def testSetBackupFileTemplate(self):
         """Test setting the template for making backup files"""
         self.bkup.SetBackupFileTemplate(u"%s#")
@@ -95,6 +128,8 @@ class FileBackupMgrTest(unittest.TestCase):
         self.assertTrue(os.path.exists(bkupf), "Invalid path: %s" % bkupf)
         txt = common.GetFileContents(bkupf)
         self.assertTrue(txt.startswith("SuperHeader"))
+        self.assertEquals(txt[len("SuperHeader" + os.linesep):],
+                          common.GetFileContents(path))
 
     def testBackupCustomDirectory(self):
         """"Test doing a backup to a custom directory"""
@@ -102,4 +137,49 @@ class FileBackupMgrTest(unittest.TestCase):
         bkup.SetBackupDirectory(common.GetTempDir())
         self.assertTrue(bkup.MakeBackupCopy(__file__))
         path = bkup.GetBackupFilename(__file__)
-        self.assertTrue(os.path.exists(path), "Path Fail: %s" % path)
\ No newline at end of file
+        self.assertTrue(os.path.exists(path), "Path Fail: %s" % path)
+
+    def testWriteBackup(self):
+        """Test writing a backup from the encoded contents of a file"""
+        fname = common.MakeTempFile("test4.txt")
+        bkup = self.bkup.WriteBackup(fname, ["TEST ", "BACKUP"])
+        self.assertEquals(bkup, self.bkup.GetBackupFilename(fname))
+        self.assertEquals(common.GetFileContents(bkup), "TEST BACKUP")
+
+        # Compressed backup replaces the plain one
+        gzbkup = self.bkup.WriteBackup(fname, ["TEST ", "BACKUP"], True)
+        self.assertEquals(gzbkup, bkup + u".gz")
+        self.assertFalse(os.path.exists(bkup))
+        handle = gzip.open(gzbkup, 'rb')
+        self.assertEquals(handle.read(), "TEST BACKUP")
+        handle.close()
+        self.assertTrue(self.bkup.HasBackup(fname))
+
+    def testWriteBackupHeader(self):
+        """Test that the header is written the same way as for a copy"""
+        fname = common.MakeTempFile("test6.txt")
+        bkup = ebmlib.FileBackupMgr(u"Backup \u00e9", u"%s~")
+        header = u"Backup \u00e9".encode('utf-8') + os.linesep
+        path = bkup.WriteBackup(fname, ["TEST BACKUP"])
+        self.assertEquals(common.GetFileContents(path), header + "TEST BACKUP")
+        self.assertTrue(bkup._CheckHeader(path))
+
+        os.remove(path)
+        self.assertTrue(bkup.MakeBackupCopy(fname))
+        self.assertTrue(common.GetFileContents(path).startswith(header))
+
+    def testWriteBackupRotate(self):
+        """Test rotating a mix of plain and compressed backups"""
+        fname = common.MakeTempFile("test5.txt")
+        self.bkup.SetBackupCount(2)
+        bkup = self.bkup.WriteBackup(fname, ["ONE"])
+        self.bkup.WriteBackup(fname, ["TWO"], True)
+        self.assertTrue(os.path.exists(bkup + u".gz"))
+        self.assertEquals(common.GetFileContents(bkup + u".1"), "ONE")
+        self.assertFalse(os.path.exists(bkup))
+
+        self.bkup.WriteBackup(fname, ["THREE"])
+        self.assertEquals(common.GetFileContents(bkup), "THREE")
+        self.assertTrue(os.path.exists(bkup + u".1.gz"))
+        self.assertFalse(os.path.exists(bkup + u".1"))
+        self.assertFalse(os.path.exists(bkup + u".gz"))
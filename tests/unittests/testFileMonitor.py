@@ -0,0 +1,89 @@
+###############################################################################
+# Name: testFileMonitor.py                                                    #
+# Purpose: Unit tests for ebmlib.FileMonitor                                  #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittests for the ebmlib.FileMonitor class"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import time
+import threading
+import unittest
+
+# Local imports
+import common
+
+# Module(s) to test
+import ebmlib
+
+#-----------------------------------------------------------------------------#
+
+class FileMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.path = common.GetTempFilePath(u"watched.txt")
+        self._WriteFile(self.path, "Hello World\n")
+        self.changes = list()
+        self.event = threading.Event()
+        self.monitor = ebmlib.FileMonitor(self._OnChanged, checkFreq=100)
+        self.monitor.start()
+
+    def tearDown(self):
+        self.monitor.Shutdown()
+        self.monitor.join(2)
+        common.CleanTempDir()
+
+    def _OnChanged(self, changes):
+        self.changes.extend(changes)
+        self.event.set()
+
+    def _WaitForChange(self):
+        self.event.wait(5)
+        self.event.clear()
+        changes = self.changes
+        self.changes = list()
+        return changes
+
+    def _WriteFile(self, path, txt):
+        handle = open(path, 'wb')
+        handle.write(txt)
+        handle.close()
+
+    #---- Tests ----#
+
+    def testAddRemoveFile(self):
+        """Test that files are reference counted"""
+        self.monitor.AddFile(self.path)
+        self.monitor.AddFile(self.path)
+        self.assertEquals(self.monitor.GetFiles(), [self.path])
+        self.monitor.RemoveFile(self.path)
+        self.assertEquals(self.monitor.GetFiles(), [self.path])
+        self.monitor.RemoveFile(self.path)
+        self.assertEquals(self.monitor.GetFiles(), list())
+
+    def testDeleted(self):
+        """Test notification of a deleted file"""
+        self.monitor.AddFile(self.path)
+        os.remove(self.path)
+        self.assertEquals(self._WaitForChange(), [(self.path, 0)])
+
+    def testModified(self):
+        """Test notification of a modified file"""
+        other = common.GetTempFilePath(u"other.txt")
+        self._WriteFile(other, "Not watched\n")
+        self.monitor.AddFile(self.path)
+        time.sleep(.2)
+        self._WriteFile(other, "Still not watched\n")
+        self._WriteFile(self.path, "Hello World, again\n")
+        changes = self._WaitForChange()
+        self.assertEquals(len(changes), 1)
+        self.assertEquals(changes[0][0], self.path)
+        self.assertEquals(changes[0][1], os.path.getmtime(self.path))
@@ -16,6 +16,7 @@ __revision__ = "$Revision$"
 # Imports
 import wx
 import os
+import time
 import unittest
 
 # Local modules
@@ -57,3 +58,31 @@ class FileTypeCheckerTest(unittest.TestCase):
         """Test if the file is a readable as text."""
         self.assertTrue(self.checker.IsReadableText(self.fpath))
 
+    def testOpenReadableText(self):
+        """Test opening a text file with the single read path"""
+        self.assertTrue(self.checker.OpenReadableText(self.bpath) is None)
+        handle = self.checker.OpenReadableText(self.fpath)
+        self.assertTrue(handle is not None)
+        txt = handle.read()
+        handle.close()
+        self.assertEquals(txt, common.GetFileContents(self.fpath))
+
+        # Prefix smaller than the first line
+        checker = ebmlib.FileTypeChecker(preread=3)
+        handle = checker.OpenReadableText(self.fpath)
+        lines = list(handle)
+        handle.close()
+        self.assertEquals("".join(lines), common.GetFileContents(self.fpath))
+
+    def testClassificationCache(self):
+        """Test that modified files are reclassified"""
+        path = common.MakeTempFile(u"checker.txt")
+        try:
+            self.assertFalse(self.checker.IsBinary(path))
+            time.sleep(1) # make sure modtime is different
+            handle = open(path, 'wb')
+            handle.write("\x00\x01\x02")
+            handle.close()
+            self.assertTrue(self.checker.IsBinary(path))
+        finally:
+            common.CleanTempDir()
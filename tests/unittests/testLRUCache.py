@@ -0,0 +1,69 @@
+###############################################################################
+# Name: testLRUCache.py                                                       #
+# Purpose: Unit tests for the LRUCache                                        #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittest cases for testing ebmlib.LRUCache"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import unittest
+
+# Module to test
+import ebmlib
+
+#-----------------------------------------------------------------------------#
+# Test Class
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ebmlib.LRUCache(3)
+
+    def tearDown(self):
+        pass
+
+    def testClear(self):
+        """Test clearing the cache"""
+        self.cache.Put('a', 1)
+        self.cache.Put('b', 2)
+        self.assertEquals(len(self.cache), 2)
+        self.cache.Clear()
+        self.assertEquals(len(self.cache), 0)
+        self.assertTrue(self.cache.Get('a') is None)
+
+    def testGet(self):
+        """Test getting items from the cache"""
+        self.cache.Put('a', 1)
+        self.cache.Put('b', False)
+        self.assertEquals(self.cache.Get('a'), 1)
+        self.assertEquals(self.cache.Get('b', True), False)
+        self.assertTrue(self.cache.Get('c') is None)
+        self.assertEquals(self.cache.Get('c', 5), 5)
+
+    def testPut(self):
+        """Test that the least recently used item is removed when full"""
+        self.cache.Put('a', 1)
+        self.cache.Put('b', 2)
+        self.cache.Put('c', 3)
+        self.cache.Get('a') # a is now the most recently used
+        self.cache.Put('d', 4)
+        self.assertEquals(len(self.cache), 3)
+        self.assertTrue(self.cache.Get('b') is None)
+        self.assertEquals(self.cache.Get('a'), 1)
+
+        # Replacing an item doesn't grow the cache
+        self.cache.Put('a', 5)
+        self.assertEquals(len(self.cache), 3)
+        self.assertEquals(self.cache.Get('a'), 5)
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+###############################################################################
+# Name: testMappedFile.py                                                     #
+# Purpose: Unit tests for ebmlib.MappedFile                                   #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittests for ebmlib.MappedFile class"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import re
+import unittest
+
+# Local imports
+import common
+
+# Module(s) to test
+import ebmlib
+
+#-----------------------------------------------------------------------------#
+
+class MappedFileTest(unittest.TestCase):
+    def setUp(self):
+        self.lines = ["line %d\n" % x for x in range(1000)]
+        self.lines[500] = "match\n"
+        path = common.GetTempFilePath(u"mapped.txt")
+        handle = open(path, 'wb')
+        handle.write("".join(self.lines))
+        handle.close()
+        self.file = ebmlib.MappedFile(path)
+
+    def tearDown(self):
+        self.file.Close()
+        common.CleanTempDir()
+
+    #---- Tests ----#
+
+    def testClose(self):
+        """Test that a closed file stops indexing and reads nothing"""
+        self.file.Close()
+        self.assertFalse(self.file.IndexLines())
+        self.assertFalse(self.file.IsIndexed())
+        self.assertEquals(self.file.GetLineOffset(10), 0)
+        self.assertEquals(self.file.Read(0, 10), '')
+        self.file.Close() # Closing again is harmless
+
+    def testFind(self):
+        """Test searching in the file"""
+        regex = re.compile("match|line 2\n")
+        offset = len("".join(self.lines[:500]))
+        self.assertEquals(self.file.Find(regex, 100), (offset, offset + 5))
+        self.assertEquals(self.file.Find(regex, offset + 1), None)
+        self.assertEquals(self.file.Find(regex, self.file.Size, False),
+                          (offset, offset + 5))
+        self.assertEquals(self.file.Find(regex, offset, False), (14, 21))
+
+    def testGetLineCount(self):
+        """Test getting the number of lines"""
+        self.assertFalse(self.file.IsIndexed())
+        self.assertEquals(self.file.GetLineCount(), 1001)
+        self.assertTrue(self.file.IsIndexed())
+
+    def testGetLineOffset(self):
+        """Test converting between lines and offsets"""
+        for line in (0, 1, 10, 999):
+            offset = len("".join(self.lines[:line]))
+            self.assertEquals(self.file.GetLineOffset(line), offset)
+            self.assertEquals(self.file.GetLineFromOffset(offset), line)
+            self.assertEquals(self.file.GetLineFromOffset(offset + 2), line)
+        self.assertEquals(self.file.GetLineOffset(5000), self.file.Size)
+
+    def testGetWindow(self):
+        """Test getting the range of lines to show around a line"""
+        start, end = self.file.GetWindow(100, 10, 1024)
+        self.assertEquals(self.file.Read(start, end),
+                          "".join(self.lines[95:105]))
+        start, end = self.file.GetWindow(100, 100, 40)
+        self.assertTrue(end - start <= 40)
+        self.assertEquals(self.file.GetLineFromOffset(start), 98)
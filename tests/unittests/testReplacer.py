@@ -0,0 +1,165 @@
+###############################################################################
+# Name: testReplacer.py                                                       #
+# Purpose: Unit tests for ebmlib.FileReplacer                                 #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittests for ebmlib.FileReplacer and ebmlib.ReplaceJournal classes"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import re
+import unittest
+
+# Local imports
+import common
+
+# Module(s) to test
+import ebmlib
+
+#-----------------------------------------------------------------------------#
+
+class FileReplacerTest(unittest.TestCase):
+    def setUp(self):
+        self.path1 = self._MakeFile(u"one.txt",
+                                    "def foo(param1):\r\n    return foo\r\n")
+        self.path2 = self._MakeFile(u"two.txt", "Hello World\n")
+        self.journal = ebmlib.ReplaceJournal(common.GetTempFilePath(u"journal"))
+
+    def tearDown(self):
+        common.CleanTempDir()
+
+    def _MakeFile(self, name, txt):
+        path = common.GetTempFilePath(name)
+        handle = open(path, 'wb')
+        handle.write(txt)
+        handle.close()
+        return path
+
+    def _GetReplacer(self, query, rstring, isregex=False):
+        engine = ebmlib.SearchEngine(query, isregex)
+        return ebmlib.FileReplacer(engine.GetQueryObject(), rstring,
+                                   isregex, self.journal)
+
+    #---- Tests ----#
+
+    def testReplaceInFile(self):
+        """Test replacing in a single file"""
+        replacer = self._GetReplacer(u"foo", u"bar\\1")
+        self.assertEquals(replacer.ReplaceInFile(self.path1), 2)
+        self.assertEquals(common.GetFileContents(self.path1),
+                          "def bar\\1(param1):\r\n    return bar\\1\r\n")
+        self.assertEquals(replacer.ReplaceInFile(self.path2), 0)
+        self.assertEquals(common.GetFileContents(self.path2), "Hello World\n")
+        self.assertEquals(replacer.Count, 2)
+        self.assertEquals(replacer.FileCount, 1)
+        self.assertEquals(self.journal.GetFiles(), [self.path1,])
+
+    def testReplaceRegex(self):
+        """Test replacing with a regular expression template"""
+        replacer = self._GetReplacer(u"(\\w+) (\\w+)", u"\\2 \\1", True)
+        results = list(replacer.ReplaceInFiles([self.path1, self.path2]))
+        self.assertEquals(results, [(self.path1, 2), (self.path2, 1)])
+        self.assertEquals(common.GetFileContents(self.path1),
+                          "foo def(param1):\r\n    foo return\r\n")
+        self.assertEquals(common.GetFileContents(self.path2), "World Hello\n")
+
+        engine = ebmlib.SearchEngine(u"(foo)", True)
+        self.assertRaises(re.error, ebmlib.FileReplacer,
+                          engine.GetQueryObject(), u"\\2", True)
+
+    def testReplaceMultiline(self):
+        """Test replacing matches that span lines"""
+        replacer = self._GetReplacer(u":\\s+return", u": pass", True)
+        self.assertEquals(replacer.ReplaceInFile(self.path1), 1)
+        self.assertEquals(common.GetFileContents(self.path1),
+                          "def foo(param1): pass foo\r\n")
+
+    def testReplaceEncoding(self):
+        """Test replacing in files that are not UTF-8"""
+        path = self._MakeFile(u"latin.txt",
+                              u"caf\xe9 na\xefve\n".encode('latin-1'))
+
+        # Unknown encodings are left untouched and reported
+        replacer = self._GetReplacer(u"caf\xe9", u"th\xe9")
+        self.assertEquals(replacer.ReplaceInFile(path), 0)
+        self.assertEquals(common.GetFileContents(path),
+                          u"caf\xe9 na\xefve\n".encode('latin-1'))
+        self.assertEquals([fname for fname, err in replacer.GetErrors()],
+                          [path,])
+
+        # Replaced using the file's encoding
+        replacer = self._GetReplacer(u"caf\xe9", u"th\xe9")
+        replacer.SetEncodingFunction(lambda fname, sample: 'latin-1')
+        self.assertEquals(replacer.ReplaceInFile(path), 1)
+        self.assertEquals(common.GetFileContents(path),
+                          u"th\xe9 na\xefve\n".encode('latin-1'))
+
+        # Text that can't be encoded leaves the file untouched
+        replacer = self._GetReplacer(u"th\xe9", u"\u2603")
+        replacer.SetEncodingFunction(lambda fname, sample: 'latin-1')
+        self.assertEquals(replacer.ReplaceInFile(path), 0)
+        self.assertEquals(len(replacer.GetErrors()), 1)
+        self.assertEquals(common.GetFileContents(path),
+                          u"th\xe9 na\xefve\n".encode('latin-1'))
+
+        # UTF-8 files are detected by default
+        path = self._MakeFile(u"utf8.txt", u"caf\xe9\n".encode('utf-8'))
+        replacer = self._GetReplacer(u"\xe9", u"\u2603")
+        self.assertEquals(replacer.ReplaceInFile(path), 1)
+        self.assertEquals(common.GetFileContents(path),
+                          u"caf\u2603\n".encode('utf-8'))
+
+    def testReplaceLinks(self):
+        """Test that replacing through links changes the linked file"""
+        if not hasattr(os, 'symlink'):
+            return
+
+        # Symbolic link
+        link = common.GetTempFilePath(u"link.txt")
+        os.symlink(self.path2, link)
+        replacer = self._GetReplacer(u"World", u"Earth")
+        self.assertEquals(replacer.ReplaceInFile(link), 1)
+        self.assertTrue(os.path.islink(link))
+        self.assertEquals(common.GetFileContents(self.path2), "Hello Earth\n")
+        self.assertEquals(self.journal.GetFiles(),
+                          [os.path.realpath(self.path2),])
+
+        # Hard link
+        hlink = common.GetTempFilePath(u"hlink.txt")
+        os.link(self.path1, hlink)
+        replacer = self._GetReplacer(u"foo", u"bar")
+        self.assertEquals(replacer.ReplaceInFile(self.path1), 2)
+        self.assertTrue(os.path.samefile(self.path1, hlink))
+        self.assertEquals(common.GetFileContents(hlink),
+                          "def bar(param1):\r\n    return bar\r\n")
+
+        # Revert restores the files the links point to
+        self.assertEquals(self.journal.Revert(), list())
+        self.assertTrue(os.path.islink(link))
+        self.assertEquals(common.GetFileContents(link), "Hello World\n")
+        self.assertEquals(common.GetFileContents(hlink),
+                          "def foo(param1):\r\n    return foo\r\n")
+
+    def testRevert(self):
+        """Test reverting the replaced files from the journal"""
+        replacer = self._GetReplacer(u"o", u"0")
+        list(replacer.ReplaceInFiles([self.path1, self.path2]))
+        self.assertEquals(common.GetFileContents(self.path2), "Hell0 W0rld\n")
+
+        # Reload the journal as if from a new session
+        journal = ebmlib.ReplaceJournal(self.journal.Path)
+        self.assertTrue(journal.Load())
+        self.assertEquals(journal.GetFiles(), [self.path1, self.path2])
+        self.assertEquals(journal.Revert(), list())
+        self.assertEquals(common.GetFileContents(self.path1),
+                          "def foo(param1):\r\n    return foo\r\n")
+        self.assertEquals(common.GetFileContents(self.path2), "Hello World\n")
+        self.assertFalse(os.path.exists(journal.Path))
@@ -18,6 +18,9 @@ __revision__ = "$Revision$"
 import unittest
 import unicodedata
 
+# Local modules
+import common
+
 # Module to test
 import ebmlib
 
@@ -93,7 +96,7 @@ class SearchEngineTest(unittest.TestCase):
         # Find Next
         t2 = self._def_eng.Find(t1[1])
         self.assertTrue(t2 is not None, "Find next failed")
-        self.assertEquals(t2[0] + t1[1], 32, "Find next: %d != 32" % t2[0])
+        self.assertEquals(t2[0], 32, "Find next: %d != 32" % t2[0])
 
         # Test not found
         self._def_eng.SetQuery('gyoza')
@@ -161,13 +164,59 @@ class SearchEngineTest(unittest.TestCase):
         # Find Next
         t2 = self._mc_eng.Find(t1[1])
         self.assertTrue(t2 is not None, "Find next failed")
-        self.assertEquals(t2[0] + t1[1], 48, "Find next: %d != 48" % t2[0])
+        self.assertEquals(t2[0], 48, "Find next: %d != 48" % t2[0])
 
         # Test not found
         self._mc_eng.SetQuery('TeSt')
         t3 = self._mc_eng.Find(0)
         self.assertTrue(t3 is None)
 
+    def testFindPrev(self):
+        """Test searching backwards from a position in the search pool"""
+        self._mc_eng.SetSearchPool(POOL)
+        self._mc_eng.SetQuery('test')
+        self._mc_eng.SetFlags(down=False)
+
+        # Search from the end of the pool
+        t1 = self._mc_eng.Find(-1)
+        self.assertTrue(t1 is not None, "Find previous failed")
+        self.assertEquals(t1, (len(POOL) - 5, len(POOL) - 1))
+
+        # Previous match
+        t2 = self._mc_eng.Find(t1[0])
+        self.assertTrue(t2 is not None, "Find previous failed")
+        self.assertEquals(t2[0], POOL.rindex('test', 0, t1[0]))
+
+        # Nothing before the first match
+        t3 = self._mc_eng.Find(32)
+        self.assertTrue(t3 is None)
+
+        # Search back across more than one chunk
+        pool = u"test" + (u" " * (ebmlib.SearchEngine.CHUNK_SIZE * 3))
+        self._mc_eng.SetSearchPool(pool)
+        self.assertEquals(self._mc_eng.FindPrev(), (0, 4))
+
+        # Variable length matches are the same as a forward search finds
+        self._regex_eng.SetSearchPool(u"hello world!!!!")
+        self._regex_eng.SetQuery(u"\\w+")
+        self.assertEquals(self._regex_eng.FindPrev(11), (6, 11))
+        self.assertEquals(self._regex_eng.FindPrev(), (6, 11))
+        self.assertEquals(self._regex_eng.FindPrev(6), (0, 5))
+
+    def testSetSearchPool(self):
+        """Test that changing the pool does not recompile the query"""
+        self._def_eng.SetQuery(u"test")
+        self._def_eng.SetSearchPool(u"a test pool")
+        regex = self._def_eng.GetQueryObject()
+        self._def_eng.SetSearchPool(u"another test pool")
+        self.assertTrue(regex is self._def_eng.GetQueryObject())
+        self.assertEquals(self._def_eng.Find(), (8, 12))
+
+        # Changing the query recompiles
+        self._def_eng.SetQuery(u"pool")
+        self.assertFalse(regex is self._def_eng.GetQueryObject())
+        self.assertEquals(self._def_eng.Find(), (13, 17))
+
     def testQuery(self):
         """Test setting and retrieving the search query"""
         q1 = self._def_eng.GetQuery()
@@ -189,7 +238,7 @@ class SearchEngineTest(unittest.TestCase):
         # Find Next
         t2 = self._regex_eng.Find(t1[1])
         self.assertTrue(t2 is not None, "Find next failed")
-        self.assertEquals(t2[0] + t1[1], 6, "Find next: %d != 6" % t2[0])
+        self.assertEquals(t2[0], 6, "Find next: %d != 6" % t2[0])
 
         # Test not found
         self._regex_eng.SetQuery('test{10,10}')
@@ -217,6 +266,56 @@ class SearchEngineTest(unittest.TestCase):
         val = search.Find()
         self.assertTrue(val is not None)
 
+    def testParallelSearchInDirectory(self):
+        """Test that a parallel search finds the same results as a serial
+        search.
+
+        """
+        ddir = common.GetDataDir()
+        serial = ebmlib.SearchEngine(u"test", regex=False, matchcase=False)
+        expect = list(serial.SearchInDirectory(ddir))
+        self.assertTrue(len(expect))
+
+        # Results in file order
+        search = ebmlib.SearchEngine(u"test", regex=False, matchcase=False)
+        search.SetWorkerCount(4)
+        self.assertEquals(list(search.SearchInDirectory(ddir)), expect)
+
+        # Results in arrival order
+        search.SetOrderedResults(False)
+        results = list(search.SearchInDirectory(ddir))
+        self.assertEquals(sorted(results), sorted(expect))
+
+        # Stop part way through
+        rgen = search.SearchInDirectory(ddir)
+        rgen.next()
+        rgen.close()
+
+    def testParallelSearchError(self):
+        """Test that an error listing the files reaches the consumer"""
+        def Paths():
+            yield common.GetDataFilePath(u"test_read_utf8.txt")
+            raise OSError("Permission denied")
+
+        search = ebmlib.SearchEngine(u"test", regex=False, matchcase=False)
+        search.SetWorkerCount(4)
+        self.assertRaises(OSError, list, search.SearchInFiles(Paths()))
+
+    def testSearchInMappedFile(self):
+        """Test that searching a memory mapped file finds the same lines as
+        searching it line by line.
+
+        """
+        path = common.GetDataFilePath(u"test_read_utf8.txt")
+        for query in (u"[a-z]+", u"^\\w", u"\\s+$", u"e\\n\\w"):
+            search = ebmlib.SearchEngine(query)
+            # Compare the raw results as the lines are not decoded
+            search.SetResultFormatter(lambda f, l, m: (f, l, m))
+            search.SetMapThreshold(0)
+            expect = list(search.SearchInFile(path))
+            search.SetMapThreshold(1)
+            self.assertEquals(list(search.SearchInFile(path)), expect)
+
 #-----------------------------------------------------------------------------#
 
 if __name__ == '__main__':
@@ -128,6 +128,25 @@ class StyleMgrTest(unittest.TestCase):
         fake = self.mgr.GetStyleByName("fakestyletag")
         self.assertEquals(fake, wx.EmptyString)
 
+    def testGetStyleByNameFonts(self):
+        """Test that style specs follow changes to the fonts and styles"""
+        self.mgr.SetGlobalFont("primary", "Arial", 10)
+        spec = self.mgr.GetStyleByName('default_style')
+        self.assertTrue('face:Arial' in spec, spec)
+        self.assertTrue('size:10' in spec, spec)
+        self.assertEquals(spec, self.mgr.GetStyleByName('default_style'))
+
+        self.mgr.SetGlobalFont("primary", "Courier New", 12)
+        spec = self.mgr.GetStyleByName('default_style')
+        self.assertTrue('face:Courier New' in spec, spec)
+        self.assertTrue('size:12' in spec, spec)
+
+        item = ed_style.StyleItem("#123456", "#FFFFFF", "%(primary)s")
+        self.mgr.SetStyleTag('comment_style', item)
+        spec = self.mgr.GetStyleByName('comment_style')
+        self.assertTrue('fore:#123456' in spec, spec)
+        self.assertTrue('face:Courier New' in spec, spec)
+
     def testGetStyleFont(self):
         """Test getting the font objects for the current styles primary and
         secondary font settings.
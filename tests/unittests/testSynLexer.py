@@ -0,0 +1,118 @@
+###############################################################################
+# Name: testSynLexer.py                                                       #
+# Purpose: Unit tests for syntax.synlexer                                     #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2012 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittest cases for testing the incremental container lexer engine"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id:  $"
+__revision__ = "$Revision:  $"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import unittest
+import wx.stc
+from pygments.token import Token
+import common
+
+# Module to test
+import syntax.synlexer as synlexer
+
+#-----------------------------------------------------------------------------#
+# Test Data
+
+TEXT = u"""<html>
+<!-- a comment
+ over lines -->
+<p class="a {{ foo }}">{{ bar|upper }} text \xe9t\xe9</p>
+{% for x in y %}
+  <b>{{ x }}</b>
+{% endfor %}
+</html>
+"""
+
+def GetStyle(token, value):
+    """Style the tokens by their top level type"""
+    types = (Token.Comment, Token.Name, Token.Keyword, Token.Literal,
+             Token.Operator, Token.Punctuation)
+    for idx, ttype in enumerate(types):
+        if token in ttype:
+            return idx + 1
+    return 0
+
+#-----------------------------------------------------------------------------#
+# Test Class
+
+class SynLexerTest(unittest.TestCase):
+    def setUp(self):
+        self.frame = common.TestFrame(None)
+        self.stc = wx.stc.StyledTextCtrl(self.frame)
+        self.stc.SetText(TEXT * 4)
+
+    def tearDown(self):
+        self.frame.Destroy()
+
+    #---- Utilities ----#
+
+    def GetStyles(self, stc):
+        """Get the styles of all the text in the buffer"""
+        return [stc.GetStyleAt(pos) for pos in range(stc.GetLength())]
+
+    def FullStyles(self, text):
+        """Get the styles of the text when it is all styled at once"""
+        stc = wx.stc.StyledTextCtrl(self.frame)
+        stc.SetText(text)
+        lexer = synlexer.PygmentsLexer("html+django", GetStyle)
+        lexer.StyleText(stc, 0, stc.GetLength())
+        return self.GetStyles(stc)
+
+    #---- Test Cases ----#
+
+    def testStyleText(self):
+        """Test styling all of the text"""
+        lexer = synlexer.PygmentsLexer("html+django", GetStyle)
+        lexer.StyleText(self.stc, 0, self.stc.GetLength())
+        self.assertEquals(self.stc.GetEndStyled(), self.stc.GetLength())
+        styles = self.GetStyles(self.stc)
+        self.assertTrue(max(styles) > 0)
+
+        # Line states are saved as the lexer goes
+        states = [self.stc.GetLineState(line)
+                  for line in range(self.stc.GetLineCount())]
+        self.assertTrue(max(states) > 0)
+
+    def testStyleTextChange(self):
+        """Test that restyling after changes matches styling all the text"""
+        lexer = synlexer.PygmentsLexer("html+django", GetStyle)
+        lexer.StyleText(self.stc, 0, self.stc.GetLength())
+        for text in (u"<!-- ", u"{% comment %}\n", u"\"", u" -->\n"):
+            pos = self.stc.PositionFromLine(self.stc.GetLineCount() // 2)
+            self.stc.InsertText(pos, text)
+            start = self.stc.GetEndStyled()
+            self.assertTrue(start <= pos)
+            lexer.StyleText(self.stc, start, self.stc.GetLength())
+            self.assertEquals(self.GetStyles(self.stc),
+                              self.FullStyles(self.stc.GetText()))
+
+    def testStyleTextRange(self):
+        """Test styling part of a document that is longer than the look
+        ahead given to the lexer.
+
+        """
+        self.stc.SetText(TEXT * 200)
+        self.assertTrue(self.stc.GetLength() > synlexer.LOOKAHEAD_SIZE)
+        lexer = synlexer.PygmentsLexer("html+django", GetStyle)
+        end = self.stc.PositionFromLine(20)
+        lexer.StyleText(self.stc, 0, end)
+        self.assertEquals(self.GetStyles(self.stc)[:end],
+                          self.FullStyles(self.stc.GetText())[:end])
+
+    def testTokenize(self):
+        """Test that the runs cover all of the text"""
+        lexer = synlexer.PygmentsLexer("html+django", GetStyle)
+        runs = list(lexer.Tokenize(TEXT, None))
+        self.assertEquals(u"".join(run[1] for run in runs), TEXT)
@@ -42,6 +42,12 @@ class SyntaxDataBaseTest(unittest.TestCase):
         self.assertTrue(isinstance(self.data.Keywords, list))
         self.assertTrue(self.data.Keywords == self.data.GetKeywords())
 
+    def testMakeKeywordList(self):
+        kw = [(0, "if else for"), (1, "for while"), ("bad", "skip"), (2,)]
+        self.assertEquals(syndata.MakeKeywordList(kw),
+                          ['else', 'for', 'if', 'while'])
+        self.assertEquals(self.data.KeywordList, list())
+
     def testLangId(self):
         self.assertTrue(isinstance(self.data.LangId, int))
         self.assertTrue(self.data.LangId == self.data.GetLangId())
@@ -74,6 +74,24 @@ class SyntaxExtRegTest(unittest.TestCase):
         ftype = self.reg.FileTypeFromExt("html")
         self.assertEquals(ftype, synextreg.LANG_HTML)
 
+    def testFileTypeFromExtChanges(self):
+        """Test that lookups follow changes to the associations"""
+        ftype = self.reg.FileTypeFromExt("PY")
+        self.assertEquals(ftype, synextreg.LANG_PYTHON)
+
+        # Setting an extension on another type moves it to the new type
+        self.reg.SetAssociation(synextreg.LANG_CPP, "cpp py")
+        ftype = self.reg.FileTypeFromExt("py")
+        self.assertEquals(ftype, synextreg.LANG_CPP)
+        self.assertFalse("py" in self.reg[synextreg.LANG_PYTHON])
+
+        # Removing a type removes its extensions
+        self.assertTrue(self.reg.Remove(synextreg.LANG_CPP))
+        ftype = self.reg.FileTypeFromExt("cpp")
+        self.assertEquals(ftype, synextreg.LANG_TXT)
+        ftype = self.reg.FileTypeFromExt("pyw")
+        self.assertEquals(ftype, synextreg.LANG_PYTHON)
+
     def testGetAllExtensions(self):
         exts = self.reg.GetAllExtensions()
         self.assertTrue(isinstance(exts, list))
@@ -94,3 +94,11 @@ class SyntaxMgrTest(unittest.TestCase):
             if len(comment):
                 self.assertTrue(isinstance(comment[0], basestring))
 
+
+    def testSyntaxDataShared(self):
+        """Test that the syntax data is shared for each language"""
+        data = self.mgr.GetSyntaxData('py')
+        self.assertTrue(data is self.mgr.GetSyntaxData('py'))
+        self.assertTrue(data is self.mgr.GetSyntaxData('pyw'))
+        self.assertTrue(data.KeywordList is data.KeywordList)
+        self.assertFalse(data is self.mgr.GetSyntaxData('c'))
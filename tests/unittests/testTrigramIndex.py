@@ -0,0 +1,118 @@
+###############################################################################
+# Name: testTrigramIndex.py                                                   #
+# Purpose: Unit tests for ebmlib.TrigramIndex                                 #
+# Author: Cody Precord <cprecord@editra.org>                                  #
+# Copyright: (c) 2011 Cody Precord <staff@editra.org>                         #
+# License: wxWindows License                                                  #
+###############################################################################
+
+"""Unittests for ebmlib.TrigramIndex class"""
+
+__author__ = "Cody Precord <cprecord@editra.org>"
+__svnid__ = "$Id$"
+__revision__ = "$Revision$"
+
+#-----------------------------------------------------------------------------#
+# Imports
+import os
+import time
+import unittest
+
+# Local imports
+import common
+
+# Module(s) to test
+import ebmlib
+
+#-----------------------------------------------------------------------------#
+
+class TrigramIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.root = os.path.join(common.GetTempDir(), u"indexed")
+        os.mkdir(self.root)
+        self.path1 = self._MakeFile(u"one.txt", "def foo(param1):\n")
+        self.path2 = self._MakeFile(u"two.txt", "Hello World\n")
+        self.cache = common.GetTempFilePath(u"index.idx")
+        self.index = ebmlib.TrigramIndex(self.root, self.cache)
+
+    def tearDown(self):
+        common.CleanTempDir()
+
+    def _MakeFile(self, name, txt):
+        path = os.path.join(self.root, name)
+        handle = open(path, 'wb')
+        handle.write(txt)
+        handle.close()
+        return path
+
+    #---- Tests ----#
+
+    def testGetQueryTrigrams(self):
+        """Test getting the trigrams required by a query"""
+        self.assertEquals(len(self.index.GetQueryTrigrams(u"hello")), 3)
+        self.assertEquals(self.index.GetQueryTrigrams(u"HELLO"),
+                          self.index.GetQueryTrigrams(u"hello"))
+        self.assertFalse(self.index.GetQueryTrigrams(u"he"))
+        self.assertFalse(self.index.GetQueryTrigrams(u"foo|bar", True))
+        self.assertFalse(self.index.GetQueryTrigrams(u"(unclosed", True))
+
+    def testGetRequiredLiterals(self):
+        """Test getting the literal text required by a regex"""
+        lits = self.index.GetRequiredLiterals(u"foo\\s+bar(baz)?")
+        self.assertEquals(lits, [u"foo", u"bar"])
+        self.assertEquals(self.index.GetRequiredLiterals(u"a|b"), list())
+
+    def testCanMatch(self):
+        """Test ruling out files that cannot match"""
+        self.assertEquals(self.index.Refresh(), 2)
+        query = self.index.GetQueryTrigrams(u"hello")
+        self.assertFalse(self.index.CanMatch(self.path1, query))
+        self.assertTrue(self.index.CanMatch(self.path2, query))
+        paths = list(self.index.FilterPaths([self.path1, self.path2], query))
+        self.assertEquals(paths, [self.path2])
+
+        # Modified files are always candidates until refreshed
+        time.sleep(1)
+        self._MakeFile(u"one.txt", "print 'hello'\n")
+        self.assertTrue(self.index.CanMatch(self.path1, query))
+        self.assertEquals(self.index.Refresh(), 1)
+        self.assertTrue(self.index.CanMatch(self.path1, query))
+
+    def testRefresh(self):
+        """Test updating the index from the file system"""
+        self.assertEquals(self.index.Refresh(), 2)
+        self.assertEquals(self.index.FileCount, 2)
+        self.assertEquals(self.index.Refresh(), 0)
+        os.remove(self.path2)
+        self.assertEquals(self.index.Refresh(), 0)
+        self.assertEquals(self.index.FileCount, 1)
+
+    def testSaveLoad(self):
+        """Test persisting the index"""
+        self.index.Refresh()
+        self.assertTrue(self.index.Save())
+        self.assertTrue(os.path.exists(self.cache))
+        index = ebmlib.TrigramIndex(self.root, self.cache)
+        self.assertTrue(index.Load())
+        self.assertEquals(index.FileCount, 2)
+        self.assertTrue(index.IsIndexed(self.path1))
+
+        # Index of a different root is not used
+        index = ebmlib.TrigramIndex(common.GetTempDir(), self.cache)
+        self.assertFalse(index.Load())
+
+    def testSearchWithIndex(self):
+        """Test that searching with the index finds the same matches"""
+        self.index.Refresh()
+        search = ebmlib.SearchEngine(u"hello", regex=False, matchcase=False)
+        expect = [match for match in search.SearchInDirectory(self.root)
+                  if isinstance(match, basestring)]
+        search.SetSearchIndex(self.index)
+        results = list(search.SearchInDirectory(self.root))
+        self.assertEquals([(None, self.path2)], results[:1])
+        self.assertEquals(expect, results[1:])
+
+#-----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    unittest.main()